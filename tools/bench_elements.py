@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmark of the parsing of a large table page with elements and
+filters, like the history of a bank account, and of the evaluation of
+selectors on its rows, compiled by lxml at every call or taken from the
+cache of compiled selectors.
+
+Usage: tools/bench_elements.py [-r ROWS] [-n NUMBER]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from requests.models import Response
+
+from weboob.browser import Browser
+from weboob.browser.elements import ItemElement, TableElement, method
+from weboob.browser.filters.base import compile_css, compile_xpath
+from weboob.browser.filters.html import TableCell
+from weboob.browser.filters.standard import CleanDecimal, CleanText, Date, Env, Field
+from weboob.browser.pages import HTMLPage
+from weboob.capabilities.bank import Transaction
+
+
+def make_response(rows):
+    html = ['<html><body><table id="history">',
+            '<tr><th>Date</th><th>Label</th><th>Debit</th><th>Credit</th></tr>']
+    for i in range(rows):
+        html.append('<tr><td>%02d/%02d/2019</td><td> PAYMENT  %d </td><td>%d,%02d</td><td></td></tr>'
+                    % (i % 28 + 1, i % 12 + 1, i, i, i % 100))
+    html.append('</table></body></html>')
+
+    response = Response()
+    response.status_code = 200
+    response.url = 'https://www.bank.example/history'
+    response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response._content = ''.join(html).encode('utf-8')
+    return response
+
+
+class HistoryPage(HTMLPage):
+    @method
+    class iter_history(TableElement):
+        head_xpath = '//table[@id="history"]//th'
+        item_xpath = '//table[@id="history"]//tr[td]'
+
+        col_date = 'Date'
+        col_label = 'Label'
+        col_debit = 'Debit'
+        col_credit = 'Credit'
+
+        class item(ItemElement):
+            klass = Transaction
+
+            obj_date = Date(CleanText(TableCell('date')), dayfirst=True)
+            obj_label = CleanText(TableCell('label'))
+            obj_raw = Field('label')
+            obj_amount = CleanDecimal.French(TableCell('debit'), sign=lambda x: -1)
+            obj_type = Transaction.TYPE_UNKNOWN
+            obj__account = Env('account_id')
+
+            def obj_id(self):
+                return '%s-%s' % (self.env['account_id'], Field('label')(self))
+
+
+SELECTORS = ['./td[1]', './td[2]/text()', '(./th | ./td)[3]', './/td[has-class("amount")]']
+CSS_SELECTORS = ['td:first-child', 'td:nth-child(3)']
+
+
+def bench_selectors(page, number):
+    rows = page.doc.xpath('//table[@id="history"]//tr[td]')
+
+    def raw():
+        for row in rows:
+            for selector in SELECTORS:
+                row.xpath(selector)
+            for selector in CSS_SELECTORS:
+                row.cssselect(selector)
+
+    def compiled():
+        for row in rows:
+            for selector in SELECTORS:
+                compile_xpath(selector)(row)
+            for selector in CSS_SELECTORS:
+                compile_css(selector)(row)
+
+    for name, func in (('raw', raw), ('compiled', compiled)):
+        elapsed = min(timeit.repeat(func, number=1, repeat=number))
+        print('selectors %-8s  %8.2f ms  %6.2f µs/row' % (name, elapsed * 1e3, elapsed / len(rows) * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parsing of a table page with elements')
+    parser.add_argument('-r', '--rows', type=int, default=5000, help='number of rows of the table')
+    parser.add_argument('-n', '--number', type=int, default=3, help='number of parsings')
+    args = parser.parse_args()
+
+    page = HistoryPage(Browser(), make_response(args.rows), {})
+    transactions = list(page.iter_history(account_id='42'))
+    assert len(transactions) == args.rows
+
+    elapsed = min(timeit.repeat(lambda: list(page.iter_history(account_id='42')), number=1, repeat=args.number))
+    print('elements  %d rows  %8.2f ms  %6.2f µs/row' % (args.rows, elapsed * 1e3, elapsed / args.rows * 1e6))
+
+    bench_selectors(page, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Micro-benchmarks of URL objects of a PagesBrowser, with a browser which
+declares as many URLs as big banking modules:
+
+ * dispatch of responses to URL objects;
+ * build of URLs from parameters.
+
+Usage: tools/bench_urls.py [-n NUMBER]
+"""
+
+from __future__ import print_function
+
+import argparse
+import re
+import timeit
+
+from weboob.browser import PagesBrowser, URL
+from weboob.browser.pages import Page
+from weboob.tools.misc import to_unicode
+from weboob.tools.regex_helper import normalize
+
+
+class BenchPage(Page):
+    # Only the dispatch is measured, not the parsing of pages.
+    def __init__(self, browser, response, params=None):
+        self.params = params
+
+
+def make_browser_class(count):
+    attrs = {'BASEURL': 'https://www.bank.example/'}
+    for i in range(count):
+        attrs['section%d' % i] = URL(r'/section%d/(?P<id>\d+)/list\.html' % i,
+                                     r'/section%d/search\?q=(?P<q>.*)' % i,
+                                     BenchPage)
+    attrs['home'] = URL(r'https://www\.bank\.example/$', BenchPage)
+    return type('BenchBrowser', (PagesBrowser,), attrs)
+
+
+class FakeRequest(object):
+    method = 'GET'
+
+
+class FakeResponse(object):
+    request = FakeRequest()
+
+    def __init__(self, url):
+        self.url = url
+
+
+def handle_scan(browser, response):
+    # Try every URL object in order, as before the index.
+    for url in browser._urls.values():
+        page = url.handle(response)
+        if page is not None:
+            return page
+
+
+def handle_index(browser, response):
+    for name in browser.get_url_index().get_candidates(response.url):
+        page = browser._urls[name].handle(response)
+        if page is not None:
+            return page
+
+
+def build_normalize(url, **kwargs):
+    # Normalize regexps on every call, as before reverse templates.
+    patterns = []
+    for regex in url.urls:
+        patterns += normalize(regex)
+
+    for pattern, _ in patterns:
+        result = pattern
+        args = kwargs.copy()
+        for key in list(args.keys()):
+            search = '%%(%s)s' % key
+            if search in pattern:
+                result = result.replace(search, to_unicode(args.pop(key)))
+        if re.search(r'%\([A-z_]+\)s', result) or len(args):
+            continue
+        return url.browser.absurl(result, base=True)
+
+
+def build_template(url, **kwargs):
+    return url.build(**kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dispatch of responses to URL objects')
+    parser.add_argument('-n', '--number', type=int, default=20000, help='number of dispatches')
+    parser.add_argument('-u', '--urls', type=int, default=60, help='number of URL objects')
+    args = parser.parse_args()
+
+    browser = make_browser_class(args.urls)()
+    responses = [FakeResponse('https://www.bank.example/section%d/42/list.html' % (args.urls - 1)),
+                 FakeResponse('https://www.bank.example/section0/search?q=foo'),
+                 FakeResponse('https://www.bank.example/'),
+                 FakeResponse('https://www.bank.example/unknown'),
+                ]
+
+    for name, func in (('scan', handle_scan), ('index', handle_index)):
+        for response in responses:
+            elapsed = timeit.timeit(lambda: func(browser, response), number=args.number)
+            print('%-9s %-50s %8.2f µs' % (name, response.url, elapsed / args.number * 1e6))
+
+    builds = [('section0', {'id': 42}),
+              ('section0', {'q': 'foo'}),
+              ('home', {}),
+             ]
+    for name, func in (('normalize', build_normalize), ('template', build_template)):
+        for attrname, params in builds:
+            url = getattr(browser, attrname)
+            assert func(url, **params) == url.build(**params)
+            elapsed = timeit.timeit(lambda: func(url, **params), number=args.number)
+            print('%-9s %-50s %8.2f µs' % (name, '%s.build(%r)' % (attrname, params), elapsed / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
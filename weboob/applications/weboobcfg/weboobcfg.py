@@ -159,18 +159,28 @@ class WeboobCfg(ReplApplication):
         """
         caps = line.split()
         for backend_name, module_name, params in sorted(self.weboob.backends_config.iter_backends()):
-            try:
-                module = self.weboob.modules_loader.get_or_load_module(module_name)
-            except ModuleLoadError as e:
-                self.logger.warning('Unable to load module %r: %s' % (module_name, e))
+            # Use the index of repositories, so modules are not imported.
+            minfo = self.weboob.repositories.get_module_info(module_name)
+            if minfo is None:
+                self.logger.warning('Unable to find module %r' % module_name)
                 continue
 
-            if caps and not module.has_caps(*caps):
+            if caps and not minfo.has_caps(*caps):
                 continue
+
+            config = minfo.config
+            if config is None:
+                try:
+                    module = self.weboob.modules_loader.get_or_load_module(module_name)
+                except ModuleLoadError as e:
+                    self.logger.warning('Unable to load module %r: %s' % (module_name, e))
+                    continue
+                config = dict((key, {'masked': field.masked}) for key, field in module.config.items())
+
             row = OrderedDict([('Name', backend_name),
                                ('Module', module_name),
                                ('Configuration', ', '.join(
-                                   '%s=%s' % (key, ('*****' if key in module.config and module.config[key].masked
+                                   '%s=%s' % (key, ('*****' if key in config and config[key]['masked']
                                                     else value))
                                    for key, value in params.items())),
                                ])
@@ -252,15 +262,16 @@ class WeboobCfg(ReplApplication):
             print('Module "%s" does not exist.' % line, file=self.stderr)
             return 1
 
-        try:
-            module = self.weboob.modules_loader.get_or_load_module(line)
-        except ModuleLoadError:
-            module = None
+        module = None
+        if minfo.config is None:
+            try:
+                module = self.weboob.modules_loader.get_or_load_module(line)
+            except ModuleLoadError:
+                pass
 
         self.start_format()
         self.format(self.create_minfo_dict(minfo, module))
 
-
     def create_minfo_dict(self, minfo, module):
         module_info = {}
         module_info['name'] = minfo.name
@@ -269,9 +280,11 @@ class WeboobCfg(ReplApplication):
         module_info['license'] = minfo.license
         module_info['description'] = minfo.description
         module_info['capabilities'] = minfo.capabilities
-        module_info['installed'] = '%s%s' % (('yes' if module else 'no'), ' (new version available)' if self.weboob.repositories.versions.get(minfo.name) > minfo.version else '')
+        module_info['installed'] = '%s%s' % (('yes' if minfo.is_installed() else 'no'), ' (new version available)' if self.weboob.repositories.versions.get(minfo.name) > minfo.version else '')
         module_info['location'] = '%s' % (minfo.url or os.path.join(minfo.path, minfo.name))
-        if module:
+        if minfo.config is not None and minfo.is_installed():
+            module_info['config'] = dict(minfo.config)
+        elif module:
             module_info['config'] = {}
             for key, field in module.config.items():
                 module_info['config'][key] = {'label': field.label,
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function
+
+from weboob.core.daemon import DaemonServer
+from weboob.tools.application.base import Application
+
+
+class WeboobDaemon(Application):
+    APPNAME = 'weboobdaemon'
+    VERSION = '1.6'
+    COPYRIGHT = 'Copyright(C) 2019-YEAR weboob project'
+    DESCRIPTION = "Weboob-Daemon keeps backends loaded and their browsers logged in, " \
+                  "to be used by applications run with the --daemon option."
+    SHORT_DESCRIPTION = "keep backends loaded"
+
+    def main(self, argv):
+        """
+        Run the daemon until it is killed.
+        """
+        self.load_backends()
+        server = DaemonServer(self.weboob)
+        self.logger.info(u'Listening on %s with backends %s', server.address,
+                         ', '.join(sorted(self.weboob.backend_instances)))
+        try:
+            server.serve_forever()
+        finally:
+            server.close()
+        return 0
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import division
+
+import json
+import os
+import pkgutil
+import subprocess
+import sys
+import time
+from importlib import import_module
+
+import weboob.applications
+from weboob.tools.application.base import Application
+
+
+__all__ = ['find_application', 'measure_startup', 'parse_importtime']
+
+
+MARKER = '@@weboob-startup@@'
+
+# Run in a subprocess to start an application. Its main() is replaced to
+# report timings and exit, so the measure stops at the first prompt.
+BOOTSTRAP = '''
+import json, sys, time
+start = time.time()
+from %(module)s import %(klass)s as klass
+imported = time.time()
+
+def main(self, argv):
+    sys.stdout.write(%(marker)r + json.dumps({'import': imported - start,
+                                               'main': time.time() - start}) + '\\n')
+    sys.stdout.flush()
+    return 0
+
+klass.main = main
+klass.run([%(appname)r] + %(args)r)
+'''
+
+
+def find_application(name):
+    """
+    Find class of an application from its name or from the name of its
+    package in :mod:`weboob.applications`.
+
+    :rtype: :class:`weboob.tools.application.base.Application`
+    :raises: :class:`KeyError` if not found
+    """
+    # Names of scripts have dashes, unlike names of packages and some APPNAME.
+    wanted = name.replace('-', '')
+    names = [wanted]
+    names += [n for _, n, _ in pkgutil.iter_modules(weboob.applications.__path__) if n not in names]
+
+    for package_name in names:
+        try:
+            package = import_module('weboob.applications.%s' % package_name)
+        except ImportError:
+            continue
+
+        for attrname in getattr(package, '__all__', ()):
+            klass = getattr(package, attrname)
+            if isinstance(klass, type) and issubclass(klass, Application) and \
+               wanted in (package_name, klass.APPNAME.replace('-', '')):
+                return klass
+    raise KeyError(name)
+
+
+def parse_importtime(output):
+    """
+    Parse the output of ``python -X importtime``.
+
+    :returns: trees of imports, with the ``name``, ``self`` and
+              ``cumulative`` (in seconds) and ``children`` keys
+    :rtype: list[dict]
+    """
+    pending = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            own, cumulative, name = line[len('import time:'):].split('|')
+            own, cumulative = int(own) / 1e6, int(cumulative) / 1e6
+        except ValueError:
+            # Header line.
+            continue
+
+        # Imports are listed after their own imports, indented by their depth.
+        depth = (len(name) - len(name.lstrip())) // 2
+        children = []
+        while pending and pending[-1][0] > depth:
+            children.insert(0, pending.pop()[1])
+        pending.append((depth, {'name': name.strip(),
+                                'self': own,
+                                'cumulative': cumulative,
+                                'children': children,
+                               }))
+    return [node for depth, node in pending]
+
+
+def measure_startup(klass, runs=5, args=()):
+    """
+    Start an application several times in subprocesses, and measure how
+    long it takes before calling its main() method.
+
+    Imports are profiled with ``python -X importtime``, which is available
+    since Python 3.7. With older versions, ``imports`` is empty.
+
+    :param klass: application to start
+    :type klass: :class:`weboob.tools.application.base.Application`
+    :param runs: number of runs
+    :type runs: int
+    :param args: arguments of the application
+    :type args: list[str]
+    :returns: description of runs, with ``wall`` (time until the end of the
+              process), ``import`` (time to import the application) and
+              ``main`` (time to call main) in seconds, and the ``imports``
+              tree of the run which has the median ``main`` time
+    :rtype: dict
+    """
+    code = BOOTSTRAP % {'module': klass.__module__,
+                        'klass': klass.__name__,
+                        'marker': MARKER,
+                        'appname': klass.APPNAME,
+                        'args': list(args),
+                       }
+    command = [sys.executable]
+    if sys.version_info >= (3, 7):
+        command += ['-X', 'importtime']
+    command += ['-c', code]
+
+    results = []
+    with open(os.devnull, 'rb') as devnull:
+        for i in range(runs):
+            start = time.time()
+            process = subprocess.Popen(command, stdin=devnull, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       universal_newlines=True)
+            stdout, stderr = process.communicate()
+            wall = time.time() - start
+
+            for line in stdout.splitlines():
+                if line.startswith(MARKER):
+                    result = json.loads(line[len(MARKER):])
+                    break
+            else:
+                raise RuntimeError('%s did not reach main():\n%s' % (klass.APPNAME, stderr))
+
+            result['wall'] = wall
+            result['imports'] = parse_importtime(stderr)
+            results.append(result)
+
+    results.sort(key=lambda result: result['main'])
+    median = results[len(results) // 2]
+
+    def stats(key):
+        values = sorted(result[key] for result in results)
+        return {'min': values[0],
+                'median': values[len(values) // 2],
+                'max': values[-1],
+               }
+
+    return {'application': klass.APPNAME,
+            'runs': runs,
+            'python': sys.version.split()[0],
+            'wall': stats('wall'),
+            'import': stats('import'),
+            'main': stats('main'),
+            'imports': median['imports'],
+           }
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from weboob.applications.weboobdebug import WeboobDebug
+from weboob.applications.weboobdebug.startup import find_application, parse_importtime
+
+
+IMPORTTIME = '''import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     _io
+import time:        50 |        150 |   io
+import time:       200 |        200 |   json.decoder
+import time:       300 |        650 | json
+Some warning on stderr
+import time:        10 |         10 | os
+'''
+
+
+class StartupTest(TestCase):
+    # Check that imports are parsed as trees
+    def test_parse_importtime(self):
+        def names(nodes):
+            return [(node['name'], names(node['children'])) for node in nodes]
+
+        imports = parse_importtime(IMPORTTIME)
+        self.assertEqual(names(imports), [('json', [('io', [('_io', [])]), ('json.decoder', [])]), ('os', [])])
+        self.assertEqual((imports[0]['self'], imports[0]['cumulative']), (0.0003, 0.00065))
+        self.assertEqual(parse_importtime(''), [])
+
+    # Check that applications are found by the name of their script or package
+    def test_find_application(self):
+        self.assertIs(find_application('weboob-debug'), WeboobDebug)
+        self.assertIs(find_application('weboobdebug'), WeboobDebug)
+        self.assertRaises(KeyError, find_application, 'unknown-application')
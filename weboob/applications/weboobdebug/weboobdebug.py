@@ -19,9 +19,11 @@
 
 from __future__ import print_function
 
+import json
 from optparse import OptionGroup
 
 from weboob.tools.application.base import Application
+from weboob.applications.weboobdebug.startup import find_application, measure_startup
 from weboob.browser.elements import generate_table_element
 
 
@@ -36,22 +38,32 @@ class WeboobDebug(Application):
         super(WeboobDebug, self).__init__(option_parser)
         options = OptionGroup(self._parser, 'Weboob-Debug options')
         options.add_option('-B', '--bpython', action='store_true', help='Prefer bpython over ipython')
+        options.add_option('-n', '--runs', type='int', default=5, help='Number of runs of bench-startup')
+        options.add_option('--min-time', type='float', default=5, help='Hide imports shorter than this (in ms)')
+        options.add_option('--json', help='Save results of bench-startup in this JSON file')
         self._parser.add_option_group(options)
 
+    BENCH_APPLICATIONS = ['boobank', 'videoob', 'weboob-config']
+
     def load_default_backends(self):
         pass
 
     def main(self, argv):
         """
-        BACKEND
+        BACKEND | bench-startup [APPLICATION ...]
 
-        Debug BACKEND.
+        Debug BACKEND, or measure time taken by applications to start.
         """
         try:
             backend_name = argv[1]
         except IndexError:
             print('Usage: %s BACKEND' % argv[0], file=self.stderr)
+            print('       %s bench-startup [APPLICATION ...]' % argv[0], file=self.stderr)
             return 1
+
+        if backend_name == 'bench-startup':
+            return self.bench_startup(argv[2:] or self.BENCH_APPLICATIONS)
+
         try:
             backend = self.weboob.load_backends(names=[backend_name])[backend_name]
         except KeyError:
@@ -70,6 +82,38 @@ class WeboobDebug(Application):
             funcs = [self.ipython, self.bpython, self.python]
         self.launch(funcs, locs, banner)
 
+    def bench_startup(self, names):
+        results = []
+        for name in names:
+            try:
+                klass = find_application(name)
+            except KeyError:
+                print(u'Unable to find application "%s"' % name, file=self.stderr)
+                return 1
+
+            try:
+                result = measure_startup(klass, self.options.runs)
+            except RuntimeError as e:
+                print(e, file=self.stderr)
+                return 1
+            results.append(result)
+
+            print(u'%s: main() after %.1f ms (min %.1f, max %.1f), imports took %.1f ms, process took %.1f ms' % (
+                  result['application'], result['main']['median'] * 1000, result['main']['min'] * 1000,
+                  result['main']['max'] * 1000, result['import']['median'] * 1000, result['wall']['median'] * 1000))
+            self.print_imports(result['imports'])
+
+        if self.options.json:
+            with open(self.options.json, 'w') as fp:
+                json.dump(results, fp, indent=2)
+
+    def print_imports(self, imports, depth=1):
+        for node in sorted(imports, key=lambda node: -node['cumulative']):
+            if node['cumulative'] * 1000 < self.options.min_time:
+                break
+            print(u'%s%-*s %8.1f ms' % ('  ' * depth, 60 - 2 * depth, node['name'], node['cumulative'] * 1000))
+            self.print_imports(node['children'], depth + 1)
+
     def launch(self, funcs, locs, banner):
         for func in funcs:
             try:
@@ -27,6 +27,9 @@ import shutil
 import subprocess
 from copy import copy
 from contextlib import closing
+from multiprocessing import cpu_count
+
+from concurrent.futures import ThreadPoolExecutor
 
 from weboob.core.repositories import Repository
 
@@ -137,26 +140,21 @@ class WeboobRepos(ReplApplication):
             else:
                 print('Keyring is up to date')
 
+        archives = []
         for name, module in r.modules.items():
             tarname = os.path.join(repo_path, '%s.tar.gz' % name)
             if r.signed:
                 sigfiles.append(os.path.basename(tarname))
-            module_path = os.path.join(source_path, name)
             if os.path.exists(tarname):
                 tar_mtime = int(datetime.fromtimestamp(os.path.getmtime(tarname)).strftime('%Y%m%d%H%M'))
                 if tar_mtime >= module.version:
                     continue
+            archives.append((name, module, tarname))
 
-            print('Create archive for %s' % name)
-            with closing(tarfile.open(tarname, 'w:gz')) as tar:
-                tar.add(module_path, arcname=name, filter=self._archive_excludes)
-            tar_mtime = mktime(strptime(str(module.version), '%Y%m%d%H%M'))
-            os.utime(tarname, (tar_mtime, tar_mtime))
-
-            # Copy icon.
-            icon_path = os.path.join(module_path, 'favicon.png')
-            if os.path.exists(icon_path):
-                shutil.copy(icon_path, os.path.join(repo_path, '%s.png' % name))
+        # Archives are independent, build them in parallel.
+        with ThreadPoolExecutor(cpu_count()) as executor:
+            for _ in executor.map(lambda args: self._create_archive(source_path, repo_path, *args), archives):
+                pass
 
         if r.signed:
             gpg = find_exe('gpg2') or find_exe('gpg')
@@ -193,7 +191,7 @@ class WeboobRepos(ReplApplication):
                 raise Exception('No suitable secret key found')
 
             # Check if all files have an up to date signature
-            for filename in sigfiles:
+            def sign(filename):
                 filepath = os.path.realpath(os.path.join(repo_path, filename))
                 sigpath = filepath + '.sig'
                 file_mtime = int(os.path.getmtime(filepath))
@@ -212,8 +210,26 @@ class WeboobRepos(ReplApplication):
                         '--output', sigpath,
                         '--sign', filepath])
                     os.utime(sigpath, (file_mtime, file_mtime))
+
+            # One at a time, as gpg may ask for the passphrase.
+            for filename in sigfiles:
+                sign(filename)
             print('Signatures are up to date')
 
+    def _create_archive(self, source_path, repo_path, name, module, tarname):
+        module_path = os.path.join(source_path, name)
+
+        print('Create archive for %s' % name)
+        with closing(tarfile.open(tarname, 'w:gz')) as tar:
+            tar.add(module_path, arcname=name, filter=self._archive_excludes)
+        tar_mtime = mktime(strptime(str(module.version), '%Y%m%d%H%M'))
+        os.utime(tarname, (tar_mtime, tar_mtime))
+
+        # Copy icon.
+        icon_path = os.path.join(module_path, 'favicon.png')
+        if os.path.exists(icon_path):
+            shutil.copy(icon_path, os.path.join(repo_path, '%s.png' % name))
+
     def _archive_excludes(self, tarinfo):
         filename = tarinfo.name
         # Skip *.pyc files in tarballs.
@@ -18,10 +18,16 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from threading import Lock
+
 import requests
+try:
+    from requests.packages import urllib3
+except ImportError:
+    import urllib3
 
 
-__all__ = ['HTTPAdapter']
+__all__ = ['HTTPAdapter', 'SharedHTTPAdapter', 'get_shared_adapter', 'close_shared_adapters', 'get_pools_stats']
 
 
 class HTTPAdapter(requests.adapters.HTTPAdapter):
@@ -39,3 +45,178 @@ class HTTPAdapter(requests.adapters.HTTPAdapter):
         headers = super(HTTPAdapter, self).proxy_headers(proxy)
         headers.update(self._proxy_headers)
         return headers
+
+
+_waits_lock = Lock()
+
+
+class _WaitCountingPoolMixin(object):
+    # Count requests which wait for a connection of the pool, because all
+    # of them are used.
+    num_waiting = 0
+    num_waits = 0
+
+    def _get_conn(self, timeout=None):
+        if self.pool is None or not self.pool.empty():
+            return super(_WaitCountingPoolMixin, self)._get_conn(timeout)
+
+        with _waits_lock:
+            self.num_waiting += 1
+            self.num_waits += 1
+        try:
+            return super(_WaitCountingPoolMixin, self)._get_conn(timeout)
+        finally:
+            with _waits_lock:
+                self.num_waiting -= 1
+
+
+class _HTTPConnectionPool(_WaitCountingPoolMixin, urllib3.connectionpool.HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_WaitCountingPoolMixin, urllib3.connectionpool.HTTPSConnectionPool):
+    pass
+
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """
+    Adapter shared by sessions of several browsers, see
+    :func:`get_shared_adapter`.
+
+    It keeps a pool of :attr:`POOL_MAXSIZE` connections for each of
+    :attr:`POOLS` hosts. When all connections to a host are used, requests
+    wait for one of them.
+
+    Closing a session does not close its connections, as other sessions use
+    them. They are closed by :func:`close_shared_adapters`.
+    """
+
+    POOLS = 100
+    """
+    Number of hosts whose connections are kept.
+    """
+
+    POOL_MAXSIZE = 50
+    """
+    Maximum number of connections to a host, for all browsers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs['pool_connections'] = max(self.POOLS, kwargs.get('pool_connections', 0))
+        kwargs['pool_maxsize'] = max(self.POOL_MAXSIZE, kwargs.get('pool_maxsize', 0))
+        kwargs['pool_block'] = True
+        super(SharedHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def _set_pool_classes(self, manager):
+        manager.pool_classes_by_scheme = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+        return manager
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(SharedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self._set_pool_classes(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        new = proxy not in self.proxy_manager
+        manager = super(SharedHTTPAdapter, self).proxy_manager_for(proxy, **proxy_kwargs)
+        if new and not proxy.lower().startswith('socks'):
+            self._set_pool_classes(manager)
+        return manager
+
+    def close(self):
+        pass
+
+    def close_pools(self):
+        super(SharedHTTPAdapter, self).close()
+
+
+_shared_adapters = {}
+_shared_adapters_lock = Lock()
+
+
+def get_shared_adapter(proxies=None, verify=True, cert=None, **kwargs):
+    """
+    Get an adapter shared by all browsers with the same settings.
+
+    Connections pools of an adapter are kept by host, so browsers of the same
+    website reuse connections of each other, and skip TLS handshakes.
+    Cookies are not concerned, as they are stored by sessions.
+
+    Sizes of pools are the ones of :class:`SharedHTTPAdapter`, so they are
+    not part of the settings.
+
+    :param proxies: proxies used by the browser
+    :type proxies: dict
+    :param verify: TLS verification setting of the browser
+    :type verify: bool or str
+    :param cert: TLS client certificate of the browser
+    :type cert: str or tuple
+    :param kwargs: parameters of :class:`HTTPAdapter`
+    :rtype: :class:`SharedHTTPAdapter`
+    """
+    kwargs.pop('pool_connections', None)
+    kwargs.pop('pool_maxsize', None)
+    key = (tuple(sorted((proxies or {}).items())),
+           verify,
+           cert,
+           tuple(sorted((k, tuple(sorted(v.items())) if isinstance(v, dict) else v) for k, v in kwargs.items())))
+
+    with _shared_adapters_lock:
+        if key not in _shared_adapters:
+            _shared_adapters[key] = SharedHTTPAdapter(**kwargs)
+        return _shared_adapters[key]
+
+
+def close_shared_adapters():
+    """
+    Close connections of all shared adapters.
+    """
+    with _shared_adapters_lock:
+        adapters = list(_shared_adapters.values())
+        _shared_adapters.clear()
+
+    for adapter in adapters:
+        adapter.close_pools()
+
+
+def get_pools_stats(adapters=None):
+    """
+    Get usage of connections pools.
+
+    For each pool, `opened` is the number of connections opened,
+    `requests` the number of requests sent, `reused` the number of requests
+    sent on an already opened connection, and `idle` the number of
+    connections waiting to be reused. With shared adapters, `waiting` is the
+    number of requests waiting for a connection, as all of them are used,
+    and `waited` the number of requests which had to wait.
+
+    :param adapters: adapters to describe, by default the shared ones
+    :type adapters: list[:class:`requests.adapters.HTTPAdapter`]
+    :returns: stats by pool, the key is the URL of the host, with the proxy
+              if there is one
+    :rtype: dict
+    """
+    if adapters is None:
+        with _shared_adapters_lock:
+            adapters = list(_shared_adapters.values())
+
+    stats = {}
+    for adapter in adapters:
+        managers = [(None, adapter.poolmanager)]
+        managers += list(adapter.proxy_manager.items())
+        for proxy, manager in managers:
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                name = '%s://%s:%s' % (pool.scheme, pool.host, pool.port)
+                if proxy:
+                    name = '%s via %s' % (name, proxy)
+                pool_stats = stats.setdefault(name, {'opened': 0, 'requests': 0, 'reused': 0, 'idle': 0,
+                                                     'waiting': 0, 'waited': 0})
+                pool_stats['opened'] += pool.num_connections
+                pool_stats['requests'] += pool.num_requests
+                pool_stats['reused'] += max(0, pool.num_requests - pool.num_connections)
+                pool_stats['idle'] += sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+                pool_stats['waiting'] += getattr(pool, 'num_waiting', 0)
+                pool_stats['waited'] += getattr(pool, 'num_waits', 0)
+    return stats
@@ -33,11 +33,17 @@ except ImportError:
     import urllib3
 import os
 import sys
-from copy import deepcopy
 import inspect
 from datetime import datetime, timedelta
 from dateutil import parser
-from threading import Lock
+from threading import Event, Lock, Timer
+import time
+
+try:
+    from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, wait
+except ImportError:
+    # Asynchronous requests are not available, see sessions.py.
+    pass
 
 try:
     import requests
@@ -52,13 +58,15 @@ from weboob.tools.log import getLogger
 from weboob.tools.compat import basestring, unicode, urlparse, urljoin, urlencode, parse_qsl
 from weboob.tools.json import json
 
-from .adapters import HTTPAdapter
+from .adapters import HTTPAdapter, get_shared_adapter, get_pools_stats
+from .ratelimit import get_rate_limiter, parse_retry_after
+from .retrypolicy import get_circuit_breaker
 from .cookies import WeboobCookieJar
-from .exceptions import HTTPNotFound, ClientError, ServerError
+from .exceptions import HTTPNotFound, ClientError, ServerError, BrowserCancelled
 from .sessions import FuturesSession
 from .profiles import Firefox
 from .pages import NextPage
-from .url import URL, normalize_url
+from .url import URL, URLIndex, normalize_url
 
 
 class Browser(object):
@@ -93,9 +101,65 @@ class Browser(object):
     Maximum retries on failed requests.
     """
 
+    RETRY_POLICY = None
+    """
+    Retry failed requests, with a delay, according to this
+    :class:`weboob.browser.retrypolicy.RetryPolicy`. Otherwise, only
+    :attr:`MAX_RETRIES` retries of connection errors are done.
+    """
+
+    CIRCUIT_BREAKER_THRESHOLD = None
+    """
+    Number of consecutive failures (connection errors, timeouts and server
+    errors) of a host after which requests to it fail immediately, during
+    :attr:`CIRCUIT_BREAKER_TIMEOUT` seconds. None to disable.
+
+    See :class:`weboob.browser.retrypolicy.CircuitBreaker`.
+    """
+
+    CIRCUIT_BREAKER_TIMEOUT = 60.
+    """
+    Time before trying again a host which is down, in seconds.
+    """
+
     MAX_WORKERS = 10
     """
-    Maximum of threads for asynchronous requests.
+    Maximum of asynchronous requests running at the same time. They run in
+    threads shared by all browsers, see
+    :func:`weboob.browser.sessions.get_shared_executor`.
+    """
+
+    RATE_LIMIT = None
+    """
+    Maximum number of requests per second to a host, shared by all browsers
+    of the process. None for no limit. When browsers set different limits
+    for a host, the strictest ones apply.
+    """
+
+    RATE_LIMIT_BURST = 1
+    """
+    Number of requests which can be sent at once to a host after an idle
+    period, despite :attr:`RATE_LIMIT`.
+    """
+
+    MAX_IN_FLIGHT = None
+    """
+    Maximum number of requests at the same time to a host, shared by all
+    browsers of the process. None for no limit.
+    """
+
+    RATE_LIMIT_KEY = None
+    """
+    If set, limits apply to all requests of browsers with this key, instead
+    of being per host. For example, the name of the module.
+    """
+
+    SHARE_CONNECTIONS = False
+    """
+    Share connections pools with other browsers of the process which have the
+    same proxies and TLS settings, see
+    :func:`weboob.browser.adapters.get_shared_adapter`. Browsers which give
+    a client certificate to :meth:`open` should not share connections.
     """
 
     ALLOW_REFERRER = True
@@ -120,6 +184,7 @@ class Browser(object):
 
     def __init__(self, logger=None, proxy=None, responses_dirname=None, weboob=None, proxy_headers=None):
         self.logger = getLogger('browser', logger)
+        self.cancel_event = Event()
         self.responses_dirname = responses_dirname
         self.responses_count = 1
         self.responses_count_lock = Lock()
@@ -132,10 +197,42 @@ class Browser(object):
         self._setup_session(self.PROFILE)
         self.url = None
         self.response = None
+        self._prefetched = {}
 
     def deinit(self):
+        self.clear_prefetched()
         self.session.close()
 
+    def cancel(self):
+        """
+        Cancel requests of this browser.
+
+        The running request is aborted as soon as its response is received,
+        and next calls to :meth:`open` raise :class:`BrowserCancelled` without
+        reaching the network, until :meth:`resume` is called.
+
+        This method can be called from any thread.
+        """
+        self.cancel_event.set()
+
+    def resume(self):
+        """
+        Allow requests again after a call to :meth:`cancel`.
+        """
+        self.cancel_event.clear()
+
+    def raise_if_cancelled(self, response=None):
+        """
+        Raise :class:`BrowserCancelled` if :meth:`cancel` has been called.
+
+        :param response: if given, it is closed before raising
+        :type response: :class:`requests.Response`
+        """
+        if self.cancel_event.is_set():
+            if response is not None:
+                response.close()
+            raise BrowserCancelled('Requests of %s have been cancelled' % self.__class__.__name__)
+
     def set_normalized_url(self, response, **kwargs):
         response.url = normalize_url(response.url)
 
@@ -224,8 +321,13 @@ class Browser(object):
         if self.MAX_WORKERS > requests.adapters.DEFAULT_POOLSIZE:
             adapter_kwargs.update(pool_connections=self.MAX_WORKERS,
                                   pool_maxsize=self.MAX_WORKERS)
-        session.mount('https://', HTTPAdapter(**adapter_kwargs))
-        session.mount('http://', HTTPAdapter(**adapter_kwargs))
+        if self.SHARE_CONNECTIONS:
+            adapter = get_shared_adapter(self.PROXIES, session.verify, session.cert, **adapter_kwargs)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        else:
+            session.mount('https://', HTTPAdapter(**adapter_kwargs))
+            session.mount('http://', HTTPAdapter(**adapter_kwargs))
 
         if self.TIMEOUT:
             session.timeout = self.TIMEOUT
@@ -244,6 +346,21 @@ class Browser(object):
         if self.COOKIE_POLICY:
             session.cookies.set_policy(self.COOKIE_POLICY)
 
+    def get_connections_stats(self):
+        """
+        Get usage of connections pools of this browser, see
+        :func:`weboob.browser.adapters.get_pools_stats`.
+
+        When connections are shared, it includes requests of other browsers.
+
+        :rtype: dict
+        """
+        adapters = []
+        for adapter in self.session.adapters.values():
+            if adapter not in adapters:
+                adapters.append(adapter)
+        return get_pools_stats(adapters)
+
     def set_profile(self, profile):
         profile.setup_session(self.session)
 
@@ -270,6 +387,7 @@ class Browser(object):
                    data_encoding=None,
                    is_async=False,
                    callback=lambda response: response,
+                   prefetch=False,
                    **kwargs):
         """
         Make an HTTP request like a browser does:
@@ -314,6 +432,11 @@ class Browser(object):
                          with response as its first and only argument
         :type callback: function
 
+        :param prefetch: Process request in a non-blocking way, and keep the
+                         response for the next call with the same URL, see
+                         :meth:`prefetch`
+        :type prefetch: bool
+
         :rtype: :class:`requests.Response`
         """
         if 'async' in kwargs:
@@ -322,6 +445,8 @@ class Browser(object):
             is_async = kwargs['async']
             del kwargs['async']
 
+        self.raise_if_cancelled()
+
         if isinstance(url, basestring):
             url = normalize_url(url)
         elif isinstance(url, requests.Request):
@@ -347,17 +472,42 @@ class Browser(object):
         if timeout is None:
             timeout = self.TIMEOUT
 
+        if preq.method == 'GET' and not preq.body:
+            if prefetch:
+                if preq.url in self._prefetched:
+                    return self._prefetched[preq.url]
+                # The callback is called when the response is used.
+                callback = lambda response: response
+                is_async = True
+            elif self._prefetched:
+                future = self._prefetched.pop(preq.url, None)
+                # If it is still queued, it is faster to send it now.
+                if future is not None and not future.cancel():
+                    self.logger.debug('Use prefetched response of %s', preq.url)
+                    if is_async:
+                        return self.session.submit(lambda: callback(future.result()))
+                    return callback(future.result())
+        elif prefetch:
+            self.logger.debug('Unable to prefetch a %s request to %s', preq.method, preq.url)
+            return None
+
         # We define an inner_callback here in order to execute the same code
         # regardless of is_async param.
         def inner_callback(future, response):
+            self.raise_if_cancelled(response)
+
+            if response.status_code in (429, 503):
+                self.handle_retry_after(response)
+
             if allow_redirects:
                 response = self.handle_refresh(response)
 
             self.raise_for_status(response)
             return callback(response)
 
-        # call python-requests
-        response = self.session.send(preq,
+        def send(is_async):
+            # call python-requests
+            return self.session.send(preq,
                                      allow_redirects=allow_redirects,
                                      stream=stream,
                                      timeout=timeout,
@@ -366,7 +516,171 @@ class Browser(object):
                                      proxies=proxies,
                                      callback=inner_callback,
                                      is_async=is_async)
-        return response
+
+        limiter = self.get_rate_limiter(preq.url)
+        breaker = self.get_circuit_breaker(preq.url)
+        if limiter is None and breaker is None and self.RETRY_POLICY is None:
+            future = send(is_async)
+            if prefetch:
+                self._prefetched[preq.url] = future
+            return future
+
+        start = time.time()
+
+        def get_retry_delay(error, retries):
+            # Record a failure, and get the delay before the next try, or
+            # None if the error has to be raised.
+            if breaker is not None:
+                breaker.record(error)
+            if self.RETRY_POLICY is None:
+                return None
+
+            delay = self.RETRY_POLICY.get_retry_delay(preq.method, error, retries, time.time() - start)
+            if delay is not None:
+                self.logger.info('%r raised on %s, retry %d in %.1f seconds', error, preq.url, retries + 1, delay)
+            return delay
+
+        def limited_send():
+            if limiter is None:
+                return send(False)
+
+            limiter.acquire(self.raise_if_cancelled)
+            try:
+                return send(False)
+            finally:
+                limiter.release()
+
+        def guarded_send():
+            retries = 0
+            while True:
+                if breaker is not None:
+                    breaker.before_request()
+
+                try:
+                    response = limited_send()
+                except BrowserCancelled:
+                    raise
+                except Exception as error:
+                    delay = get_retry_delay(error, retries)
+                    if delay is None:
+                        raise
+
+                    retries += 1
+                    self.cancel_event.wait(delay)
+                    self.raise_if_cancelled()
+                else:
+                    if breaker is not None:
+                        breaker.record()
+                    return response
+
+        if not is_async:
+            return guarded_send()
+
+        # Asynchronous requests wait for the limiter and between retries
+        # outside of the executor, which is shared with other sites.
+        future = Future()
+        started = [False]
+
+        def start_future():
+            # False if the caller cancelled the request.
+            if not started[0]:
+                started[0] = True
+                return future.set_running_or_notify_cancel()
+            return True
+
+        def attempt(retries):
+            try:
+                self.raise_if_cancelled()
+                if breaker is not None:
+                    breaker.before_request()
+            except Exception as error:
+                if start_future():
+                    future.set_exception(error)
+                return
+
+            if limiter is None:
+                submit(retries)
+            else:
+                limiter.acquire_async(lambda: submit(retries))
+
+        def submit(retries):
+            if not start_future():
+                if limiter is not None:
+                    limiter.release()
+                return
+
+            try:
+                self.raise_if_cancelled()
+                sent = self.session.submit(send, False)
+            except Exception as error:
+                if limiter is not None:
+                    limiter.release()
+                future.set_exception(error)
+            else:
+                sent.add_done_callback(lambda sent: done(sent, retries))
+
+        def done(sent, retries):
+            if limiter is not None:
+                limiter.release()
+
+            error = CancelledError() if sent.cancelled() else sent.exception()
+            if error is None:
+                if breaker is not None:
+                    breaker.record()
+                future.set_result(sent.result())
+                return
+
+            delay = None
+            if not isinstance(error, BrowserCancelled):
+                delay = get_retry_delay(error, retries)
+            if delay is None:
+                future.set_exception(error)
+                return
+
+            timer = Timer(delay, attempt, (retries + 1,))
+            timer.daemon = True
+            timer.start()
+
+        attempt(0)
+        if prefetch:
+            self._prefetched[preq.url] = future
+        return future
+
+    def get_rate_limiter(self, url):
+        """
+        Get the limiter of requests to this URL, see :attr:`RATE_LIMIT` and
+        :attr:`MAX_IN_FLIGHT`.
+
+        :rtype: :class:`weboob.browser.ratelimit.RateLimiter` or None
+        """
+        key = self.RATE_LIMIT_KEY or urlparse(url).hostname
+        return get_rate_limiter(key, self.RATE_LIMIT, self.RATE_LIMIT_BURST, self.MAX_IN_FLIGHT,
+                                create=self.RATE_LIMIT is not None or self.MAX_IN_FLIGHT is not None)
+
+    def get_circuit_breaker(self, url):
+        """
+        Get the circuit breaker of the host of this URL, see
+        :attr:`CIRCUIT_BREAKER_THRESHOLD`.
+
+        It can be used to know if the site is down, before calling a method of
+        the browser.
+
+        :rtype: :class:`weboob.browser.retrypolicy.CircuitBreaker` or None
+        """
+        if self.CIRCUIT_BREAKER_THRESHOLD is None:
+            return None
+        return get_circuit_breaker(urlparse(url).hostname, self.CIRCUIT_BREAKER_THRESHOLD,
+                                   self.CIRCUIT_BREAKER_TIMEOUT)
+
+    def handle_retry_after(self, response):
+        """
+        Delay next requests to the site as it asks with the Retry-After header.
+        """
+        delay = parse_retry_after(response.headers.get('Retry-After'))
+        if delay:
+            self.logger.info('%s asks to retry after %s seconds', response.url, delay)
+            key = self.RATE_LIMIT_KEY or urlparse(response.url).hostname
+            get_rate_limiter(key).block(delay)
 
     def async_open(self, url, **kwargs):
         """
@@ -378,6 +692,107 @@ class Browser(object):
             del kwargs['is_async']
         return self.open(url, is_async=True, **kwargs)
 
+    def prefetch(self, url, **kwargs):
+        """
+        Start to open an URL in background, while the caller does something
+        else, for example parsing the current page.
+
+        The response is used by the next call to :meth:`open` (or
+        :meth:`location`) with the same URL. Only GET requests can be
+        prefetched.
+
+        Arguments are the same as :meth:`open`.
+
+        :rtype: :class:`concurrent.futures.Future` or None
+        """
+        kwargs.pop('is_async', None)
+        return self.open(url, prefetch=True, **kwargs)
+
+    def clear_prefetched(self):
+        """
+        Drop responses of :meth:`prefetch` which have not been used.
+        """
+        prefetched, self._prefetched = self._prefetched, {}
+        for future in prefetched.values():
+            future.cancel()
+
+    def open_many(self, urls, max_concurrency=None, ordered=False, return_exceptions=False, **kwargs):
+        """
+        Open several URLs at the same time, with :meth:`open`.
+
+        Responses are yielded as they are received, or in the order of `urls`
+        if `ordered` is True. Other requests are still running while the
+        caller handles a response.
+
+        For example, to get details of several items:
+
+        >>> for url, response in browser.open_many(urls): # doctest: +SKIP
+        ...     yield response.page.get_details()
+
+        Other arguments are given to :meth:`open`.
+
+        :param urls: URLs or :class:`requests.Request` objects
+        :type urls: iterable
+        :param max_concurrency: maximum number of requests at the same time,
+                                :attr:`MAX_WORKERS` by default
+        :type max_concurrency: int
+        :param ordered: yield responses in the order of requests
+        :type ordered: bool
+        :param return_exceptions: yield the exception raised by a request
+                                  instead of its response. Otherwise, it is
+                                  raised and other requests are cancelled.
+        :type return_exceptions: bool
+        :returns: pairs of the URL and its response
+        :rtype: iter[(str or :class:`requests.Request`, :class:`requests.Response`)]
+        """
+        if max_concurrency is None:
+            max_concurrency = self.MAX_WORKERS
+
+        urls = iter(urls)
+        # Future of every running request, with its position and its URL.
+        running = OrderedDict()
+        # Finished requests by position, waiting to be yielded.
+        finished = {}
+        next_position = 0
+        count = 0
+
+        try:
+            while True:
+                for url in urls:
+                    running[self.open(url, is_async=True, **kwargs)] = (count, url)
+                    count += 1
+                    if len(running) >= max_concurrency:
+                        break
+
+                if not running:
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    position, url = running.pop(future)
+                    finished[position] = (url, future)
+
+                if ordered:
+                    positions = []
+                    while next_position in finished:
+                        positions.append(next_position)
+                        next_position += 1
+                else:
+                    positions = sorted(finished)
+
+                for position in positions:
+                    url, future = finished.pop(position)
+                    try:
+                        response = future.result()
+                    except Exception as error:
+                        if not return_exceptions:
+                            raise
+                        response = error
+                    yield url, response
+        finally:
+            for future in running:
+                future.cancel()
+
     def raise_for_status(self, response):
         """
         Like Response.raise_for_status but will use other classes if needed.
@@ -665,19 +1080,34 @@ class PagesBrowser(DomainBrowser):
 
         self.page = None
 
-        # exclude properties because they can access other fields not yet defined
-        def is_property(attr):
-            v = getattr(type(self), attr, None)
-            return hasattr(v, '__get__') or hasattr(v, '__set__')
-
-        attrs = [(attr, getattr(self, attr)) for attr in dir(self) if not is_property(attr)]
-        attrs = [v for v in attrs if isinstance(v[1], URL)]
-        attrs.sort(key=lambda v: v[1]._creation_counter)
-        self._urls = OrderedDict(deepcopy(attrs))
+        attrs = dict(self.get_class_urls())
+        # URL objects set on the instance before.
+        attrs.update((attr, value) for attr, value in vars(self).items() if isinstance(value, URL))
+        attrs = sorted(attrs.items(), key=lambda v: v[1]._creation_counter)
+        self._urls = OrderedDict((attr, url.bind(self)) for attr, url in attrs)
         for k, v in self._urls.items():
             setattr(self, k, v)
-        for url in self._urls.values():
-            url.browser = self
+
+    @classmethod
+    def get_class_urls(cls):
+        """
+        Get :class:`URL` objects of the class.
+
+        They are collected once per class, and again if its bases change, like
+        with :class:`AbstractBrowser`.
+
+        :returns: names and URL objects
+        :rtype: list[(str, :class:`URL`)]
+        """
+        cached = cls.__dict__.get('_class_urls')
+        if cached is None or cached[0] != cls.__mro__:
+            attrs = {}
+            for klass in cls.__mro__:
+                for attr, value in vars(klass).items():
+                    attrs.setdefault(attr, value)
+            cached = (cls.__mro__, [(attr, value) for attr, value in attrs.items() if isinstance(value, URL)])
+            cls._class_urls = cached
+        return cached[1]
 
     def open(self, *args, **kwargs):
         """
@@ -700,8 +1130,8 @@ class PagesBrowser(DomainBrowser):
                 response.page = page_class(self, response)
                 return callback(response)
 
-            for url in self._urls.values():
-                response.page = url.handle(response)
+            for name in self.get_url_index().get_candidates(response.url):
+                response.page = self._urls[name].handle(response)
                 if response.page is not None:
                     self.logger.debug('Handle %s with %s', response.url, response.page.__class__.__name__)
                     break
@@ -723,6 +1153,19 @@ class PagesBrowser(DomainBrowser):
 
         return super(PagesBrowser, self).open(callback=internal_callback, *args, **kwargs)
 
+    def get_url_index(self):
+        """
+        Get the index of :class:`URL` objects with a page class, which finds
+        the ones which may handle a response.
+
+        It is built again when :attr:`BASEURL` or regexps of URL objects
+        change, for example with ``self.url.urls.insert(0, regexp)``.
+
+        :rtype: :class:`weboob.browser.url.URLIndex`
+        """
+        urls = [(name, url) for name, url in self._urls.items() if url.klass is not None]
+        return URLIndex.get(urls, self.BASEURL)
+
     def location(self, *args, **kwargs):
         """
         Same method than
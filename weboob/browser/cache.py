@@ -17,14 +17,227 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
-__all__ = ['CacheMixin']
+import json
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from email.utils import mktime_tz, parsedate_tz
+from hashlib import sha1
+from threading import Lock
+
+from requests import PreparedRequest, Request, Response
+from requests.structures import CaseInsensitiveDict
+
+from weboob.tools.compat import basestring, urlencode
+
+from .url import normalize_url
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+__all__ = ['CacheMixin', 'SQLiteCache']
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header.
+
+    >>> sorted(parse_cache_control('no-cache, Max-Age="60"').items())
+    [('max-age', '60'), ('no-cache', None)]
+
+    :rtype: dict
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, arg = directive.partition('=')
+        name = name.strip().lower()
+        if name:
+            directives[name] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def parse_http_date(value):
+    """
+    Parse a date of an HTTP header to a timestamp, or None if it is invalid.
+    """
+    if not value:
+        return None
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return mktime_tz(date)
+
+
+def _seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
 
 
 class CacheEntry(object):
-    def __init__(self, response):
+    HEURISTIC_FRACTION = 0.1
+    """
+    Part of the time since the last modification during which a response
+    without explicit expiration is fresh (RFC 7234, 4.2.2).
+    """
+
+    HEURISTIC_MAX = 24 * 3600
+    """
+    Maximum heuristic freshness lifetime, in seconds.
+    """
+
+    def __init__(self, response, request_time=None):
         self.response = response
         self.etag = response.headers.get('ETag')
         self.last_modified = response.headers.get('Last-Modified')
+        self.set_age(request_time)
+
+        # Values of request headers listed in the Vary header of the response.
+        self.vary = {}
+        request_headers = getattr(response.request, 'headers', {})
+        for name in self.vary_names:
+            self.vary[name] = request_headers.get(name)
+
+    @property
+    def vary_names(self):
+        return [name.strip().lower() for name in self.response.headers.get('Vary', '').split(',') if name.strip()]
+
+    def matches(self, headers):
+        """
+        Check if the response can be used for a request with these headers.
+
+        :param headers: headers of the request
+        :type headers: :class:`requests.structures.CaseInsensitiveDict`
+        """
+        if '*' in self.vary:
+            return False
+        for name, value in self.vary.items():
+            if headers.get(name) != value:
+                return False
+        return True
+
+    def set_age(self, request_time=None):
+        """
+        Compute the age of the response when it is received (RFC 7234, 4.2.3).
+        """
+        self.response_time = time.time()
+        if request_time is None:
+            request_time = self.response_time
+
+        date = parse_http_date(self.response.headers.get('Date'))
+        apparent_age = max(0, self.response_time - date) if date is not None else 0
+        age = _seconds(self.response.headers.get('Age')) or 0
+        self.initial_age = max(apparent_age, age + self.response_time - request_time)
+
+    def __getstate__(self):
+        # The response is linked to the browser by its request and hooks,
+        # only keep what pages need.
+        response = {'status_code': self.response.status_code,
+                    'headers': dict(self.response.headers),
+                    'url': self.response.url,
+                    'encoding': self.response.encoding,
+                    'reason': self.response.reason,
+                    'content': self.response.content,
+                   }
+        return {'response': response,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'response_time': self.response_time,
+                'initial_age': self.initial_age,
+                'vary': self.vary,
+               }
+
+    def __setstate__(self, state):
+        self.etag = state['etag']
+        self.last_modified = state['last_modified']
+        self.response_time = state.get('response_time', 0)
+        self.initial_age = state.get('initial_age', 0)
+        self.vary = state.get('vary', {})
+
+        self.response = Response()
+        for attr, value in state['response'].items():
+            if attr == 'content':
+                self.response._content = value
+            elif attr == 'headers':
+                self.response.headers = CaseInsensitiveDict(value)
+            else:
+                setattr(self.response, attr, value)
+
+    @property
+    def cache_control(self):
+        return parse_cache_control(self.response.headers.get('Cache-Control'))
+
+    @property
+    def age(self):
+        """
+        Current age of the response, in seconds.
+        """
+        return self.initial_age + time.time() - self.response_time
+
+    def get_freshness_lifetime(self, shared=False):
+        """
+        Get how long the response is fresh after its generation, in seconds
+        (RFC 7234, 4.2.1).
+
+        :param shared: the cache is shared between users
+        :type shared: bool
+        """
+        cache_control = self.cache_control
+        if 'no-cache' in cache_control:
+            return 0
+
+        if shared and _seconds(cache_control.get('s-maxage')) is not None:
+            return _seconds(cache_control['s-maxage'])
+        if _seconds(cache_control.get('max-age')) is not None:
+            return _seconds(cache_control['max-age'])
+
+        if 'Expires' in self.response.headers:
+            expires = parse_http_date(self.response.headers['Expires'])
+            if expires is None:
+                # Invalid dates represent a time in the past.
+                return 0
+            date = parse_http_date(self.response.headers.get('Date'))
+            if date is None:
+                date = self.response_time
+            return max(0, expires - date)
+
+        last_modified = parse_http_date(self.last_modified)
+        if last_modified is not None:
+            date = parse_http_date(self.response.headers.get('Date')) or self.response_time
+            return min(self.HEURISTIC_MAX, max(0, (date - last_modified) * self.HEURISTIC_FRACTION))
+
+        return 0
+
+    def is_fresh(self, shared=False):
+        return self.age < self.get_freshness_lifetime(shared)
+
+    def can_serve_stale(self, shared=False):
+        """
+        Check if the response can be served while it is revalidated, because
+        of its stale-while-revalidate directive (RFC 5861).
+        """
+        cache_control = self.cache_control
+        if 'must-revalidate' in cache_control or (shared and 'proxy-revalidate' in cache_control):
+            return False
+        delay = _seconds(cache_control.get('stale-while-revalidate'))
+        return delay is not None and self.age < self.get_freshness_lifetime(shared) + delay
+
+    def freshen(self, response, request_time=None):
+        """
+        Update the entry with headers of a 304 response (RFC 7234, 4.3.4).
+        """
+        for name, value in response.headers.items():
+            if name.lower() not in ('content-length', 'content-encoding', 'transfer-encoding'):
+                self.response.headers[name] = value
+        self.etag = self.response.headers.get('ETag')
+        self.last_modified = self.response.headers.get('Last-Modified')
+        self.set_age(request_time)
 
     def has_cache_key(self):
         return (self.etag or self.last_modified)
@@ -36,9 +249,145 @@ class CacheEntry(object):
             request.headers['If-None-Match'] = self.etag
 
 
+class SQLiteCache(MutableMapping):
+    """
+    Cache store saved in a SQLite database, to be used as
+    :attr:`CacheMixin.cache`.
+
+    It can be shared by several browsers, and by several processes. When the
+    size of stored values exceeds *max_size*, least recently used entries are
+    removed.
+
+    :param path: path of the database file
+    :type path: str
+    :param max_size: maximum size of stored values, in bytes
+    :type max_size: int
+    :param compress: compress values with zlib
+    :type compress: bool
+    :param timeout: time to wait for a lock of another process, in seconds
+    :type timeout: float
+    """
+
+    def __init__(self, path, max_size=100 * 1024 * 1024, compress=True, timeout=30):
+        self.path = path
+        self.max_size = max_size
+        self.compress = compress
+        self.timeout = timeout
+        self.evictions = 0
+
+        self._lock = Lock()
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self):
+        # A connection can't be shared with forked processes.
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                                         isolation_level=None)
+            self._pid = os.getpid()
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS entries (hash TEXT PRIMARY KEY, key BLOB, value BLOB, '
+                               'compressed INTEGER, size INTEGER, atime REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)')
+        return self._conn
+
+    def _hash(self, key):
+        return sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def __getitem__(self, key):
+        with self._lock:
+            h = self._hash(key)
+            row = self.conn.execute('SELECT value, compressed FROM entries WHERE hash = ?', (h,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            self.conn.execute('UPDATE entries SET atime = ? WHERE hash = ?', (time.time(), h))
+
+        value, compressed = row
+        value = bytes(value)
+        if compressed:
+            value = zlib.decompress(value)
+        return pickle.loads(value)
+
+    def __setitem__(self, key, value):
+        value = pickle.dumps(value, protocol=2)
+        if self.compress:
+            value = zlib.compress(value)
+
+        with self._lock:
+            conn = self.conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                             (self._hash(key), sqlite3.Binary(pickle.dumps(key, protocol=2)), sqlite3.Binary(value),
+                              int(self.compress), len(value), time.time()))
+                self._evict(conn)
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            else:
+                conn.execute('COMMIT')
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        hashes = []
+        for h, size in conn.execute('SELECT hash, size FROM entries ORDER BY atime'):
+            if total <= self.max_size:
+                break
+            hashes.append((h,))
+            total -= size
+        conn.executemany('DELETE FROM entries WHERE hash = ?', hashes)
+        self.evictions += len(hashes)
+
+    def __delitem__(self, key):
+        with self._lock:
+            cursor = self.conn.execute('DELETE FROM entries WHERE hash = ?', (self._hash(key),))
+        if not cursor.rowcount:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self.conn.execute('SELECT 1 FROM entries WHERE hash = ?', (self._hash(key),)).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            keys = self.conn.execute('SELECT key FROM entries').fetchall()
+        for key, in keys:
+            yield pickle.loads(bytes(key))
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute('DELETE FROM entries')
+
+    @property
+    def size(self):
+        """
+        Size of stored values, in bytes.
+        """
+        with self._lock:
+            return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.path)
+
+
 class CacheMixin(object):
     """Mixin to inherit in a Browser"""
 
+    CACHEABLE_METHODS = ('GET', 'HEAD')
+    """
+    Methods of requests whose responses are cached. Other requests are
+    always sent, and remove cached responses of their URL when they succeed
+    (RFC 7234, 4.4).
+    """
+
     def __init__(self, *args, **kwargs):
         super(CacheMixin, self).__init__(*args, **kwargs)
 
@@ -47,6 +396,7 @@ class CacheMixin(object):
         """Cache store object
 
         To limit the size of the cache, a :class:`weboob.tools.lrudict.LimitedLRUDict`
+        instance can be used. To keep it between runs, a :class:`SQLiteCache`
         instance can be used.
         """
 
@@ -58,41 +408,205 @@ class CacheMixin(object):
         will always be returned.
 
         If `True`, the `ETag` and `Last-Modified` of the response will be
-        stored along with the cache. When the request is re-executed, instead
-        of simply returning the previous response, the server is queried to
-        check if a newer version of the page exists.
+        stored along with the cache. While the response is fresh according to
+        its `Cache-Control` or `Expires` headers, it is returned without
+        querying the server. Then, instead of simply returning the previous
+        response, the server is queried to check if a newer version of the page
+        exists.
         If a newer page exists, it is returned instead and overwrites the
         obsolete page in the cache.
         """
 
+        self.is_shared_cache = False
+
+        """Whether the cache is shared between users
+
+        If `True`, responses with `Cache-Control: private` are not stored, and
+        `s-maxage` is used instead of `max-age`.
+        """
+
+        self.cache_stats = {'hits': 0, 'misses': 0, 'revalidations': 0, 'bytes': 0}
+
+        """Counters of requests
+
+        `hits` are responses served from the cache without querying the
+        server, `revalidations` are responses served from the cache after the
+        server answered they were not modified, and `misses` are responses
+        downloaded. `bytes` is the size of responses served from the cache.
+
+        See also :meth:`get_cache_stats`.
+        """
+
+        self._cache_lock = Lock()
+        self._cache_refreshing = set()
+
+    def _count_cache(self, name, entry=None):
+        with self._cache_lock:
+            self.cache_stats[name] += 1
+            if entry is not None:
+                self.cache_stats['bytes'] += len(entry.response.content)
+
+    def get_cache_stats(self):
+        """
+        Get counters of the cache.
+
+        In addition to :attr:`cache_stats`, `evictions` is the number of
+        entries removed by the cache store to limit its size, if it counts
+        them, and `entries` is the number of stored entries.
+
+        :rtype: dict
+        """
+        with self._cache_lock:
+            stats = dict(self.cache_stats)
+        stats['evictions'] = getattr(self.cache, 'evictions', 0)
+        stats['entries'] = len(self.cache)
+        return stats
+
     def make_cache_key(self, request):
-        """Make a key for the cache corresponding to the request."""
+        """Make a key for the cache corresponding to the request.
+
+        It is built from the method, the normalized URL and the body of the
+        request. Headers are not part of the key: a cached response is only
+        used if the request headers listed in its `Vary` header have the same
+        values.
+
+        Override this method to use another key, for example to ignore a
+        parameter of the URL.
+        """
 
         body = getattr(request, 'body', None)
-        headers = tuple(request.headers.values())
-        return (request.method, request.url, body, headers)
+        if body is None:
+            data = getattr(request, 'data', None)
+            if data:
+                if isinstance(data, dict):
+                    body = urlencode(sorted(data.items()), doseq=True)
+                elif isinstance(data, (list, tuple)):
+                    body = urlencode(data, doseq=True)
+                elif isinstance(data, (bytes, basestring)):
+                    body = data
+                else:
+                    body = repr(data)
+            elif getattr(request, 'json', None) is not None:
+                body = json.dumps(request.json, sort_keys=True)
+
+        url = request.url
+        if getattr(request, 'params', None):
+            # Parameters are only added to the URL when the request is prepared.
+            prepared = PreparedRequest()
+            prepared.prepare_url(url, request.params)
+            url = prepared.url
+        url = normalize_url(url).split('#')[0]
+        return (request.method.upper(), url, body)
+
+    def _get_cache_headers(self, request):
+        # Headers sent with the request, with the default ones of the session,
+        # the authentication and the cookies, like in the stored responses.
+        return self.prepare_request(request).headers
 
     def open_with_cache(self, url, **kwargs):
         """Perform a request using the cache if possible."""
         request = self.build_request(url, **kwargs)
 
+        if request.method.upper() not in self.CACHEABLE_METHODS:
+            response = super(CacheMixin, self).open(request, **kwargs)
+            if response.status_code < 400:
+                self.invalidate_cache(request)
+            return response
+
         key = self.make_cache_key(request)
-        if key in self.cache:
-            if not self.is_updatable:
+        request_cache_control = parse_cache_control(request.headers.get('Cache-Control'))
+        # The request can ask to revalidate cached responses.
+        revalidate = 'no-cache' in request_cache_control or request.headers.get('Pragma') == 'no-cache'
+
+        try:
+            entry = self.cache[key]
+        except KeyError:
+            entry = None
+        else:
+            if entry.vary and not entry.matches(self._get_cache_headers(request)):
+                self.logger.debug('cached response of %r varies', request.url)
+                entry = None
+
+        if entry is not None:
+            if not revalidate and (not self.is_updatable or entry.is_fresh(self.is_shared_cache)):
                 self.logger.debug('cache HIT for %r', request.url)
-                return self.cache[key].response
-            else:
-                self.cache[key].update_request(request)
+                self._count_cache('hits', entry)
+                return entry.response
+
+            entry.update_request(request)
 
+            if not revalidate and entry.can_serve_stale(self.is_shared_cache):
+                self.logger.debug('cache HIT for %r (stale, revalidating)', request.url)
+                self._count_cache('hits', entry)
+                self._refresh_cache(key, entry, request, kwargs)
+                return entry.response
+
+        request_time = time.time()
         response = super(CacheMixin, self).open(request, **kwargs)
-        if response.status_code == 304:
-            self.logger.debug('cache HIT for %r', request.url)
-            return self.cache[key].response
-        elif response.status_code == 200:
-            entry = CacheEntry(response)
-            if entry.has_cache_key():
+        return self._store_response(key, entry, request, request_cache_control, request_time, response)
+
+    def invalidate_cache(self, request):
+        """
+        Remove cached responses of the URL of a request, after it changed
+        something on the server.
+        """
+        for method in self.CACHEABLE_METHODS:
+            key = self.make_cache_key(Request(method=method, url=request.url, params=request.params))
+            try:
+                del self.cache[key]
+            except KeyError:
+                pass
+            else:
+                self.logger.debug('removing %s %r response from cache', method, request.url)
+
+    def _store_response(self, key, entry, request, request_cache_control, request_time, response):
+        if response.status_code == 304 and entry is not None:
+            self.logger.debug('cache HIT for %r (revalidated)', request.url)
+            self._count_cache('revalidations', entry)
+            entry.freshen(response, request_time)
+            # Save the new headers, the store is not always in memory.
+            self.cache[key] = entry
+            return entry.response
+
+        self._count_cache('misses')
+        if response.status_code == 200:
+            entry = CacheEntry(response, request_time)
+            cache_control = entry.cache_control
+            if 'no-store' in cache_control or 'no-store' in request_cache_control or \
+               (self.is_shared_cache and 'private' in cache_control) or \
+               (self.is_shared_cache and 'Authorization' in self._get_cache_headers(request) and
+                not ('public' in cache_control or 's-maxage' in cache_control or 'must-revalidate' in cache_control)):
+                self.logger.debug('not storing %r response in cache', request.url)
+            # Without validators, a response is only useful if it is never
+            # updated or while it is fresh.
+            elif entry.has_cache_key() or not self.is_updatable or \
+                 entry.get_freshness_lifetime(self.is_shared_cache) > 0:
                 self.logger.debug('storing %r response in cache', request.url)
                 self.cache[key] = entry
 
         self.logger.debug('cache MISS for %r', request.url)
         return response
+
+    def _refresh_cache(self, key, entry, request, kwargs):
+        with self._cache_lock:
+            if key in self._cache_refreshing:
+                return
+            self._cache_refreshing.add(key)
+
+        request_time = time.time()
+
+        def callback(response):
+            try:
+                return self._store_response(key, entry, request, {}, request_time, response)
+            finally:
+                with self._cache_lock:
+                    self._cache_refreshing.discard(key)
+
+        def done(future):
+            if future.exception() is not None:
+                with self._cache_lock:
+                    self._cache_refreshing.discard(key)
+                self.logger.debug('unable to refresh %r: %s', request.url, future.exception())
+
+        future = super(CacheMixin, self).open(request, is_async=True, callback=callback, **kwargs)
+        future.add_done_callback(done)
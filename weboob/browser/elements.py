@@ -19,6 +19,8 @@
 
 from __future__ import print_function
 
+import datetime
+from decimal import Decimal
 import os
 import re
 import sys
@@ -26,13 +28,19 @@ from collections import OrderedDict
 from copy import deepcopy
 import traceback
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 import lxml.html
 
 from weboob.tools.log import getLogger, DEBUG_FILTERS
 from weboob.tools.compat import basestring, unicode, with_metaclass
-from weboob.browser.pages import NextPage
-from weboob.capabilities.base import FetchError
+from weboob.browser.pages import NextPage, Page
+from weboob.capabilities.base import EmptyType, FetchError
 
+from .filters.base import compile_css, select_xpath
 from .filters.standard import _Filter, CleanText
 from .filters.html import AttributeNotFound, XPathNotFound
 
@@ -40,6 +48,116 @@ from .filters.html import AttributeNotFound, XPathNotFound
 __all__ = ['DataError', 'AbstractElement', 'ListElement', 'ItemElement', 'TableElement', 'SkipItem']
 
 
+_filters_logger = getLogger('b2filters')
+
+_IMMUTABLE_TYPES = (basestring, bytes, int, float, Decimal, type(None), EmptyType, type,
+                    datetime.date, datetime.time, datetime.timedelta)
+
+
+def _is_immutable(value):
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return True
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(v) for v in value)
+    return False
+
+
+_DELETED = object()
+
+
+class ElementEnv(MutableMapping):
+    """
+    Environment of an element, with variables given to its parent elements.
+
+    It behaves like a deep copy of the environment of the parent, but values
+    of the parent are read through, and only copied when they are changed:
+
+    * a write or a deletion goes to the layer of this environment, which is
+      copied first if it is shared with children created before;
+    * a mutable value which is also seen by a parent or a child is deep
+      copied into this environment when it is read, as it may be changed in
+      place.
+
+    :param parent: environment of the parent element
+    :type parent: :class:`ElementEnv`
+    :param data: initial variables, which are not copied
+    :type data: dict
+    """
+
+    def __init__(self, parent=None, data=None):
+        self._own = {}
+        # The layer of this environment is seen by children.
+        self._shared = False
+        # Keys whose values are seen by children, since the layer has been
+        # copied.
+        self._shared_keys = set()
+        if parent is not None:
+            self._layers = parent._fork()
+        else:
+            self._layers = [data or {}]
+
+    def _fork(self):
+        # Layers seen by a child environment. This one is now shared, and
+        # will be copied before being changed.
+        self._shared = True
+        return [self._own] + self._layers
+
+    def _set(self, key, value):
+        if self._shared:
+            self._own = dict(self._own)
+            self._shared_keys = set(self._own)
+            self._shared = False
+        self._own[key] = value
+        self._shared_keys.discard(key)
+
+    def __getitem__(self, key):
+        if key in self._own and not self._shared and key not in self._shared_keys:
+            value = self._own[key]
+            if value is _DELETED:
+                raise KeyError(key)
+            return value
+
+        for layer in ([self._own] if key in self._own else self._layers):
+            if key in layer:
+                value = layer[key]
+                if value is _DELETED:
+                    break
+                if not _is_immutable(value):
+                    value = deepcopy(value)
+                    self._set(key, value)
+                return value
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._set(key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._set(key, _DELETED)
+
+    def __contains__(self, key):
+        for layer in [self._own] + self._layers:
+            if key in layer:
+                return layer[key] is not _DELETED
+        return False
+
+    def __iter__(self):
+        seen = set()
+        for layer in [self._own] + self._layers:
+            for key, value in layer.items():
+                if key not in seen:
+                    seen.add(key)
+                    if value is not _DELETED:
+                        yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, dict(self.items()))
+
+
 def generate_table_element(doc, head_xpath, cleaner=CleanText):
     """
     Prints generated base code for TableElement/TableCell usage.
@@ -91,7 +209,29 @@ def method(klass):
     return inner
 
 
-class AbstractElement(object):
+class _ElementMeta(type):
+    """
+    Private meta-class used to find once per class the nested elements and
+    the loaders of elements, instead of for every parsed node.
+    """
+    def __new__(mcs, name, bases, attrs):
+        new_class = super(_ElementMeta, mcs).__new__(mcs, name, bases, attrs)
+
+        elements = []
+        loaders = []
+        for attrname in dir(new_class):
+            if attrname.startswith('load_'):
+                loaders.append((attrname[len('load_'):], attrname))
+            else:
+                value = getattr(new_class, attrname)
+                if isinstance(value, _ElementMeta) and value is not new_class:
+                    elements.append(value)
+        new_class._element_classes = elements
+        new_class._loader_attrs = loaders
+        return new_class
+
+
+class AbstractElement(with_metaclass(_ElementMeta, object)):
     _creation_counter = 0
     condition = None
 
@@ -106,9 +246,9 @@ class AbstractElement(object):
             self.el = page.doc
 
         if parent is not None:
-            self.env = deepcopy(parent.env)
+            self.env = ElementEnv(parent.env)
         else:
-            self.env = deepcopy(page.params)
+            self.env = ElementEnv(data=dict(page.params or {}))
 
         # Used by debug
         self._random_id = AbstractElement._creation_counter
@@ -127,6 +267,8 @@ class AbstractElement(object):
             value = list(func(self.page, self, self.el)())
         elif callable(func):
             value = func()
+        elif _is_immutable(func):
+            value = func
         else:
             value = deepcopy(func)
 
@@ -136,17 +278,17 @@ class AbstractElement(object):
         pass
 
     def cssselect(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs and isinstance(self.el, lxml.html.HtmlElement):
+            return compile_css(args[0])(self.el)
         return self.el.cssselect(*args, **kwargs)
 
     def xpath(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs:
+            return select_xpath(self.el, args[0])
         return self.el.xpath(*args, **kwargs)
 
     def handle_loaders(self):
-        for attrname in dir(self):
-            m = re.match('load_(.*)', attrname)
-            if not m:
-                continue
-            name = m.group(1)
+        for name, attrname in self._loader_attrs:
             if name in self.loaders:
                 continue
             loader = getattr(self, attrname)
@@ -159,6 +301,22 @@ class ListElement(AbstractElement):
     flush_at_end = False
     ignore_duplicate = False
 
+    prefetch_next_page = False
+    """
+    Open the next page in background as soon as the list is parsed, while
+    items are consumed, see :meth:`weboob.browser.browsers.Browser.prefetch`.
+
+    The `next_page` selector must not depend on items, and only GET requests
+    are prefetched. If the list also has a `next_pages` selector, which gives
+    URLs of the following pages (for example built from a total count of
+    pages), up to :attr:`max_prefetch` of them are opened in parallel.
+    """
+
+    max_prefetch = 4
+    """
+    Maximum number of pages to prefetch from the `next_pages` selector.
+    """
+
     def __init__(self, *args, **kwargs):
         super(ListElement, self).__init__(*args, **kwargs)
         self.logger = getLogger(self.__class__.__name__.lower())
@@ -177,11 +335,11 @@ class ListElement(AbstractElement):
         sufficient.
         """
         if self.item_xpath is not None:
-            element_list = self.el.xpath(self.item_xpath)
+            element_list = select_xpath(self.el, self.item_xpath)
             if element_list:
                 for el in element_list:
                     yield el
-            elif self.empty_xpath is not None and not self.el.xpath(self.empty_xpath):
+            elif self.empty_xpath is not None and not select_xpath(self.el, self.empty_xpath):
                 # Send a warning if no item_xpath node was found and an empty_xpath is defined
                 self.logger.warning('No element matched the item_xpath and the defined empty_xpath was not found!')
         else:
@@ -193,49 +351,80 @@ class ListElement(AbstractElement):
 
         self.parse(self.el)
 
+        if self.prefetch_next_page:
+            self.prefetch_pages()
+
         items = []
         for el in self.find_elements():
-            for attrname in dir(self):
-                attr = getattr(self, attrname)
-                if isinstance(attr, type) and issubclass(attr, AbstractElement) and attr != type(self):
-                    item = attr(self.page, self, el)
-                    if item.condition is not None and not item.condition():
-                        continue
-
-                    item.handle_loaders()
-                    items.append(item)
-
-        for item in items:
-            for obj in item:
-                obj = self.store(obj)
-                if obj and not self.flush_at_end:
+            for klass in self._element_classes:
+                item = klass(self.page, self, el)
+                if item.condition is not None and not item.condition():
+                    continue
+
+                item.handle_loaders()
+                items.append(item)
+
+        try:
+            for item in items:
+                for obj in item:
+                    obj = self.store(obj)
+                    if obj and not self.flush_at_end:
+                        yield obj
+
+            if self.flush_at_end:
+                for obj in self.flush():
                     yield obj
 
-        if self.flush_at_end:
-            for obj in self.flush():
-                yield obj
+            self.check_next_page()
+        except NextPage:
+            raise
+        except BaseException:
+            # The consumer stops or fails, so prefetched pages won't be used.
+            if self.prefetch_next_page:
+                self.page.browser.clear_prefetched()
+            raise
 
-        self.check_next_page()
+        # This is the last page, other pages given by next_pages won't be
+        # used either.
+        if self.prefetch_next_page:
+            self.page.browser.clear_prefetched()
 
     def flush(self):
         for obj in self.objects.values():
             yield obj
 
-    def check_next_page(self):
+    def get_next_page(self):
         if not hasattr(self, 'next_page'):
             return
 
         next_page = getattr(self, 'next_page')
         try:
-            value = self.use_selector(next_page)
+            return self.use_selector(next_page)
         except (AttributeNotFound, XPathNotFound):
             return
 
+    def check_next_page(self):
+        value = self.get_next_page()
         if value is None:
             return
 
         raise NextPage(value)
 
+    def prefetch_pages(self):
+        """
+        Open next pages in background, see :attr:`prefetch_next_page`.
+        """
+        pages = [self.get_next_page()]
+        if hasattr(self, 'next_pages'):
+            try:
+                pages += list(self.use_selector(getattr(self, 'next_pages')) or ())[:self.max_prefetch]
+            except (AttributeNotFound, XPathNotFound):
+                pass
+
+        for page in pages:
+            if page is not None and not isinstance(page, Page):
+                self.page.browser.prefetch(page)
+
 
     def store(self, obj):
         if obj.id:
@@ -255,7 +444,7 @@ class SkipItem(Exception):
     """
 
 
-class _ItemElementMeta(type):
+class _ItemElementMeta(_ElementMeta):
     """
     Private meta-class used to keep order of obj_* attributes in :class:`ItemElement`.
     """
@@ -272,6 +461,7 @@ class _ItemElementMeta(type):
         attrs['_class_file'], attrs['_class_line'] = traceback.extract_stack()[-2][:2]
         new_class = super(_ItemElementMeta, mcs).__new__(mcs, name, bases, attrs)
         new_class._attrs = _attrs + [f[0] for f in filters]
+        new_class._attr_names = [(attr, 'obj_%s' % attr) for attr in new_class._attrs]
         return new_class
 
 
@@ -287,10 +477,17 @@ class ItemElement(with_metaclass(_ItemElementMeta, AbstractElement)):
 
     def __init__(self, *args, **kwargs):
         super(ItemElement, self).__init__(*args, **kwargs)
-        self.logger = getLogger(self.__class__.__name__.lower())
+        self.logger = self.get_class_logger()
         self.obj = None
         self.saved_attrib = {}  # safer way would be to clone lxml tree
 
+    @classmethod
+    def get_class_logger(cls):
+        logger = cls.__dict__.get('_logger')
+        if logger is None:
+            logger = cls._logger = getLogger(cls.__name__.lower())
+        return logger
+
     def build_object(self):
         if self.klass is None:
             return
@@ -348,8 +545,8 @@ class ItemElement(with_metaclass(_ItemElementMeta, AbstractElement)):
                     self.obj = self.build_object()
                 self.parse(self.el)
                 self.handle_loaders()
-                for attr in self._attrs:
-                    self.handle_attr(attr, getattr(self, 'obj_%s' % attr))
+                for attr, attrname in self._attr_names:
+                    self.handle_attr(attr, getattr(self, attrname))
             except SkipItem:
                 return
 
@@ -378,8 +575,7 @@ class ItemElement(with_metaclass(_ItemElementMeta, AbstractElement)):
                 raise
             else:
                 value = FetchError
-        logger = getLogger('b2filters')
-        logger.log(DEBUG_FILTERS, "%s.%s = %r" % (self._random_id, key, value))
+        _filters_logger.log(DEBUG_FILTERS, "%s.%s = %r", self._random_id, key, value)
         setattr(self.obj, key, value)
 
 
@@ -402,7 +598,7 @@ class TableElement(ListElement):
                 columns[m.group(1)] = [s.lower() if isinstance(s, (str, unicode)) else s for s in cols]
 
         colnum = 0
-        for el in self.el.xpath(self.head_xpath):
+        for el in select_xpath(self.el, self.head_xpath):
             title = self.cleaner.clean(el)
             for name, titles in columns.items():
                 if name in self._cols:
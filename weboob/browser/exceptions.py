@@ -18,7 +18,7 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 from requests.exceptions import HTTPError
-from weboob.exceptions import BrowserHTTPError, BrowserHTTPNotFound
+from weboob.exceptions import BrowserHTTPError, BrowserHTTPNotFound, BrowserUnavailable
 
 
 class HTTPNotFound(HTTPError, BrowserHTTPNotFound):
@@ -35,3 +35,17 @@ class ServerError(HTTPError, BrowserHTTPError):
 
 class LoggedOut(Exception):
     pass
+
+
+class BrowserCancelled(Exception):
+    """
+    Raised by :meth:`weboob.browser.browsers.Browser.open` when requests
+    have been cancelled with :meth:`weboob.browser.browsers.Browser.cancel`.
+    """
+
+
+class CircuitOpen(BrowserUnavailable):
+    """
+    Raised instead of sending a request to a site which is down, see
+    :class:`weboob.browser.retrypolicy.CircuitBreaker`.
+    """
@@ -18,15 +18,17 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 from functools import wraps
+from threading import local
 
 import lxml.html
+from lxml import etree
 
 from weboob.exceptions import ParseError
 from weboob.tools.compat import unicode, basestring
 from weboob.tools.log import getLogger, DEBUG_FILTERS
 
 
-__all__ = ['FilterError', 'ItemNotFound', 'Filter',]
+__all__ = ['FilterError', 'ItemNotFound', 'Filter', 'compile_css', 'compile_xpath', 'select_xpath']
 
 
 class NoDefault(object):
@@ -44,6 +46,71 @@ class ItemNotFound(FilterError):
     pass
 
 
+SELECTORS_CACHE_SIZE = 1000
+"""
+Maximum number of compiled selectors kept by a thread.
+"""
+
+
+class _SelectorsCache(local):
+    def __init__(self):
+        self.xpaths = {}
+        self.css = {}
+
+_selectors_cache = _SelectorsCache()
+
+
+def _get_cached(cache, key, factory):
+    try:
+        return cache[key]
+    except KeyError:
+        # Selectors built from data (ids, dates...) must not fill the memory
+        # of a long running process.
+        if len(cache) >= SELECTORS_CACHE_SIZE:
+            cache.clear()
+        selector = cache[key] = factory()
+        return selector
+
+
+def compile_xpath(expression):
+    """
+    Get the compiled version of a XPath expression.
+
+    Expressions are compiled once and kept for the whole process, in a cache
+    for every thread, as lxml serializes the evaluations of a compiled
+    expression. Like with ``el.xpath()``, functions defined by
+    :meth:`weboob.browser.pages.HTMLPage.define_xpath_functions` are found
+    when the expression is evaluated.
+
+    :rtype: :class:`lxml.etree.XPath`
+    """
+    return _get_cached(_selectors_cache.xpaths, expression, lambda: etree.XPath(expression))
+
+
+def compile_css(expression, translator='html'):
+    """
+    Get the compiled version of a CSS selector, like :func:`compile_xpath`.
+
+    :param translator: 'html' for HTML documents, 'xml' for other ones
+    :rtype: :class:`lxml.cssselect.CSSSelector`
+    """
+    def factory():
+        from lxml.cssselect import CSSSelector
+        return CSSSelector(expression, translator=translator)
+
+    return _get_cached(_selectors_cache.css, (expression, translator), factory)
+
+
+def select_xpath(item, expression):
+    """
+    Evaluate a XPath expression on a lxml element or document, or on any
+    object with a ``xpath()`` method.
+    """
+    if isinstance(item, (etree._Element, etree._ElementTree)):
+        return compile_xpath(expression)(item)
+    return item.xpath(expression)
+
+
 class _Filter(object):
     _creation_counter = 0
 
@@ -91,6 +158,9 @@ class _Filter(object):
             el.attrib['title'] = 'weboob field: %s' % self._key
 
 
+_filters_logger = getLogger('b2filters')
+
+
 def debug(*args):
     """
     A decorator function to provide some debug information
@@ -100,7 +170,9 @@ def debug(*args):
     def wraper(function):
         @wraps(function)
         def print_debug(self, value):
-            logger = getLogger('b2filters')
+            if not _filters_logger.isEnabledFor(DEBUG_FILTERS):
+                return function(self, value)
+
             result = ''
             outputvalue = value
             if isinstance(value, list):
@@ -129,7 +201,7 @@ def debug(*args):
                     continue
                 result += ", %s=%r" % (arg, getattr(self, arg))
             result += u')'
-            logger.log(DEBUG_FILTERS, result)
+            _filters_logger.log(DEBUG_FILTERS, result)
             res = function(self, value)
             return res
         return print_debug
@@ -161,7 +233,7 @@ class Filter(_Filter):
 
     def select(self, selector, item):
         if isinstance(selector, basestring):
-            ret = item.xpath(selector)
+            ret = select_xpath(item, selector)
         elif isinstance(selector, _Filter):
             selector._key = self._key
             selector._obj = self._obj
@@ -19,12 +19,13 @@
 
 
 import lxml.html as html
+from lxml import etree
 from six.moves.html_parser import HTMLParser
 
 from weboob.tools.compat import basestring, unicode, urljoin
 from weboob.tools.html import html2text
 
-from .base import _NO_DEFAULT, Filter, FilterError, _Selector, debug, ItemNotFound
+from .base import _NO_DEFAULT, Filter, FilterError, _Selector, debug, ItemNotFound, compile_css
 from .standard import (
     TableCell, ColumnNotFound, # TODO move class here when modules are migrated
     CleanText,
@@ -56,7 +57,10 @@ class CSS(_Selector):
     will take the text of all ``<div>`` having CSS class "main".
     """
     def select(self, selector, item):
-        ret = item.cssselect(selector)
+        if isinstance(item, etree._Element):
+            ret = compile_css(selector, 'html' if isinstance(item, html.HtmlMixin) else 'xml')(item)
+        else:
+            ret = item.cssselect(selector)
         if isinstance(ret, list):
             for el in ret:
                 if isinstance(el, html.HtmlElement):
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from collections import deque
+from email.utils import mktime_tz, parsedate_tz
+from threading import Condition, Lock, Thread
+import time
+
+from weboob.tools.log import getLogger
+
+
+__all__ = ['RateLimiter', 'get_rate_limiter', 'parse_retry_after']
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header.
+
+    >>> parse_retry_after('120')
+    120.0
+    >>> parse_retry_after('soon')
+
+    :returns: delay in seconds, or None if it is invalid
+    :rtype: float
+    """
+    if not value:
+        return None
+    try:
+        return max(0., float(int(value)))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0., mktime_tz(date) - time.time())
+
+
+class RateLimiter(object):
+    """
+    Limit the rate and the concurrency of requests to a site.
+
+    Requests take a token from a bucket which is filled with *rate* tokens per
+    second, and can contain up to *burst* tokens. At most *max_in_flight*
+    requests can be sent at the same time.
+
+    It is used as a context manager around requests::
+
+        with limiter:
+            response = session.send(request)
+
+    :param rate: maximum number of requests per second, None for no limit
+    :type rate: float
+    :param burst: number of requests which can be sent at once after an idle
+                  period
+    :type burst: int
+    :param max_in_flight: maximum number of requests at the same time, None
+                          for no limit
+    :type max_in_flight: int
+
+    Other limits can be added with :meth:`configure`.
+    """
+
+    WAIT_STEP = 0.5
+    """
+    Maximum time to wait before checking for cancellation, in seconds.
+    """
+
+    def __init__(self, rate=None, burst=1, max_in_flight=None):
+        self.rate = None
+        self.burst = 1
+        self.max_in_flight = None
+        # Limits given to configure().
+        self.settings = set()
+
+        self.condition = Condition(Lock())
+        self.tokens = 1.
+        self.last_fill = time.time()
+        self.in_flight = 0
+        self.blocked_until = 0
+
+        self.requests = 0
+        self.waited = 0.
+
+        # Callbacks of acquire_async(), with the time they started to wait.
+        self.pending = deque()
+        self.waiter = None
+
+        if rate is not None or max_in_flight is not None:
+            self.configure(rate, burst, max_in_flight)
+
+    def configure(self, rate=None, burst=1, max_in_flight=None):
+        """
+        Add limits wanted by a user of the limiter. When users want different
+        limits, the strictest ones apply.
+
+        See :class:`RateLimiter` for parameters.
+
+        :returns: False if these limits are different from the ones of other
+                  users
+        :rtype: bool
+        """
+        settings = (rate, max(1, burst), max_in_flight)
+        with self.condition:
+            if settings in self.settings:
+                return True
+            self.settings.add(settings)
+
+            rates = [r for r, b, m in self.settings if r is not None]
+            bursts = [b for r, b, m in self.settings if r is not None]
+            maxima = [m for r, b, m in self.settings if m is not None]
+            self._fill(time.time())
+            if self.rate is None:
+                self.tokens = float(min(bursts or [1]))
+            self.rate = min(rates) if rates else None
+            self.burst = min(bursts) if bursts else 1
+            self.tokens = min(self.tokens, self.burst)
+            self.max_in_flight = min(maxima) if maxima else None
+            self.condition.notify_all()
+            return len(self.settings) == 1
+
+    def _fill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.last_fill) * self.rate)
+        self.last_fill = now
+
+    def _get_delay(self, now):
+        # Time to wait before sending a request, None if it depends on
+        # other requests to finish.
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return None
+        delay = self.blocked_until - now
+        if self.rate and self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        return max(0, delay)
+
+    def acquire(self, check=None):
+        """
+        Wait to be allowed to send a request.
+
+        :param check: called while waiting, it can raise an exception to stop
+                      waiting
+        :type check: callable
+        """
+        start = time.time()
+        with self.condition:
+            while True:
+                now = time.time()
+                self._fill(now)
+                delay = self._get_delay(now)
+                if delay == 0:
+                    break
+
+                if check is not None:
+                    check()
+                self.condition.wait(self.WAIT_STEP if delay is None else min(delay, self.WAIT_STEP))
+
+            self._take(now, start)
+
+    def _take(self, now, start):
+        if self.rate:
+            self.tokens -= 1
+        self.in_flight += 1
+        self.requests += 1
+        self.waited += now - start
+
+    def acquire_async(self, callback):
+        """
+        Call a function once allowed to send a request, without blocking the
+        caller.
+
+        Waiting requests are handled by a thread of the limiter, so they do
+        not keep busy the threads of an executor. The function is called
+        by this thread, so it must not block, and :meth:`release` must be
+        called when the request is finished.
+
+        :param callback: function called without arguments
+        :type callback: callable
+        """
+        with self.condition:
+            self.pending.append((callback, time.time()))
+            if self.waiter is None:
+                self.waiter = Thread(target=self._run_pending, name='weboob-ratelimit')
+                self.waiter.daemon = True
+                self.waiter.start()
+            self.condition.notify_all()
+
+    def _run_pending(self):
+        with self.condition:
+            while self.pending:
+                now = time.time()
+                self._fill(now)
+                delay = self._get_delay(now)
+                if delay != 0:
+                    self.condition.wait(self.WAIT_STEP if delay is None else min(delay, self.WAIT_STEP))
+                    continue
+
+                callback, start = self.pending.popleft()
+                self._take(now, start)
+                self.condition.release()
+                try:
+                    callback()
+                except Exception:
+                    getLogger('ratelimit').exception('Error in callback of a rate limiter')
+                finally:
+                    self.condition.acquire()
+            self.waiter = None
+
+    def release(self):
+        """
+        Tell that a request is finished.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def block(self, delay):
+        """
+        Do not allow requests during some time, for example when the site
+        answers with a Retry-After header.
+
+        :param delay: time in seconds
+        :type delay: float
+        """
+        with self.condition:
+            self.blocked_until = max(self.blocked_until, time.time() + delay)
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, t, v, tb):
+        self.release()
+
+    def __repr__(self):
+        return '<%s rate=%r burst=%r max_in_flight=%r>' % (self.__class__.__name__, self.rate,
+                                                           self.burst, self.max_in_flight)
+
+
+_limiters = {}
+_limiters_lock = Lock()
+
+
+def get_rate_limiter(key, rate=None, burst=1, max_in_flight=None, create=True):
+    """
+    Get the rate limiter of the process for this key.
+
+    Parameters are added to the limits of the limiter, see
+    :meth:`RateLimiter.configure`, and a warning is logged when they are
+    different from the ones given before for this key. Without limits, the
+    limiter only applies delays of :meth:`RateLimiter.block`.
+
+    :param key: key of the limiter, usually the name of a host
+    :type key: str
+    :param create: if False, return None instead of creating the limiter
+    :type create: bool
+    :rtype: :class:`RateLimiter`
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            if not create:
+                return None
+            limiter = _limiters[key] = RateLimiter()
+
+    if (rate is not None or max_in_flight is not None) and not limiter.configure(rate, burst, max_in_flight):
+        getLogger('ratelimit').warning('Different limits for %s, using the strictest ones: %r', key, limiter)
+    return limiter
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import random
+from threading import Lock
+import time
+
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+from weboob.tools.log import getLogger
+
+from .exceptions import CircuitOpen, ServerError
+from .ratelimit import parse_retry_after
+
+
+__all__ = ['CircuitBreaker', 'RetryPolicy', 'get_circuit_breaker', 'get_circuit_breakers']
+
+
+class RetryPolicy(object):
+    """
+    Describe which failed requests are retried, and how long to wait before.
+
+    Delays grow exponentially with the number of retries, and are randomized
+    with "full jitter" so that browsers do not retry all at once. A delay
+    asked by the site with a Retry-After header is respected.
+
+    :param total: maximum number of retries of a request
+    :type total: int
+    :param statuses: HTTP statuses of answers to retry
+    :type statuses: set[int]
+    :param exceptions: exceptions to retry
+    :type exceptions: tuple
+    :param methods: HTTP methods which can be retried, only idempotent ones
+                    by default
+    :type methods: set[str]
+    :param backoff_factor: delay before the first retry, in seconds
+    :type backoff_factor: float
+    :param backoff_max: maximum delay between two tries, in seconds
+    :type backoff_max: float
+    :param jitter: randomize delays
+    :type jitter: bool
+    :param max_time: maximum time spent on retries of a request, in seconds,
+                     None for no limit
+    :type max_time: float
+    """
+
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+
+    def __init__(self, total=3, statuses=(429, 502, 503, 504), exceptions=(ConnectionError, Timeout),
+                 methods=IDEMPOTENT_METHODS, backoff_factor=0.5, backoff_max=30., jitter=True, max_time=None):
+        self.total = total
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.max_time = max_time
+
+    def is_retryable(self, method, error):
+        """
+        Check if a request which has raised this error can be retried.
+
+        :param method: HTTP method of the request
+        :type method: str
+        :type error: :class:`Exception`
+        :rtype: bool
+        """
+        if method.upper() not in self.methods:
+            return False
+        if isinstance(error, self.exceptions):
+            return True
+        response = getattr(error, 'response', None)
+        return isinstance(error, HTTPError) and response is not None and response.status_code in self.statuses
+
+    def get_backoff(self, retries):
+        """
+        Get the delay before a retry, without the Retry-After header.
+
+        :param retries: number of retries already done
+        :type retries: int
+        :rtype: float
+        """
+        delay = min(self.backoff_max, self.backoff_factor * 2 ** retries)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def get_retry_delay(self, method, error, retries, elapsed=0):
+        """
+        Get the delay before retrying a failed request.
+
+        :param method: HTTP method of the request
+        :type method: str
+        :param error: error raised by the request
+        :type error: :class:`Exception`
+        :param retries: number of retries already done
+        :type retries: int
+        :param elapsed: time spent since the first try, in seconds
+        :type elapsed: float
+        :returns: delay in seconds, or None if the request must not be
+                  retried
+        :rtype: float
+        """
+        if retries >= self.total or not self.is_retryable(method, error):
+            return None
+
+        delay = self.get_backoff(retries)
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        if self.max_time is not None and elapsed + delay > self.max_time:
+            return None
+        return delay
+
+    def __repr__(self):
+        return '<%s total=%r statuses=%r>' % (self.__class__.__name__, self.total, sorted(self.statuses))
+
+
+class CircuitBreaker(object):
+    """
+    Fail fast on requests to a site which is down.
+
+    After *threshold* consecutive failures, the circuit is open: requests
+    raise :class:`weboob.browser.exceptions.CircuitOpen` without being sent.
+    After *timeout* seconds, one request is let through to probe the site
+    (the circuit is half-open), and its result closes or opens the circuit
+    again.
+
+    Failures are connection errors, timeouts and server errors. Other answers
+    show that the site is up.
+
+    :param threshold: number of consecutive failures which open the circuit
+    :type threshold: int
+    :param timeout: time before probing the site again, in seconds
+    :type timeout: float
+
+    Other settings can be added with :meth:`configure`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    FAILURES = (ConnectionError, Timeout, ServerError)
+    """
+    Exceptions which are failures of the site.
+    """
+
+    def __init__(self, threshold=5, timeout=60.):
+        self.threshold = threshold
+        self.timeout = timeout
+        # Settings given to configure().
+        self.settings = set([(threshold, timeout)])
+
+        self.lock = Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probe_at = None
+
+    def configure(self, threshold=5, timeout=60.):
+        """
+        Add settings wanted by a user of the breaker. When users want
+        different settings, the strictest ones apply: the lowest threshold
+        and the longest timeout.
+
+        :returns: False if these settings are different from the ones of
+                  other users
+        :rtype: bool
+        """
+        with self.lock:
+            if (threshold, timeout) in self.settings:
+                return True
+            self.settings.add((threshold, timeout))
+            self.threshold = min(t for t, _ in self.settings)
+            self.timeout = max(t for _, t in self.settings)
+            return False
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._get_state(time.time())
+
+    def _get_state(self, now):
+        if self.opened_at is None:
+            return self.CLOSED
+        if now - self.opened_at < self.timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def before_request(self):
+        """
+        Check that a request can be sent.
+
+        :raises: :class:`weboob.browser.exceptions.CircuitOpen`
+        """
+        with self.lock:
+            now = time.time()
+            state = self._get_state(now)
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and (self.probe_at is None or now - self.probe_at >= self.timeout):
+                # Only one probe at a time. If its result is never recorded,
+                # another one is allowed after the timeout.
+                self.probe_at = now
+                return
+            retry_in = max(0, self.opened_at + self.timeout - now)
+
+        raise CircuitOpen('Site is down after %d failures, retry in %d seconds' % (self.failures, retry_in))
+
+    def record(self, error=None):
+        """
+        Record the result of a request.
+
+        :param error: error raised by the request, if any
+        :type error: :class:`Exception`
+        """
+        with self.lock:
+            if error is None or not isinstance(error, self.FAILURES):
+                self.failures = 0
+                self.opened_at = self.probe_at = None
+                return
+
+            self.failures += 1
+            if self.probe_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.time()
+                self.probe_at = None
+
+    def __repr__(self):
+        return '<%s %s failures=%d>' % (self.__class__.__name__, self.state, self.failures)
+
+
+_breakers = {}
+_breakers_lock = Lock()
+
+
+def get_circuit_breaker(key, threshold=5, timeout=60., create=True):
+    """
+    Get the circuit breaker of the process for this key.
+
+    Parameters are added to the settings of the breaker, see
+    :meth:`CircuitBreaker.configure`, and a warning is logged when they are
+    different from the ones given before for this key.
+
+    :param key: key of the circuit breaker, usually the name of a host
+    :type key: str
+    :param create: if False, return None instead of creating the breaker
+    :type create: bool
+    :rtype: :class:`CircuitBreaker`
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            if not create:
+                return None
+            breaker = _breakers[key] = CircuitBreaker(threshold, timeout)
+
+    if not breaker.configure(threshold, timeout):
+        getLogger('retrypolicy').warning('Different circuit breaker settings for %s, using the strictest ones: '
+                                         'threshold=%r timeout=%r', key, breaker.threshold, breaker.timeout)
+    return breaker
+
+
+def get_circuit_breakers():
+    """
+    Get all circuit breakers of the process, for example to skip sites which
+    are down.
+
+    :returns: breakers by key
+    :rtype: dict[str, :class:`CircuitBreaker`]
+    """
+    with _breakers_lock:
+        return dict(_breakers)
@@ -20,8 +20,11 @@
 # Inspired by: https://github.com/ross/requests-futures/blob/master/requests_futures/sessions.py
 # XXX Licence issues?
 
+from collections import deque
+from threading import Lock
+
 try:
-    from concurrent.futures import ThreadPoolExecutor
+    from concurrent.futures import Future, ThreadPoolExecutor, wait
 except ImportError:
     ThreadPoolExecutor = None
 
@@ -102,6 +105,32 @@ class WeboobSession(Session):
         return p
 
 
+SHARED_MAX_WORKERS = 50
+"""
+Maximum of threads of the executor shared by sessions.
+"""
+
+_shared_executor = None
+_shared_executor_lock = Lock()
+
+
+def get_shared_executor():
+    """
+    Get the executor which runs asynchronous requests of all sessions.
+
+    It is created on first use, so a process which does not make
+    asynchronous requests has no thread.
+
+    :rtype: :class:`concurrent.futures.ThreadPoolExecutor`
+    """
+    global _shared_executor
+
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=SHARED_MAX_WORKERS)
+        return _shared_executor
+
+
 class FuturesSession(WeboobSession):
     def __init__(self, executor=None, max_workers=2, max_retries=2, *args, **kwargs):
         """Creates a FuturesSession
@@ -112,12 +141,13 @@ class FuturesSession(WeboobSession):
         * ProcessPoolExecutor is not supported b/c Response objects are
           not picklable.
 
-        * If you provide both `executor` and `max_workers`, the latter is
-          ignored and provided executor is used as is.
+        * Asynchronous requests run in a process-wide executor (see
+          :func:`get_shared_executor`), unless `executor` is given. In both
+          cases, no more than `max_workers` requests of this session run at
+          the same time, others are queued.
         """
         super(FuturesSession, self).__init__(*args, **kwargs)
         if executor is None and ThreadPoolExecutor is not None:
-            executor = ThreadPoolExecutor(max_workers=max_workers)
             # set connection pool size equal to max_workers if needed
             if max_workers > DEFAULT_POOLSIZE:
                 adapter_kwargs = dict(pool_connections=max_workers,
@@ -126,7 +156,75 @@ class FuturesSession(WeboobSession):
                 self.mount('https://', HTTPAdapter(**adapter_kwargs))
                 self.mount('http://', HTTPAdapter(**adapter_kwargs))
 
-        self.executor = executor
+        self._executor = executor
+        self.max_workers = max_workers
+
+        self._lock = Lock()
+        self._queue = deque()
+        self._running = 0
+        self._futures = set()
+
+    @property
+    def executor(self):
+        if self._executor is None and ThreadPoolExecutor is not None:
+            return get_shared_executor()
+        return self._executor
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run a function in the executor, when less than `max_workers`
+        functions of this session are running.
+
+        :rtype: :class:`concurrent.futures.Future`
+        """
+        if not self.executor:
+            raise ImportError('Please install python-concurrent.futures')
+
+        future = Future()
+        with self._lock:
+            self._queue.append((future, func, args, kwargs))
+            self._futures.add(future)
+        future.add_done_callback(self._discard_future)
+        self._run_queued()
+        return future
+
+    def _discard_future(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _run_queued(self):
+        while True:
+            with self._lock:
+                if self._running >= self.max_workers or not self._queue:
+                    return
+                task = self._queue.popleft()
+                self._running += 1
+            self.executor.submit(self._run, *task)
+
+    def _run(self, future, func, args, kwargs):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._run_queued()
+
+    def wait(self, timeout=None):
+        """
+        Wait for asynchronous requests of this session to finish.
+
+        :param timeout: maximum time to wait, in seconds
+        :type timeout: float
+        """
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures, timeout)
 
     def send(self, *args, **kwargs):
         """Maintains the existing api for :meth:`Session.send`
@@ -155,13 +253,16 @@ class FuturesSession(WeboobSession):
             return callback(self, resp)
 
         if is_async:
-            if not self.executor:
-                raise ImportError('Please install python-concurrent.futures')
-            return self.executor.submit(func, *args, **kwargs)
+            return self.submit(func, *args, **kwargs)
 
         return func(*args, **kwargs)
 
     def close(self):
         super(FuturesSession, self).close()
-        if self.executor:
-            self.executor.shutdown()
+        # Requests which did not start are cancelled.
+        with self._lock:
+            queue, self._queue = self._queue, deque()
+        for future, func, args, kwargs in queue:
+            future.cancel()
+        if self._executor:
+            self._executor.shutdown()
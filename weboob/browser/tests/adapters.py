@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+from threading import Thread
+import time
+from unittest import TestCase
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from weboob.browser import Browser
+from weboob.browser.adapters import SharedHTTPAdapter, close_shared_adapters, get_pools_stats, get_shared_adapter
+
+
+class MyMockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(0.2)
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class MyMockSharingBrowser(Browser):
+    SHARE_CONNECTIONS = True
+
+
+class MyMockSmallAdapter(SharedHTTPAdapter):
+    POOL_MAXSIZE = 1
+
+
+class SharedAdapterTest(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), MyMockHandler)
+        self.url = 'http://127.0.0.1:%s/' % self.server.server_port
+        thread = Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        close_shared_adapters()
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Check that browsers reuse connections of each other
+    def test_shared(self):
+        browser1 = MyMockSharingBrowser()
+        browser2 = MyMockSharingBrowser()
+        self.assertIs(browser1.session.adapters['http://'], browser2.session.adapters['http://'])
+
+        browser1.open(self.url)
+        browser1.deinit()
+        browser2.open(self.url)
+
+        stats = get_pools_stats()
+        self.assertEqual(list(stats), ['http://127.0.0.1:%s' % self.server.server_port])
+        pool_stats, = stats.values()
+        self.assertEqual(pool_stats['opened'], 1)
+        self.assertEqual(pool_stats['requests'], 2)
+        self.assertEqual(pool_stats['reused'], 1)
+        self.assertEqual(pool_stats['idle'], 1)
+        self.assertEqual(browser2.get_connections_stats(), stats)
+
+    # Check that browsers with other settings don't share connections
+    def test_not_shared(self):
+        browser1 = MyMockSharingBrowser()
+        browser2 = MyMockSharingBrowser(proxy={'https': 'http://proxy.example:3128'})
+        browser3 = Browser()
+        self.assertIsNot(browser1.session.adapters['http://'], browser2.session.adapters['http://'])
+        self.assertIsNot(browser1.session.adapters['http://'], browser3.session.adapters['http://'])
+        self.assertIsNot(get_shared_adapter(cert='client.pem'), get_shared_adapter())
+
+    # Check that requests wait for a connection when all of them are used
+    def test_waiting(self):
+        adapter = MyMockSmallAdapter()
+        browser = Browser()
+        browser.session.mount('http://', adapter)
+        futures = [browser.async_open(self.url + 'slow') for i in range(2)]
+        self.assertEqual([future.result(5).status_code for future in futures], [200, 200])
+
+        pool_stats, = get_pools_stats([adapter]).values()
+        self.assertEqual(pool_stats['opened'], 1)
+        self.assertEqual(pool_stats['waited'], 1)
+        self.assertEqual(pool_stats['waiting'], 0)
+        adapter.close_pools()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from weboob.browser import Browser
+from weboob.browser.cache import CacheMixin, SQLiteCache
+from weboob.browser.tests.mockadapter import MyMockAdapter
+from weboob.tools.lrudict import LimitedLRUDict
+
+
+class MyMockCacheBrowser(CacheMixin, Browser):
+    def __init__(self, *args, **kwargs):
+        super(MyMockCacheBrowser, self).__init__(*args, **kwargs)
+        self.adapter = MyMockAdapter()
+        self.session.mount('http://', self.adapter)
+
+
+class SQLiteCacheTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    # Check that values are kept between instances
+    def test_persistent(self):
+        cache = SQLiteCache(self.filename)
+        cache[('GET', 'http://weboob.org/')] = {'a': 1}
+        self.assertIn(('GET', 'http://weboob.org/'), cache)
+        self.assertNotIn(('GET', 'http://weboob.org/b'), cache)
+
+        cache = SQLiteCache(self.filename)
+        self.assertEqual(cache[('GET', 'http://weboob.org/')], {'a': 1})
+        self.assertEqual(list(cache), [('GET', 'http://weboob.org/')])
+        del cache[('GET', 'http://weboob.org/')]
+        self.assertEqual(len(cache), 0)
+
+    # Check that least recently used entries are removed
+    def test_eviction(self):
+        cache = SQLiteCache(self.filename, max_size=2500, compress=False)
+        for i in range(3):
+            cache[i] = b'x' * 1000
+            # Use the first entry, so it is kept.
+            cache[0]
+        self.assertEqual(sorted(cache), [0, 2])
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.size, 2500)
+
+    # Check that responses stored by a browser are used by another one
+    def test_browser(self):
+        browser = MyMockCacheBrowser()
+        browser.cache = SQLiteCache(self.filename)
+        browser.adapter.headers = {'ETag': '"abc"'}
+        response = browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(response.content, b'content of http://weboob.org/')
+
+        browser = MyMockCacheBrowser()
+        browser.cache = SQLiteCache(self.filename)
+        browser.adapter.status_code = 304
+        response = browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(browser.adapter.requests[0].headers['If-None-Match'], '"abc"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, u'content of http://weboob.org/')
+
+
+class CacheMixinTest(TestCase):
+    def setUp(self):
+        self.browser = MyMockCacheBrowser()
+
+    # Check that fresh responses are served without network
+    def test_fresh(self):
+        self.browser.adapter.headers = {'Cache-Control': 'max-age=60'}
+        self.browser.open_with_cache('http://weboob.org/')
+        response = self.browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(response.content, b'content of http://weboob.org/')
+        self.assertEqual(len(self.browser.adapter.requests), 1)
+        self.assertEqual(self.browser.cache_stats, {'hits': 1, 'misses': 1, 'revalidations': 0,
+                                                    'bytes': len(response.content)})
+
+        # The response was already old when it was received.
+        self.browser.adapter.headers = {'Cache-Control': 'max-age=60', 'Age': '100'}
+        self.browser.open_with_cache('http://weboob.org/old')
+        self.browser.open_with_cache('http://weboob.org/old')
+        self.assertEqual(len(self.browser.adapter.requests), 3)
+
+    # Check that stale responses are revalidated
+    def test_revalidation(self):
+        self.browser.adapter.headers = {'Cache-Control': 'no-cache', 'ETag': '"abc"'}
+        self.browser.open_with_cache('http://weboob.org/')
+        self.browser.adapter.status_code = 304
+        self.browser.adapter.headers = {'Cache-Control': 'max-age=60'}
+        response = self.browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.browser.adapter.requests[1].headers['If-None-Match'], '"abc"')
+        self.assertEqual(self.browser.cache_stats['revalidations'], 1)
+
+        # New headers of the 304 response make it fresh.
+        self.browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(len(self.browser.adapter.requests), 2)
+
+    # Check that no-store responses are not stored
+    def test_no_store(self):
+        self.browser.adapter.headers = {'Cache-Control': 'no-store', 'ETag': '"abc"'}
+        self.browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(len(self.browser.cache), 0)
+
+        self.browser.is_shared_cache = True
+        self.browser.adapter.headers = {'Cache-Control': 'private, max-age=60'}
+        self.browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(len(self.browser.cache), 0)
+
+    # Check that keys are normalized and that headers are only used with Vary
+    def test_key(self):
+        self.browser.cache = LimitedLRUDict()
+        self.browser.cache.max_entries = 2
+        self.browser.adapter.headers = {'Cache-Control': 'max-age=60', 'Vary': 'Accept-Language'}
+        self.browser.open_with_cache('http://WEBOOB.org:80/#top', headers={'Referer': 'http://a/'})
+        self.browser.open_with_cache('http://weboob.org/', headers={'Referer': 'http://b/'})
+        self.assertEqual(len(self.browser.adapter.requests), 1)
+
+        self.browser.open_with_cache('http://weboob.org/', headers={'Accept-Language': 'fr'})
+        self.browser.open_with_cache('http://weboob.org/', headers={'Accept-Language': 'fr'})
+        self.assertEqual(len(self.browser.adapter.requests), 2)
+
+        self.browser.open_with_cache('http://weboob.org/', method='GET', data={'a': '1', 'b': '2'})
+        self.browser.open_with_cache('http://weboob.org/', method='GET', data={'b': '2', 'a': '1'})
+        self.browser.open_with_cache('http://weboob.org/', method='GET', data={'a': '2', 'b': '2'})
+        self.assertEqual(len(self.browser.adapter.requests), 4)
+
+        stats = self.browser.get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['entries']), (3, 4, 1, 2))
+
+    # Check that Vary applies to headers added when the request is prepared,
+    # like the authentication and cookies
+    def test_vary_prepared(self):
+        self.browser.adapter.headers = {'Cache-Control': 'no-cache', 'ETag': '"abc"',
+                                        'Vary': 'Authorization, Cookie'}
+        self.browser.session.cookies.set('session', '42')
+        self.browser.open_with_cache('http://weboob.org/', auth=('user', 'pass'))
+        self.browser.adapter.status_code = 304
+        response = self.browser.open_with_cache('http://weboob.org/', auth=('user', 'pass'))
+        self.assertEqual(self.browser.adapter.requests[1].headers['If-None-Match'], '"abc"')
+        self.assertEqual(response.status_code, 200)
+
+        self.browser.adapter.status_code = 200
+        self.browser.open_with_cache('http://weboob.org/', auth=('other', 'pass'))
+        self.assertNotIn('If-None-Match', self.browser.adapter.requests[2].headers)
+
+    # Check that parameters and nested data are part of keys
+    def test_key_params(self):
+        self.browser.adapter.headers = {'Cache-Control': 'max-age=60'}
+        self.browser.open_with_cache('http://weboob.org/list', params={'page': 1})
+        response = self.browser.open_with_cache('http://weboob.org/list', params={'page': 2})
+        self.assertEqual(response.content, b'content of http://weboob.org/list?page=2')
+        self.browser.open_with_cache('http://weboob.org/list?page=2')
+        self.assertEqual(len(self.browser.adapter.requests), 2)
+
+        self.browser.open_with_cache('http://weboob.org/', method='GET', data={'ids': [1, 2]})
+        self.browser.open_with_cache('http://weboob.org/', method='GET', data={'ids': [1, 2]})
+        self.browser.open_with_cache('http://weboob.org/', method='GET', json={'ids': [1, 2], 'a': {'b': 1}})
+        self.browser.open_with_cache('http://weboob.org/', method='GET', json={'a': {'b': 1}, 'ids': [1, 2]})
+        self.assertEqual(len(self.browser.adapter.requests), 4)
+
+    # Check that only GET and HEAD requests are served from the cache, and
+    # that other requests remove cached responses of their URL
+    def test_unsafe_methods(self):
+        self.browser.adapter.headers = {'Cache-Control': 'private, max-age=60'}
+        self.browser.open_with_cache('http://weboob.org/')
+        self.browser.open_with_cache('http://weboob.org/', data={'a': '1'})
+        self.browser.open_with_cache('http://weboob.org/', data={'a': '1'})
+        self.browser.open_with_cache('http://weboob.org/', method='PATCH', data={'a': '1'})
+        self.assertEqual([r.method for r in self.browser.adapter.requests], ['GET', 'POST', 'POST', 'PATCH'])
+        self.assertEqual(len(self.browser.cache), 0)
+
+        self.browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(len(self.browser.adapter.requests), 5)
+
+    # Check that stale responses are served while they are revalidated
+    def test_stale_while_revalidate(self):
+        self.browser.adapter.headers = {'Cache-Control': 'max-age=10, stale-while-revalidate=60', 'Age': '20',
+                                        'ETag': '"abc"'}
+        self.browser.open_with_cache('http://weboob.org/')
+        self.browser.adapter.headers = {'Cache-Control': 'max-age=10', 'ETag': '"def"'}
+        response = self.browser.open_with_cache('http://weboob.org/')
+        self.assertEqual(response.headers['ETag'], '"abc"')
+
+        self.browser.session.wait()
+        self.assertEqual(len(self.browser.adapter.requests), 2)
+        entry, = self.browser.cache.values()
+        self.assertEqual(entry.etag, '"def"')
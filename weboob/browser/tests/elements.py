@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from requests.models import Response
+
+from weboob.browser import Browser
+from weboob.browser.elements import ElementEnv, ItemElement, ListElement, method
+from weboob.browser.filters.html import Link
+from weboob.browser.filters.standard import CleanText
+from weboob.browser.pages import HTMLPage
+from weboob.capabilities.base import BaseObject
+from weboob.tools.compat import with_metaclass
+
+
+class ElementEnvTest(TestCase):
+    # Check that a child sees variables of its parent without sharing changes
+    def test_isolation(self):
+        root = ElementEnv(data={'page': 1, 'seen': []})
+        parent = ElementEnv(root)
+        parent['name'] = 'parent'
+        child = ElementEnv(parent)
+
+        child['name'] = 'child'
+        child['seen'].append(1)
+        del child['page']
+
+        self.assertEqual(dict(child), {'name': 'child', 'seen': [1]})
+        self.assertEqual(dict(parent), {'name': 'parent', 'seen': [], 'page': 1})
+        self.assertEqual(dict(root), {'seen': [], 'page': 1})
+
+    # Check that changes of a parent after a child is created are not seen by it
+    def test_shared_layer(self):
+        parent = ElementEnv(data={})
+        parent['items'] = ['a']
+        child = ElementEnv(parent)
+
+        parent['items'].append('b')
+        parent['other'] = 1
+
+        self.assertEqual(child['items'], ['a'])
+        self.assertNotIn('other', child)
+        self.assertEqual(parent['items'], ['a', 'b'])
+
+        # The layer of the parent has been copied, but its values are still
+        # seen by the child.
+        parent = ElementEnv(data={})
+        parent['items'] = []
+        child = ElementEnv(parent)
+        parent['other'] = 1
+        parent['items'].append(1)
+        self.assertEqual(child['items'], [])
+        self.assertEqual(parent['items'], [1])
+
+
+class MyMockListMeta(type(ListElement)):
+    pass
+
+
+class MyMockListElement(ListElement):
+    item_xpath = '//li'
+
+    class item(ItemElement):
+        klass = BaseObject
+
+        condition = lambda self: not self.el.get('class')
+
+        obj_id = CleanText('.')
+
+        load_details = Link('./a', default=None)
+
+    class special(ItemElement):
+        klass = BaseObject
+
+        condition = lambda self: self.el.get('class') == 'special'
+
+        def obj_id(self):
+            return u'special-%s' % CleanText('.')(self)
+
+
+class MyMockInheritedListElement(MyMockListElement):
+    class special(ItemElement):
+        klass = BaseObject
+
+        condition = lambda self: False
+
+
+class MyMockMetaListElement(with_metaclass(MyMockListMeta, ListElement)):
+    item_xpath = '//li'
+
+    class item(ItemElement):
+        klass = BaseObject
+
+        obj_id = CleanText('.')
+
+
+class MyMockPage(HTMLPage):
+    iter_items = method(MyMockListElement)
+    iter_inherited = method(MyMockInheritedListElement)
+    iter_metaclass = method(MyMockMetaListElement)
+
+
+class ElementMetaTest(TestCase):
+    def setUp(self):
+        response = Response()
+        response.status_code = 200
+        response.url = 'http://weboob.org/'
+        response.headers['Content-Type'] = 'text/html'
+        response._content = b'<html><body><ul><li><a href="/a">a</a></li><li class="special">b</li></ul></body></html>'
+        self.page = MyMockPage(Browser(), response)
+
+    # Check that nested elements and loaders are found once per class
+    def test_nested(self):
+        self.assertEqual(sorted(klass.__name__ for klass in MyMockListElement._element_classes), ['item', 'special'])
+        self.assertEqual(MyMockListElement.item._loader_attrs, [('details', 'load_details')])
+        self.assertEqual(sorted(obj.id for obj in self.page.iter_items()), [u'a', u'special-b'])
+
+    # Check that nested elements are inherited, and can be overridden
+    def test_inherited(self):
+        classes = MyMockInheritedListElement._element_classes
+        self.assertIn(MyMockListElement.item, classes)
+        self.assertNotIn(MyMockListElement.special, classes)
+        self.assertEqual([obj.id for obj in self.page.iter_inherited()], [u'a'])
+
+    # Check that elements created with with_metaclass() are handled
+    def test_with_metaclass(self):
+        self.assertEqual(MyMockMetaListElement._element_classes, [MyMockMetaListElement.item])
+        self.assertEqual([obj.id for obj in self.page.iter_metaclass()], [u'a', u'b'])
@@ -16,9 +16,12 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 from unittest import TestCase
+from lxml.etree import FunctionNamespace
 from lxml.html import fromstring
 
-from weboob.browser.filters.standard import RawText
+from weboob.browser.filters.base import compile_xpath
+from weboob.browser.filters.html import CSS
+from weboob.browser.filters.standard import CleanText, RawText
 
 
 class RawTextTest(TestCase):
@@ -48,3 +51,19 @@ class RawTextTest(TestCase):
     def test_first_node_is_element_recursive(self):
         e = fromstring('<html><body><p><span>229,90</span> EUR</p></body></html>')
         self.assertEqual("229,90 EUR", RawText('//p', default="foo", children=True)(e))
+
+
+class CompiledSelectorsTest(TestCase):
+    # Check that an expression is compiled once, and sees functions defined later
+    def test_xpath_cache(self):
+        e = fromstring('<html><body><p>a</p><p>b</p></body></html>')
+        xpath = compile_xpath('//p[weboob-test-second()]')
+        self.assertIs(xpath, compile_xpath('//p[weboob-test-second()]'))
+
+        FunctionNamespace(None)['weboob-test-second'] = lambda context: context.context_node.text == 'b'
+        self.assertEqual('b', CleanText('//p[weboob-test-second()]')(e))
+
+    # Check that CSS selectors are evaluated on HTML elements
+    def test_css(self):
+        e = fromstring('<html><body><P class="x">a</P><p>b</p></body></html>')
+        self.assertEqual('a', CleanText(CSS('p.x'))(e))
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Event
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+
+
+__all__ = ['MyMockAdapter']
+
+
+class MyMockAdapter(BaseAdapter):
+    """
+    Transport adapter which answers to requests without network.
+
+    Statuses, or exceptions to raise, are taken from :attr:`answers`, then
+    :attr:`status_code` is used. Override :meth:`handle` to serve other
+    responses.
+    """
+
+    def __init__(self):
+        super(MyMockAdapter, self).__init__()
+        self.requests = []
+        self.answers = []
+        self.status_code = 200
+        self.headers = {}
+        self.sent = Event()
+
+    def handle(self, request, response):
+        """
+        Fill the response to a request.
+        """
+        response._content = b'content of %s' % request.url.encode('utf-8')
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        self.sent.set()
+        answer = self.answers.pop(0) if self.answers else self.status_code
+        if isinstance(answer, Exception):
+            raise answer
+
+        response = Response()
+        response.status_code = answer
+        response.headers.update(self.headers)
+        response.url = request.url
+        response.request = request
+        self.handle(request, response)
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from weboob.browser import PagesBrowser, URL
+from weboob.browser.elements import ItemElement, ListElement, method
+from weboob.browser.filters.html import Link
+from weboob.browser.filters.standard import CleanText
+from weboob.browser.pages import HTMLPage, pagination
+from weboob.browser.tests.mockadapter import MyMockAdapter
+from weboob.capabilities.base import BaseObject
+
+
+PAGES = 4
+
+
+class MyMockPagesAdapter(MyMockAdapter):
+    """
+    Transport adapter which serves PAGES pages of two items.
+    """
+
+    def handle(self, request, response):
+        num = int(request.url.rsplit('/', 1)[1])
+        html = '<html><body><ul><li>%d-a</li><li>%d-b</li></ul>' % (num, num)
+        if num < PAGES:
+            html += '<a href="/list/%d">next</a>' % (num + 1)
+        html += '</body></html>'
+
+        response.headers['Content-Type'] = 'text/html'
+        response._content = html.encode('utf-8')
+
+
+class ListPage(HTMLPage):
+    @pagination
+    @method
+    class iter_items(ListElement):
+        item_xpath = '//li'
+        prefetch_next_page = True
+
+        next_page = Link('//a', default=None)
+
+        def next_pages(self):
+            num = int(self.page.url.rsplit('/', 1)[1])
+            return ['/list/%d' % i for i in range(num + 1, self.env.get('last', PAGES) + 1)]
+
+        class item(ItemElement):
+            klass = BaseObject
+
+            obj_id = CleanText('.')
+
+
+class MyMockPagesBrowser(PagesBrowser):
+    BASEURL = 'http://weboob.org/'
+
+    list = URL(r'list/(?P<num>\d+)', ListPage)
+
+    def __init__(self, *args, **kwargs):
+        super(MyMockPagesBrowser, self).__init__(*args, **kwargs)
+        self.adapter = MyMockPagesAdapter()
+        self.session.mount('http://', self.adapter)
+
+
+class PrefetchTest(TestCase):
+    # Check that prefetched pages are used, and each page is requested once
+    def test_prefetch(self):
+        browser = MyMockPagesBrowser()
+        browser.list.go(num=1)
+        ids = [obj.id for obj in browser.page.iter_items()]
+        self.assertEqual(ids, ['%d-%s' % (i, c) for i in range(1, PAGES + 1) for c in 'ab'])
+        self.assertEqual(sorted(request.url for request in browser.adapter.requests),
+                         ['http://weboob.org/list/%d' % i for i in range(1, PAGES + 1)])
+        self.assertEqual(browser.url, 'http://weboob.org/list/%d' % PAGES)
+        self.assertEqual(browser._prefetched, {})
+
+    # Check that prefetched pages are dropped when the consumer stops
+    def test_stop(self):
+        browser = MyMockPagesBrowser()
+        browser.list.go(num=1)
+        browser.adapter.sent.clear()
+        it = browser.page.iter_items()
+        next(it)
+        self.assertTrue(browser.adapter.sent.wait(5))
+        self.assertTrue(browser._prefetched)
+        it.close()
+        self.assertEqual(browser._prefetched, {})
+
+    # Check that pages predicted after the last one are dropped
+    def test_over_predicted(self):
+        browser = MyMockPagesBrowser()
+        browser.list.go(num=1)
+        self.assertEqual(len(list(browser.page.iter_items(last=PAGES + 2))), PAGES * 2)
+        self.assertEqual(browser._prefetched, {})
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from threading import Thread
+from unittest import TestCase
+
+from weboob.browser import Browser
+from weboob.browser.exceptions import ServerError
+from weboob.browser.ratelimit import RateLimiter, get_rate_limiter
+from weboob.browser.tests.mockadapter import MyMockAdapter
+
+
+class MyMockSlowBrowser(Browser):
+    RATE_LIMIT_KEY = 'ratelimit-slow-test'
+    RATE_LIMIT = 5
+
+    def __init__(self, *args, **kwargs):
+        super(MyMockSlowBrowser, self).__init__(*args, **kwargs)
+        self.session.mount('http://', MyMockAdapter())
+
+
+class MyMockBrowser(Browser):
+    RATE_LIMIT_KEY = 'ratelimit-test'
+    MAX_IN_FLIGHT = 2
+
+    def __init__(self, *args, **kwargs):
+        super(MyMockBrowser, self).__init__(*args, **kwargs)
+        self.adapter = MyMockAdapter()
+        self.session.mount('http://', self.adapter)
+
+
+class RateLimiterTest(TestCase):
+    # Check that requests wait for tokens after the burst
+    def test_rate(self):
+        limiter = RateLimiter(rate=20, burst=2)
+        start = time.time()
+        for i in range(4):
+            with limiter:
+                pass
+        self.assertGreaterEqual(time.time() - start, 0.09)
+        self.assertEqual(limiter.requests, 4)
+
+    # Check that no more than max_in_flight requests are sent at the same time
+    def test_max_in_flight(self):
+        limiter = RateLimiter(max_in_flight=2)
+        counts = []
+
+        def request():
+            with limiter:
+                counts.append(limiter.in_flight)
+                time.sleep(0.05)
+
+        threads = [Thread(target=request) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(counts), 6)
+        self.assertLessEqual(max(counts), 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    # Check that the strictest limits apply when they are different for a
+    # key, including when the limiter was created by a Retry-After answer
+    def test_configure(self):
+        limiter = get_rate_limiter('ratelimit-configure-test')
+        limiter.block(0)
+        self.assertEqual((limiter.rate, limiter.max_in_flight), (None, None))
+
+        self.assertIs(get_rate_limiter('ratelimit-configure-test', rate=2, burst=3), limiter)
+        self.assertEqual((limiter.rate, limiter.burst, limiter.tokens), (2, 3, 3))
+        get_rate_limiter('ratelimit-configure-test', rate=0.1, max_in_flight=4)
+        get_rate_limiter('ratelimit-configure-test', rate=2, burst=3)
+        self.assertEqual((limiter.rate, limiter.burst, limiter.max_in_flight), (0.1, 1, 4))
+
+    # Check that a Retry-After answer delays next requests
+    def test_retry_after(self):
+        browser = MyMockBrowser()
+        browser.adapter.status_code = 503
+        browser.adapter.headers = {'Retry-After': '1'}
+        with self.assertRaises(ServerError):
+            browser.open('http://weboob.org/')
+
+        limiter = get_rate_limiter('ratelimit-test')
+        self.assertIs(browser.get_rate_limiter('http://weboob.org/'), limiter)
+        self.assertGreater(limiter.blocked_until, time.time())
+        self.assertEqual(limiter.in_flight, 0)
+
+        browser.adapter.status_code = 200
+        start = time.time()
+        browser.open('http://weboob.org/')
+        self.assertGreaterEqual(time.time() - start, 0.5)
+
+    # Check that asynchronous requests wait for the limiter outside of the
+    # executor
+    def test_async(self):
+        browser = MyMockSlowBrowser()
+        limiter = browser.get_rate_limiter('http://weboob.org/')
+        start = time.time()
+        futures = [browser.async_open('http://weboob.org/%d' % i) for i in range(3)]
+        futures[0].result(5)
+        # Other requests wait in the limiter, not in the session.
+        self.assertEqual(len(limiter.pending), 2)
+
+        self.assertEqual([future.result(5).status_code for future in futures], [200] * 3)
+        self.assertGreaterEqual(time.time() - start, 0.35)
+        self.assertEqual(limiter.in_flight, 0)
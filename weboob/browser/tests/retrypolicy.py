@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from unittest import TestCase
+
+from requests.exceptions import ConnectionError
+
+from weboob.browser import Browser
+from weboob.browser.exceptions import CircuitOpen, ServerError
+from weboob.browser.retrypolicy import CircuitBreaker, RetryPolicy, get_circuit_breaker
+from weboob.browser.tests.mockadapter import MyMockAdapter
+
+
+class MyMockBrowser(Browser):
+    RETRY_POLICY = RetryPolicy(total=2, backoff_factor=0.01)
+
+    def __init__(self, *args, **kwargs):
+        super(MyMockBrowser, self).__init__(*args, **kwargs)
+        self.adapter = MyMockAdapter()
+        self.session.mount('http://', self.adapter)
+
+
+class RetryPolicyTest(TestCase):
+    # Check that only idempotent requests are retried on transient errors
+    def test_retryable(self):
+        policy = RetryPolicy()
+        error = ConnectionError()
+        self.assertIsNotNone(policy.get_retry_delay('GET', error, 0))
+        self.assertIsNone(policy.get_retry_delay('POST', error, 0))
+        self.assertIsNone(policy.get_retry_delay('GET', ValueError(), 0))
+        self.assertIsNone(policy.get_retry_delay('GET', error, 3))
+
+    # Check that delays grow exponentially, up to the maximum
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=1, backoff_max=5, jitter=False)
+        self.assertEqual([policy.get_backoff(i) for i in range(4)], [1, 2, 4, 5])
+
+        policy = RetryPolicy(backoff_factor=1, max_time=2, jitter=False)
+        self.assertEqual(policy.get_retry_delay('GET', ConnectionError(), 0, elapsed=0.5), 1)
+        self.assertIsNone(policy.get_retry_delay('GET', ConnectionError(), 1, elapsed=0.5))
+
+    # Check that the browser retries failed requests
+    def test_browser(self):
+        browser = MyMockBrowser()
+        browser.adapter.answers = [503, ConnectionError(), 200]
+        self.assertEqual(browser.open('http://weboob.org/').status_code, 200)
+        self.assertEqual(len(browser.adapter.requests), 3)
+
+        browser.adapter.answers = [503, 503, 503]
+        self.assertRaises(ServerError, browser.open, 'http://weboob.org/')
+        self.assertEqual(len(browser.adapter.requests), 6)
+
+        browser.adapter.answers = [503]
+        self.assertRaises(ServerError, browser.open, 'http://weboob.org/', data={'a': 1})
+        self.assertEqual(len(browser.adapter.requests), 7)
+
+        # Asynchronous requests are retried too.
+        browser.adapter.answers = [503, ConnectionError(), 200]
+        self.assertEqual(browser.async_open('http://weboob.org/').result(5).status_code, 200)
+        self.assertEqual(len(browser.adapter.requests), 10)
+
+        browser.adapter.answers = [503, 503, 503]
+        self.assertRaises(ServerError, browser.async_open('http://weboob.org/').result, 5)
+        self.assertEqual(len(browser.adapter.requests), 13)
+
+
+class CircuitBreakerTest(TestCase):
+    # Check that the circuit opens after failures, and is probed after the timeout
+    def test_states(self):
+        breaker = CircuitBreaker(threshold=2, timeout=0.1)
+        breaker.record(ConnectionError())
+        breaker.before_request()
+        breaker.record(ConnectionError())
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertRaises(CircuitOpen, breaker.before_request)
+
+        time.sleep(0.1)
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        breaker.before_request()
+        # Only one probe is sent.
+        self.assertRaises(CircuitOpen, breaker.before_request)
+        breaker.record(ConnectionError())
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+        time.sleep(0.1)
+        breaker.before_request()
+        breaker.record()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    # Check that the strictest settings apply when they are different for a key
+    def test_configure(self):
+        breaker = get_circuit_breaker('breaker-configure-test', threshold=5, timeout=10)
+        self.assertIs(get_circuit_breaker('breaker-configure-test', threshold=3, timeout=5), breaker)
+        get_circuit_breaker('breaker-configure-test', threshold=5, timeout=10)
+        self.assertEqual((breaker.threshold, breaker.timeout), (3, 10))
+
+    # Check that a browser fails fast on a host which is down
+    def test_browser(self):
+        browser = MyMockBrowser()
+        browser.RETRY_POLICY = None
+        browser.CIRCUIT_BREAKER_THRESHOLD = 2
+        browser.adapter.answers = [500, 500]
+        for i in range(2):
+            self.assertRaises(ServerError, browser.open, 'http://down.weboob.org/')
+        self.assertRaises(CircuitOpen, browser.open, 'http://down.weboob.org/')
+        self.assertEqual(len(browser.adapter.requests), 2)
+        self.assertEqual(browser.get_circuit_breaker('http://down.weboob.org/').state, CircuitBreaker.OPEN)
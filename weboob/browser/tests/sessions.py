@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+from threading import Event, Lock
+import time
+from unittest import TestCase
+
+from weboob.browser import PagesBrowser, URL
+from weboob.browser.exceptions import HTTPNotFound
+from weboob.browser.pages import RawPage
+from weboob.browser.sessions import FuturesSession
+from weboob.browser.tests.mockadapter import MyMockAdapter
+
+
+class MyMockSlowAdapter(MyMockAdapter):
+    """
+    Transport adapter which answers to /<delay> after delay milliseconds,
+    or with a 404 error.
+    """
+
+    def handle(self, request, response):
+        response._content = b''
+        try:
+            time.sleep(int(request.url.rsplit('/', 1)[1]) / 1000.)
+        except ValueError:
+            response.status_code = 404
+
+
+class MyMockPagesBrowser(PagesBrowser):
+    BASEURL = 'http://weboob.org/'
+
+    delay = URL(r'(?P<delay>\d+)', RawPage)
+
+    def __init__(self, *args, **kwargs):
+        super(MyMockPagesBrowser, self).__init__(*args, **kwargs)
+        self.session.mount('http://', MyMockSlowAdapter())
+
+
+class FuturesSessionTest(TestCase):
+    # Check that no more than max_workers functions of a session run at once
+    def test_max_workers(self):
+        session = FuturesSession(max_workers=2)
+        lock = Lock()
+        started = Event()
+        release = Event()
+        running = [0]
+        maximum = [0]
+
+        def func(i):
+            with lock:
+                running[0] += 1
+                maximum[0] = max(maximum[0], running[0])
+                if running[0] == 2:
+                    started.set()
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+            return i
+
+        futures = [session.submit(func, i) for i in range(6)]
+        # Let other functions try to start while two of them are running.
+        self.assertTrue(started.wait(5))
+        time.sleep(0.1)
+        release.set()
+        self.assertEqual([future.result(5) for future in futures], list(range(6)))
+        self.assertEqual(maximum[0], 2)
+
+    # Check that sessions share the same executor
+    def test_shared(self):
+        self.assertIs(FuturesSession().executor, FuturesSession().executor)
+
+
+class OpenManyTest(TestCase):
+    # Check that responses are yielded in completion order, with their page
+    def test_completion_order(self):
+        browser = MyMockPagesBrowser()
+        results = list(browser.open_many(['/300', '/0', '/150']))
+        self.assertEqual([url for url, response in results], ['/0', '/150', '/300'])
+        for url, response in results:
+            self.assertIsInstance(response.page, RawPage)
+
+    # Check that responses can be yielded in order, and errors kept per request
+    def test_ordered(self):
+        browser = MyMockPagesBrowser()
+        results = list(browser.open_many(['/200', 'nope', '/0'], ordered=True, return_exceptions=True))
+        self.assertEqual([url for url, response in results], ['/200', 'nope', '/0'])
+        self.assertIsInstance(results[1][1], HTTPNotFound)
+
+        with self.assertRaises(HTTPNotFound):
+            list(browser.open_many(['nope', '/0']))
+
+    # Check that no more than max_concurrency requests are running
+    def test_max_concurrency(self):
+        browser = MyMockPagesBrowser()
+        start = time.time()
+        list(browser.open_many(['/100'] * 4, max_concurrency=2))
+        self.assertGreaterEqual(time.time() - start, 0.2)
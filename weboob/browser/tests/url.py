@@ -19,7 +19,7 @@ from unittest import TestCase
 
 from weboob.browser import PagesBrowser, URL
 from weboob.browser.pages import Page
-from weboob.browser.url import UrlNotResolvable
+from weboob.browser.url import UrlNotResolvable, get_literal_prefix
 
 
 class MyMockBrowserWithoutBrowser(object):
@@ -135,3 +135,62 @@ class URLTest(TestCase):
         self.assertRaisesRegexp(AssertionError, "You can use this method" +
                                 " only if there is a Page class handler.",
                                 self.myBrowser.urlRegex.is_here, id=2)
+
+    # Check that the index gives URL objects which may match, in order
+    def test_index_candidates(self):
+        index = self.myBrowser.get_url_index()
+        self.assertEqual(index.get_candidates('http://weboob.org/news'), ['urlIsHere'])
+        self.assertEqual(index.get_candidates('http://free.fr/'), ['urlIsHereDifKlass'])
+        self.assertEqual(index.get_candidates('http://linuxfr.org/'), [])
+        self.assertIs(MyMockBrowser().get_url_index(), index)
+
+        # Regexps added to a URL object are taken into account.
+        self.myBrowser.urlIsHereDifKlass.urls.insert(0, 'http://linuxfr.org/')
+        self.assertEqual(self.myBrowser.get_url_index().get_candidates('http://linuxfr.org/'), ['urlIsHereDifKlass'])
+        self.assertEqual(MyMockBrowser().get_url_index().get_candidates('http://linuxfr.org/'), [])
+
+    # Check that literal prefixes of regexps are found
+    def test_literal_prefix(self):
+        self.assertEqual(get_literal_prefix(r'http://test\.com/\?id=(?P<id>\d+)'), 'http://test.com/?id=')
+        self.assertEqual(get_literal_prefix(r'^http://test\.com/a+b'), 'http://test.com/a')
+        self.assertEqual(get_literal_prefix(r'http://test\.com/a{2}'), 'http://test.com/')
+        self.assertEqual(get_literal_prefix(r'(?i)http://test\.com/'), '')
+
+
+class MyMockParentBrowser(PagesBrowser):
+    BASEURL = "http://weboob.org/"
+
+    parent = URL("parent", MyMockPage)
+
+
+class MyMockChildBrowser(PagesBrowser):
+    BASEURL = "http://weboob.org/"
+
+    child = URL("child", MyMockPage)
+
+
+# Class that tests the binding of URL objects to browsers
+class BrowserURLsTest(TestCase):
+
+    # Check that instances have their own URL objects
+    def test_bind(self):
+        browser1, browser2 = MyMockBrowser(), MyMockBrowser()
+        self.assertIsNot(browser1.urlRegex, browser2.urlRegex)
+        self.assertIs(browser1.urlRegex.browser, browser1)
+        self.assertIsNone(MyMockBrowser.urlRegex.browser)
+
+        browser1.urlRegex.urls.insert(0, "http://weboob3.org/")
+        self.assertEqual(browser2.urlRegex.urls, ["http://test.org/", "http://weboob2.org/"])
+        self.assertEqual(list(browser1._urls), [name for name, url in sorted(MyMockBrowser.get_class_urls(),
+                                                                             key=lambda v: v[1]._creation_counter)])
+
+    # Check that URL objects follow a change of bases, like in AbstractBrowser
+    def test_bases(self):
+        class MyMockAbstractBrowser(MyMockChildBrowser):
+            pass
+
+        self.assertIn('child', MyMockAbstractBrowser()._urls)
+        MyMockAbstractBrowser.__bases__ = (MyMockParentBrowser,)
+        browser = MyMockAbstractBrowser()
+        self.assertEqual(list(browser._urls), ['parent'])
+        self.assertEqual(browser.parent.build(), 'http://weboob.org/parent')
@@ -17,6 +17,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
+from copy import copy
 from functools import wraps
 import re
 import requests
@@ -45,6 +46,8 @@ class URL(object):
         self.urls = []
         self.klass = None
         self.browser = None
+        self._regexps = {}
+        self._templates = None
         for arg in args:
             if isinstance(arg, basestring):
                 self.urls.append(arg)
@@ -54,6 +57,20 @@ class URL(object):
         self._creation_counter = URL._creation_counter
         URL._creation_counter += 1
 
+    def bind(self, browser):
+        """
+        Get a copy of this object for a browser.
+
+        Unlike a deep copy, compiled regexps and templates are shared with
+        this object.
+
+        :rtype: :class:`URL`
+        """
+        url = copy(self)
+        url.urls = list(self.urls)
+        url.browser = browser
+        return url
+
     def is_here(self, **kwargs):
         """
         Returns True if the current page of browser matches this URL.
@@ -127,33 +144,70 @@ class URL(object):
         """
         browser = kwargs.pop('browser', self.browser)
         params = kwargs.pop('params', None)
-        patterns = []
-        for url in self.urls:
-            patterns += normalize(url)
-
-        for pattern, _ in patterns:
-            url = pattern
-            # only use full-name substitutions, to allow % in URLs
-            args = kwargs.copy()
-            for key in list(args.keys()):  # need to use keys() because of pop()
-                search = '%%(%s)s' % key
-                if search in pattern:
-                    url = url.replace(search, to_unicode(args.pop(key)))
-            # if there are named substitutions left, ignore pattern
-            if re.search('%\([A-z_]+\)s', url):
-                continue
-            # if not all args were used
-            if len(args):
-                continue
-
-            url = browser.absurl(url, base=True)
-            if params:
-                p = requests.models.PreparedRequest()
-                p.prepare_url(url, params)
-                url = p.url
-            return url
-
-        raise UrlNotResolvable('Unable to resolve URL with %r. Available are %s' % (kwargs, ', '.join([pattern for pattern, _ in patterns])))
+
+        template = self.get_template(frozenset(kwargs))
+        if template is None:
+            raise UrlNotResolvable('Unable to resolve URL with %r. Available are %s' % (kwargs, ', '.join([pattern for pattern, _ in self._templates[1]])))
+
+        parts = []
+        for i, part in enumerate(template):
+            if i % 2 == 0:
+                parts.append(part)
+            elif part in kwargs:
+                parts.append(to_unicode(kwargs[part]))
+            else:
+                # Optional substitution, which is kept as is.
+                parts.append(u'%%(%s)s' % part)
+        url = u''.join(parts)
+
+        url = browser.absurl(url, base=True)
+        if params:
+            p = requests.models.PreparedRequest()
+            p.prepare_url(url, params)
+            url = p.url
+        return url
+
+    def get_template(self, names):
+        """
+        Get the first reverse template of regexps of this object which can be
+        built with these parameters.
+
+        Templates are computed once with
+        :func:`weboob.tools.regex_helper.normalize`, and the one to use with a
+        set of parameters is remembered.
+
+        :param names: names of parameters
+        :type names: frozenset
+        :returns: literal parts of the URL, separated by names of parameters,
+                  or None if there is no template for these parameters
+        :rtype: list
+        """
+        urls = tuple(self.urls)
+        if self._templates is None or self._templates[0] != urls:
+            templates = []
+            for url in urls:
+                for pattern, _ in normalize(url):
+                    templates.append((pattern, re.split(r'%\((\w+)\)s', pattern)))
+            self._templates = (urls, templates, {})
+
+        by_names = self._templates[2]
+        try:
+            return by_names[names]
+        except KeyError:
+            pass
+
+        for _, template in self._templates[1]:
+            pattern_names = set(template[1::2])
+            # Only use full-name substitutions, to allow % in URLs, and
+            # ignore patterns with named substitutions left or if not all
+            # parameters are used.
+            if names <= pattern_names and \
+               not any(re.match(r'[A-z_]+$', name) for name in pattern_names - names):
+                break
+        else:
+            template = None
+        by_names[names] = template
+        return template
 
     def match(self, url, base=None):
         """
@@ -163,13 +217,24 @@ class URL(object):
             assert self.browser is not None
             base = self.browser.BASEURL
 
-        for regex in self.urls:
-            if not re.match(r'^[\w\?]+://.*', regex):
-                regex = re.escape(base).rstrip('/') + '/' + regex.lstrip('/')
-            m = re.match(regex, url)
+        for regex in self.get_regexps(base):
+            m = regex.match(url)
             if m:
                 return m
 
+    def get_regexps(self, base):
+        """
+        Get compiled regexps of this object, relative to a base URL.
+
+        :rtype: list[:class:`re.Pattern`]
+        """
+        key = (base, tuple(self.urls))
+        try:
+            return self._regexps[key]
+        except KeyError:
+            regexps = self._regexps[key] = [re.compile(absolute_regex(regex, base)) for regex in self.urls]
+            return regexps
+
     def handle(self, response):
         """
         Handle a HTTP response to get an instance of the klass if it matches.
@@ -210,6 +275,119 @@ class URL(object):
         return inner
 
 
+def absolute_regex(regex, base):
+    r"""
+    Get the regexp of absolute URLs from the regexp of an :class:`URL`,
+    which may be relative to a base URL.
+
+    >>> absolute_regex(r'list/(?P<id>\d+)', 'https://weboob.org/')
+    'https://weboob\\.org/list/(?P<id>\\d+)'
+    """
+    if re.match(r'^[\w\?]+://.*', regex):
+        return regex
+    return re.escape(base).rstrip('/') + '/' + regex.lstrip('/')
+
+
+def get_literal_prefix(regex):
+    r"""
+    Get the text which starts every string matched by a regexp.
+
+    >>> get_literal_prefix(r'https://weboob\.org/list-(?P<id>\d+)')
+    'https://weboob.org/list-'
+    >>> get_literal_prefix(r'https://weboob\.org/lists?')
+    'https://weboob.org/list'
+    >>> get_literal_prefix(r'https://weboob\.org/(list|search)')
+    ''
+    """
+    if '|' in regex:
+        # Alternatives may start anywhere.
+        return ''
+
+    prefix = []
+    i = 1 if regex.startswith('^') else 0
+    while i < len(regex):
+        if regex[i] == '\\':
+            if regex[i + 1:i + 2].isalnum() or i + 1 >= len(regex):
+                # Character class or reference.
+                break
+            char, i = regex[i + 1], i + 2
+        elif regex[i] in '.^$*+?{}[]()':
+            break
+        else:
+            char, i = regex[i], i + 1
+
+        quantifier = regex[i:i + 1]
+        if quantifier and quantifier in '*?{':
+            # The character is optional.
+            break
+        prefix.append(char)
+        if quantifier == '+':
+            break
+    return ''.join(prefix)
+
+
+class URLIndex(object):
+    """
+    Find :class:`URL` objects which may match an URL, without trying all
+    their regexps.
+
+    Regexps are indexed by their literal prefix, so only objects with a
+    prefix of the URL are candidates.
+
+    Use :meth:`get` to share indexes of the same URL objects.
+
+    :param urls: names and URL objects, in order of priority
+    :type urls: list[(str, :class:`URL`)]
+    :param base: base URL of relative regexps
+    :type base: str
+    """
+
+    _cache = {}
+
+    def __init__(self, urls, base):
+        self.names = []
+        self.prefixes = {}
+        for name, url in urls:
+            position = len(self.names)
+            self.names.append(name)
+            for regex in url.urls:
+                try:
+                    prefix = get_literal_prefix(absolute_regex(regex, base))
+                except TypeError:
+                    # Relative regexp without base URL, it fails to match.
+                    prefix = ''
+                self.prefixes.setdefault(prefix, set()).add(position)
+        self.lengths = sorted(set(len(prefix) for prefix in self.prefixes))
+
+    @classmethod
+    def get(cls, urls, base):
+        """
+        Get the index of these URL objects, built once for the same
+        regexps.
+
+        :rtype: :class:`URLIndex`
+        """
+        key = (base, tuple((name, tuple(url.urls)) for name, url in urls))
+        try:
+            return cls._cache[key]
+        except KeyError:
+            index = cls._cache[key] = cls(urls, base)
+            return index
+
+    def get_candidates(self, url):
+        """
+        Get names of URL objects which may match an URL, in order of priority.
+
+        :rtype: list[str]
+        """
+        positions = set()
+        for length in self.lengths:
+            if length > len(url):
+                break
+            positions.update(self.prefixes.get(url[:length], ()))
+        return [self.names[position] for position in sorted(positions)]
+
+
 def normalize_url(url):
     """Normalize URL by lower-casing the domain and other fixes.
 
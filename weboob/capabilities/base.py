@@ -180,6 +180,10 @@ class EmptyType(object):
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        # Unpickle to the same constant, so 'is' checks keep working.
+        return repr(self)
+
     def __nonzero__(self):
         return False
 
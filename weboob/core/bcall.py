@@ -18,12 +18,14 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+from collections import deque
 from copy import copy
-from threading import Thread, Event
-try:
-    import Queue
-except ImportError:
-    import queue as Queue
+from threading import Thread, Event, Condition, local
+from time import time
+from types import GeneratorType
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
 
 from weboob.capabilities.base import BaseObject
 from weboob.tools.compat import basestring
@@ -31,7 +33,7 @@ from weboob.tools.misc import get_backtrace
 from weboob.tools.log import getLogger
 
 
-__all__ = ['BackendsCall', 'CallErrors']
+__all__ = ['BackendsCall', 'CallErrors', 'CallTimeout', 'AsyncBackendsCallIterator']
 
 
 class CallErrors(Exception):
@@ -47,82 +49,378 @@ class CallErrors(Exception):
         return self.errors.__iter__()
 
 
-class BackendsCall(object):
-    def __init__(self, backends, function, *args, **kwargs):
-        """
-        :param backends: List of backends to call
-        :type backends: list[:class:`Module`]
-        :param function: backends' method name, or callable object.
-        :type function: :class:`str` or :class:`callable`
-        """
+class CallTimeout(Exception):
+    """
+    Stored in :class:`CallErrors` for a backend which did not finish before
+    the deadline or its timeout. Its remaining work has been cancelled.
+    """
+
+
+# Calls whose results have been read by each thread.
+_consumed_calls = local()
+
+
+def _get_consumed_calls():
+    try:
+        return _consumed_calls.calls
+    except AttributeError:
+        _consumed_calls.calls = weakref.WeakSet()
+        return _consumed_calls.calls
+
+
+class _CallState(object):
+    """
+    State of a :class:`BackendsCall`, shared with the workers which run the
+    backends.
+
+    Workers do not keep a reference to the :class:`BackendsCall` itself, so
+    it is garbage collected when the consumer drops it.
+    """
+
+    def __init__(self, backends, buffer_size, deadline=None, timeout=None):
         self.logger = getLogger('bcall')
+        self.buffer_size = buffer_size
+        self.timeout = timeout
 
-        self.responses = Queue.Queue()
+        self.responses = deque()
         self.errors = []
-        self.tasks = Queue.Queue()
         self.stop_event = Event()
-        self.threads = []
+        # Notified each time a result is stored, a task finishes or the call
+        # is stopped, so consumers never have to poll.
+        self.condition = Condition()
+        # Backends whose task is not finished yet.
+        self.unfinished = list(backends)
+        # Start time of backends which are running.
+        self.running = {}
+        # Backends cancelled because they were too late.
+        self.expired = set()
+        self.deadline = None if deadline is None else time() + deadline
+        # Set when the consumer will not read results before every task is
+        # finished, or is gone.
+        self.unbounded = False
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """
+        Add a function called every time the state of the call changes (new
+        result, task finished, call stopped...).
 
-        for backend in backends:
-            t = Thread(target=self.backend_process, args=(function, args, kwargs))
-            t.start()
-            self.threads.append(t)
-            self.tasks.put(backend)
+        The function is called from any thread, with :attr:`condition`
+        acquired, so it must not block.
+        """
+        with self.condition:
+            self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self.condition:
+            self.listeners.remove(callback)
+
+    def notify(self):
+        """
+        Wake up everyone waiting for this call.
+
+        Must be called with :attr:`condition` acquired.
+        """
+        self.condition.notify_all()
+        for listener in self.listeners:
+            listener()
+
+    def is_cancelled(self, backend):
+        """
+        Check if the task of a backend must stop.
+        """
+        return self.stop_event.is_set() or backend in self.expired
+
+    def is_over(self):
+        """
+        Check if every backend which has not been cancelled is finished.
+        """
+        return all(backend in self.expired for backend in self.unfinished)
+
+    def check_timeouts(self):
+        """
+        Cancel backends which reached the deadline or their timeout.
+
+        Must be called with :attr:`condition` acquired.
+
+        :returns: number of seconds before the next expiration, or None
+        :rtype: :class:`float`
+        """
+        if self.deadline is None and self.timeout is None:
+            return None
+
+        now = time()
+        next_expiration = None
+        for backend in self.unfinished:
+            if backend in self.expired:
+                continue
+
+            expiration = self.deadline
+            if self.timeout is not None and backend in self.running:
+                backend_expiration = self.running[backend] + self.timeout
+                if expiration is None or backend_expiration < expiration:
+                    expiration = backend_expiration
+
+            if expiration is None:
+                continue
+
+            if expiration <= now:
+                self.logger.debug('%s: Call is too late, cancelling it', backend)
+                self.expired.add(backend)
+                self.errors.append((backend, CallTimeout('Call was too long and has been cancelled'), ''))
+                if backend in self.running:
+                    backend.cancel_requests()
+            elif next_expiration is None or expiration - now < next_expiration:
+                next_expiration = expiration - now
+
+        if self.expired:
+            self.notify()
+
+        return next_expiration
+
+    def next_expiration(self):
+        """
+        Get the number of seconds before a backend reaches the deadline or
+        its timeout, or None.
+        """
+        with self.condition:
+            return self.check_timeouts()
+
+    def wait_condition(self):
+        """
+        Wait for :attr:`condition` to be notified, or for the next expiration.
+
+        Must be called with :attr:`condition` acquired.
+        """
+        self.condition.wait(self.check_timeouts())
+        self.check_timeouts()
 
     def store_result(self, backend, result):
-        """Store the result when a backend task finished."""
+        """
+        Store the result when a backend task finished.
+
+        It blocks while the buffer of results is full.
+        """
         if result is None:
             return
 
         if isinstance(result, BaseObject):
             result.backend = backend.name
-        self.responses.put(result)
 
-    def backend_process(self, function, args, kwargs):
+        with self.condition:
+            self.check_timeouts()
+            while len(self.responses) >= self.buffer_size and not self.unbounded and not self.is_cancelled(backend):
+                self.wait_condition()
+
+            if self.is_cancelled(backend):
+                return
+
+            self.responses.append(result)
+            self.notify()
+
+    def store_error(self, backend, error):
+        """
+        Store an error raised by a backend.
+
+        Errors raised after the task has been cancelled are ignored, as they
+        are usually caused by the cancellation itself.
+        """
+        if self.is_cancelled(backend):
+            self.logger.debug('%s: Ignoring error raised after cancellation: %r', backend, error)
+            return
+
+        self.errors.append((backend, error, get_backtrace(error)))
+
+    def backend_process(self, backend, function, args, kwargs):
         """
         Internal method to run a method of a backend.
 
-        As this method may be blocking, it should be run on its own thread.
+        As this method may be blocking, it should be run on a worker of the
+        executor.
         """
-        backend = self.tasks.get()
-        with backend:
-            try:
-                # Call method on backend
+        finished = False
+        try:
+            if self.is_cancelled(backend):
+                return
+
+            with backend:
+                with self.condition:
+                    if self.is_cancelled(backend):
+                        return
+                    self.running[backend] = time()
+                    # Consumers have to take this backend's timeout into account.
+                    self.notify()
+
                 try:
-                    self.logger.debug('%s: Calling function %s', backend, function)
-                    if callable(function):
-                        result = function(backend, *args, **kwargs)
-                    else:
-                        result = getattr(backend, function)(*args, **kwargs)
-                except Exception as error:
-                    self.logger.debug('%s: Called function %s raised an error: %r', backend, function, error)
-                    self.errors.append((backend, error, get_backtrace(error)))
-                else:
-                    self.logger.debug('%s: Called function %s returned: %r', backend, function, result)
-
-                    if hasattr(result, '__iter__') and not isinstance(result, (bytes, basestring)):
-                        # Loop on iterator
-                        try:
-                            for subresult in result:
-                                self.store_result(backend, subresult)
-                                if self.stop_event.is_set():
-                                    break
-                        except Exception as error:
-                            self.errors.append((backend, error, get_backtrace(error)))
-                    else:
-                        self.store_result(backend, result)
+                    self.call_backend(backend, function, args, kwargs)
+                finally:
+                    with self.condition:
+                        del self.running[backend]
+                        self.unfinished.remove(backend)
+                        finished = True
+                        cancelled = self.is_cancelled(backend)
+                    if cancelled:
+                        backend.resume_requests()
+        finally:
+            with self.condition:
+                if not finished:
+                    self.unfinished.remove(backend)
+                self.notify()
+
+    def call_backend(self, backend, function, args, kwargs):
+        # Call method on backend
+        try:
+            self.logger.debug('%s: Calling function %s', backend, function)
+            if callable(function):
+                result = function(backend, *args, **kwargs)
+            else:
+                result = getattr(backend, function)(*args, **kwargs)
+        except Exception as error:
+            self.logger.debug('%s: Called function %s raised an error: %r', backend, function, error)
+            self.store_error(backend, error)
+            return
+
+        self.logger.debug('%s: Called function %s returned: %r', backend, function, result)
+
+        if hasattr(result, '__iter__') and not isinstance(result, (bytes, basestring)):
+            # Loop on iterator
+            try:
+                for subresult in result:
+                    self.store_result(backend, subresult)
+                    if self.is_cancelled(backend):
+                        break
+            except Exception as error:
+                self.store_error(backend, error)
             finally:
-                self.tasks.task_done()
+                if isinstance(result, GeneratorType):
+                    # Run the cleanup of the generator now, without waiting
+                    # for it to be garbage collected.
+                    result.close()
+        else:
+            self.store_result(backend, result)
+
+    def _next_response(self, block=True):
+        """
+        Block until a response is available.
+
+        :param block: if False, do not wait for a response
+        :type block: :class:`bool`
+        :returns: a tuple (has_response, response); has_response is False
+                  when every task is over and all responses have been
+                  consumed, or when the call has been stopped. It is None
+                  when block is False and no response is available yet.
+        """
+        consumed_calls = _get_consumed_calls()
+        consumed_calls.add(self)
+
+        with self.condition:
+            self.check_timeouts()
+            while not self.responses and not self.is_over() and not self.stop_event.is_set():
+                if not block:
+                    return None, None
+                self.wait_condition()
+
+            if self.stop_event.is_set() or not self.responses:
+                consumed_calls.discard(self)
+                return False, None
+
+            response = self.responses.popleft()
+            # Wake up backends waiting for room in the buffer.
+            self.notify()
+            return True, response
+
+    def release(self):
+        """
+        Do not bound the buffer of results anymore, to let backends finish.
+        """
+        with self.condition:
+            self.unbounded = True
+            self.notify()
+
+    def stop(self):
+        """
+        Tell backends to stop, and cancel requests of running ones.
+        """
+        with self.condition:
+            self.stop_event.set()
+            for backend in self.running:
+                backend.cancel_requests()
+            self.notify()
+
+
+class BackendsCall(object):
+    BUFFER_SIZE = 100
+    """
+    Maximum number of results waiting to be consumed. When it is reached,
+    backends are blocked until the consumer reads some results, makes
+    another call, or until this object is garbage collected.
+    """
+
+    def __init__(self, backends, function, *args, **kwargs):
+        """
+        :param backends: List of backends to call
+        :type backends: list[:class:`Module`]
+        :param function: backends' method name, or callable object.
+        :type function: :class:`str` or :class:`callable`
+        :param executor: executor on which backends are called. If not
+                         given, a private one is created for this call.
+        :type executor: :class:`concurrent.futures.Executor`
+        :param deadline: if given, number of seconds after which the whole
+                         call is over: late backends are cancelled and
+                         reported with a :class:`CallTimeout` error.
+        :type deadline: :class:`float`
+        :param timeout: if given, maximum number of seconds for each backend,
+                        from the moment it starts to run.
+        :type timeout: :class:`float`
+        """
+        executor = kwargs.pop('executor', None)
+
+        # The consumer of other calls is making a nested call, for example
+        # on each account it reads. Backends of these calls, blocked by the
+        # full buffer, may hold the lock of a backend or a worker of the
+        # executor required by the new call, so their buffer can't be
+        # bounded anymore.
+        for state in list(_get_consumed_calls()):
+            state.release()
+
+        self._state = _CallState(backends, self.BUFFER_SIZE, kwargs.pop('deadline', None), kwargs.pop('timeout', None))
+        self.futures = []
+
+        if executor is None:
+            private_executor = ThreadPoolExecutor(max_workers=max(len(backends), 1))
+        else:
+            private_executor = None
+
+        for backend in backends:
+            future = (executor or private_executor).submit(self._state.backend_process, backend, function, args, kwargs)
+            self.futures.append(future)
+
+        if private_executor is not None:
+            # Workers exit as soon as their task is done.
+            private_executor.shutdown(wait=False)
+
+    def __getattr__(self, name):
+        # Attributes and methods of the state (errors, stop_event,
+        # add_listener()...).
+        if name == '_state':
+            raise AttributeError(name)
+        return getattr(self._state, name)
+
+    def __del__(self):
+        # Results can't be consumed anymore. The call is not stopped, as
+        # some callers do not read results of calls which change something,
+        # but backends must not be blocked by the full buffer.
+        state = self.__dict__.get('_state')
+        if state is not None:
+            state.release()
 
     def _callback_thread_run(self, callback, errback, finishback):
-        while not self.stop_event.is_set() and (self.tasks.unfinished_tasks or not self.responses.empty()):
-            try:
-                response = self.responses.get(timeout=0.1)
-            except Queue.Empty:
-                continue
-            else:
-                if callback:
-                    callback(response)
+        while True:
+            has_response, response = self._next_response()
+            if not has_response:
+                break
+            if callback:
+                callback(response)
 
         # Raise errors
         while errback and self.errors:
@@ -150,9 +448,18 @@ class BackendsCall(object):
         return thread
 
     def wait(self):
-        """Wait until all tasks are finished."""
-        for thread in self.threads:
-            thread.join()
+        """
+        Wait until all tasks are finished, or cancelled because of the
+        deadline or timeout.
+
+        Results are not consumed, so from now on the buffer is not bounded
+        anymore, to let backends finish.
+        """
+        state = self._state
+        state.release()
+        with state.condition:
+            while not state.is_over():
+                state.wait_condition()
 
         if self.errors:
             raise CallErrors(self.errors)
@@ -161,25 +468,171 @@ class BackendsCall(object):
         """
         Stop all tasks.
 
+        Backends stop at the next result, and requests of their browsers are
+        cancelled, so no more pages are fetched.
+
         :param wait: If True, wait until all tasks stopped.
         :type wait: bool
         """
 
-        self.stop_event.set()
+        self._state.stop()
 
         if wait:
             self.wait()
 
+    def first(self, predicate=None):
+        """
+        Get the first result, and stop the other backends as soon as it is
+        received.
+
+        Errors of backends are ignored if an accepted result is found.
+
+        :param predicate: if given, only results for which it returns True
+                          are accepted
+        :type predicate: :class:`callable`
+        :returns: the first accepted result, or None
+        :raises: :class:`CallErrors` if no result has been accepted and some
+                 backends failed
+        """
+        try:
+            for result in self:
+                if predicate is None or predicate(result):
+                    return result
+        finally:
+            self.stop()
+
+    def __aiter__(self):
+        return AsyncBackendsCallIterator(self)
+
     def __iter__(self):
         try:
-            while not self.stop_event.is_set() and (self.tasks.unfinished_tasks or not self.responses.empty()):
-                try:
-                    yield self.responses.get(timeout=0.1)
-                except Queue.Empty:
-                    continue
+            while True:
+                has_response, response = self._next_response()
+                if not has_response:
+                    break
+                yield response
         except:
             self.stop()
             raise
 
         if self.errors:
             raise CallErrors(self.errors)
+
+
+class AsyncBackendsCallIterator(object):
+    """
+    Asynchronous iterator on results of a :class:`BackendsCall`, to use it
+    with asyncio:
+
+    >>> async for result in weboob.do('iter_accounts'): # doctest: +SKIP
+    ...     print(result)
+
+    Results are delivered on the event loop without blocking it, as
+    backends wake it up when they store a result. Errors are raised at the
+    end as a :class:`CallErrors`. Cancelling the task, calling
+    :meth:`aclose` or dropping the iterator, for example with a ``break``
+    in ``async for``, stops the call.
+    """
+
+    def __init__(self, bcall):
+        self.bcall = bcall
+        self.loop = None
+        self.future = None
+        self.timer = None
+        self.finished = False
+
+        # Backends must not keep the iterator alive, so that it is stopped
+        # when the consumer drops it.
+        ref = weakref.ref(self)
+
+        def listener():
+            iterator = ref()
+            if iterator is not None:
+                iterator.notify()
+
+        self.listener = listener
+        self.bcall.add_listener(listener)
+
+    def __del__(self):
+        self.stop()
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        if self.loop is None:
+            import asyncio
+            self.loop = asyncio.get_event_loop()
+
+        self.future = self.loop.create_future()
+        self.future.add_done_callback(self.future_done)
+        self.fill()
+        return self.future
+
+    def notify(self):
+        # Called by the backends' threads.
+        if self.loop is None:
+            return
+
+        try:
+            self.loop.call_soon_threadsafe(self.fill)
+        except RuntimeError:
+            # Event loop is closed.
+            pass
+
+    def fill(self):
+        """
+        Set the result of the pending future, if a response is available.
+        """
+        future = self.future
+        if future is None or future.done():
+            return
+
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        has_response, response = self.bcall._next_response(block=False)
+        if has_response:
+            future.set_result(response)
+        elif has_response is False:
+            self.finished = True
+            self.close()
+            if self.bcall.errors:
+                future.set_exception(CallErrors(self.bcall.errors))
+            else:
+                future.set_exception(StopAsyncIteration())
+        else:
+            # Wake up at the next expiration to report late backends.
+            timeout = self.bcall.next_expiration()
+            if timeout is not None:
+                self.timer = self.loop.call_later(timeout, self.fill)
+
+    def future_done(self, future):
+        if future.cancelled():
+            self.stop()
+
+    def aclose(self):
+        """
+        Stop the call, like aclose() of asynchronous generators.
+
+        The call is stopped immediately, the returned awaitable does nothing.
+        """
+        import asyncio
+        self.stop()
+        return asyncio.sleep(0)
+
+    def stop(self):
+        self.close()
+        if not self.finished:
+            self.finished = True
+            self.bcall.stop()
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        try:
+            self.bcall.remove_listener(self.listener)
+        except ValueError:
+            pass
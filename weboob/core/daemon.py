@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+from multiprocessing.connection import Client, Listener
+from threading import Lock, Thread
+
+from weboob.core.workers import CallCanceller, RemoteBackend, serve_backend, _picklable_error
+from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace
+
+
+__all__ = ['DaemonBackend', 'DaemonClient', 'DaemonServer', 'get_daemon_address']
+
+
+def get_daemon_address(workdir):
+    """
+    Get paths of the socket and of the authentication key of the daemon
+    which runs in this working directory.
+
+    :rtype: tuple[:class:`str`, :class:`str`]
+    """
+    return os.path.join(workdir, 'daemon.sock'), os.path.join(workdir, 'daemon.key')
+
+
+class DaemonServer(object):
+    """
+    Serve loaded backends of a weboob instance on a local socket.
+
+    Backends and their browsers stay alive between invocations of
+    applications, which use them through :class:`DaemonBackend` proxies, so
+    modules are imported once and logged in sessions are kept.
+
+    Every connection is handled by its own thread. Calls to a backend are
+    serialized by its lock, like in :class:`weboob.core.bcall.BackendsCall`.
+
+    :param weboob: weboob instance with loaded backends
+    :type weboob: :class:`weboob.core.ouiboube.WebNip`
+    :param address: path of the unix socket
+    :type address: :class:`str`
+    :param keyfile: path of the file which contains the authentication key,
+                    it is created if it does not exist
+    :type keyfile: :class:`str`
+    """
+
+    def __init__(self, weboob, address=None, keyfile=None):
+        self.weboob = weboob
+        self.logger = getLogger('daemon')
+        self.cancellers = {}
+        self.cancellers_lock = Lock()
+
+        default_address, default_keyfile = get_daemon_address(weboob.workdir)
+        self.address = address or default_address
+        self.keyfile = keyfile or default_keyfile
+
+        if os.path.exists(self.address):
+            # Remaining of a previous daemon, check that it is not running.
+            try:
+                DaemonClient(self.address, self.keyfile).close()
+            except Exception:
+                os.remove(self.address)
+            else:
+                raise OSError('A daemon is already listening on %s' % self.address)
+
+        old_umask = os.umask(0o077)
+        try:
+            if not os.path.exists(self.keyfile):
+                with open(self.keyfile, 'wb') as fp:
+                    fp.write(os.urandom(32))
+            with open(self.keyfile, 'rb') as fp:
+                authkey = fp.read()
+            self.listener = Listener(self.address, 'AF_UNIX', authkey=authkey)
+        finally:
+            os.umask(old_umask)
+
+    def serve_forever(self):
+        """
+        Accept connections until :meth:`close` is called.
+        """
+        while self.listener is not None:
+            try:
+                conn = self.listener.accept()
+            except (OSError, IOError, EOFError, AttributeError):
+                if self.listener is None:
+                    break
+                # Probably an authentication failure.
+                self.logger.warning(u'Unable to accept a connection', exc_info=True)
+                continue
+
+            thread = Thread(target=self.handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def get_canceller(self, name):
+        """
+        Get the canceller of calls to a backend, shared by every client.
+
+        :rtype: :class:`weboob.core.workers.CallCanceller`
+        """
+        backend = self.weboob.get_backend(name)
+        with self.cancellers_lock:
+            canceller = self.cancellers.get(name)
+            if canceller is None or canceller.backend is not backend:
+                canceller = self.cancellers[name] = CallCanceller(backend)
+            return canceller
+
+    def handle(self, conn):
+        try:
+            message = conn.recv()
+        except EOFError:
+            conn.close()
+            return
+
+        command = message[0]
+        try:
+            if command == 'open':
+                _, name = message
+                canceller = self.get_canceller(name)
+                conn.send(('value', None))
+                serve_backend(conn, canceller.backend, canceller)
+                return
+            elif command == 'cancel':
+                _, name, call_ids = message
+                canceller = self.get_canceller(name)
+                for call_id in call_ids:
+                    canceller.cancel(call_id)
+                reply = ('value', None)
+            elif command == 'backends':
+                reply = ('value', dict((name, backend.NAME) for name, backend in self.weboob.backend_instances.items()))
+            else:
+                raise ValueError('Unknown command %r' % command)
+            conn.send(reply)
+        except Exception as error:
+            conn.send(('error', _picklable_error(error), get_backtrace(error)))
+        conn.close()
+
+    def close(self):
+        """
+        Stop accepting connections and remove the socket.
+        """
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            listener.close()
+
+
+class DaemonClient(object):
+    """
+    Connection to a :class:`DaemonServer`.
+
+    :param address: path of the unix socket
+    :type address: :class:`str`
+    :param keyfile: path of the file which contains the authentication key
+    :type keyfile: :class:`str`
+    """
+
+    def __init__(self, address, keyfile):
+        self.address = address
+        with open(keyfile, 'rb') as fp:
+            self.authkey = fp.read()
+        self.conn = self.connect()
+
+    def connect(self):
+        return Client(self.address, 'AF_UNIX', authkey=self.authkey)
+
+    def request(self, *message):
+        self.conn.send(message)
+        reply = self.conn.recv()
+        if reply[0] == 'error':
+            raise reply[1]
+        return reply[1]
+
+    def get_backends(self):
+        """
+        Get backends loaded by the daemon.
+
+        :returns: names of module by names of backend
+        :rtype: dict[:class:`str`, :class:`str`]
+        """
+        return self.request('backends')
+
+    def open_backend(self, weboob, name, logger=None):
+        """
+        Get a proxy to a backend of the daemon.
+
+        :rtype: :class:`DaemonBackend`
+        """
+        return DaemonBackend(weboob, self, name, logger)
+
+    def close(self):
+        self.conn.close()
+
+
+class DaemonBackend(RemoteBackend):
+    """
+    Backend served by a :class:`DaemonServer`.
+
+    It has its own connection to the daemon, so several backends can be used
+    at the same time.
+
+    :param weboob: weboob instance
+    :type weboob: :class:`weboob.core.ouiboube.WebNip`
+    :param client: client of the daemon
+    :type client: :class:`DaemonClient`
+    :param name: name of backend
+    :type name: :class:`str`
+    :param logger: logger
+    :type logger: :class:`logging.Logger`
+    """
+
+    def __init__(self, weboob, client, name, logger=None):
+        super(DaemonBackend, self).__init__(weboob, name, client.connect(), logger)
+        self._client = client
+        try:
+            self._request('open', name)
+        except Exception:
+            self._conn.close()
+            raise
+
+    def __repr__(self):
+        return "<Backend %r (daemon)>" % self.name
+
+    def cancel_requests(self):
+        """
+        Abort requests of the running calls in the daemon.
+
+        The connection of this backend is busy with the call to cancel, so
+        the request is sent on a new connection. Calls of other clients are
+        not affected.
+        """
+        call_ids = self.get_running_calls()
+        if not call_ids:
+            return
+
+        conn = self._client.connect()
+        try:
+            conn.send(('cancel', self.name, call_ids))
+            conn.recv()
+        finally:
+            conn.close()
+
+    def deinit(self):
+        """
+        Close the connection. The backend stays loaded in the daemon.
+        """
+        self._conn.close()
@@ -115,19 +115,19 @@ class ModulesLoader(object):
         return self.loaded[module_name]
 
     def iter_existing_module_names(self):
-        for name in os.listdir(self.path):
-            try:
-                if '__init__.py' in os.listdir(os.path.join(self.path, name)):
-                    yield name
-            except OSError:
-                # if path/name is not a directory
-                continue
+        return iter(self.get_existing_module_names())
+
+    def get_existing_module_names(self):
+        """
+        Get names of modules in the modules directory.
+
+        :rtype: list[:class:`str`]
+        """
+        return [name for name in sorted(os.listdir(self.path))
+                if os.path.exists(os.path.join(self.path, name, '__init__.py'))]
 
     def module_exists(self, name):
-        for existing_module_name in self.iter_existing_module_names():
-            if existing_module_name == name:
-                return True
-        return False
+        return name in self.get_existing_module_names()
 
     def load_all(self):
         for existing_module_name in self.iter_existing_module_names():
@@ -175,9 +175,11 @@ class RepositoryModulesLoader(ModulesLoader):
         super(RepositoryModulesLoader, self).__init__(repositories.modules_dir, repositories.version)
         self.repositories = repositories
 
-    def iter_existing_module_names(self):
-        for name in self.repositories.get_all_modules_info():
-            yield name
+    def get_existing_module_names(self):
+        return list(self.repositories.get_all_modules_info())
+
+    def module_exists(self, name):
+        return self.repositories.get_module_info(name) is not None
 
     def get_module_path(self, module_name):
         minfo = self.repositories.get_module_info(module_name)
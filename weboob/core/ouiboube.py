@@ -19,6 +19,9 @@
 
 
 import os
+from threading import Lock
+
+from concurrent.futures import ThreadPoolExecutor
 
 from weboob.core.bcall import BackendsCall
 from weboob.core.modules import ModulesLoader, RepositoryModulesLoader
@@ -26,6 +29,8 @@ from weboob.core.backendscfg import BackendsConfig
 from weboob.core.requests import RequestsManager
 from weboob.core.repositories import Repositories, PrintProgress
 from weboob.core.scheduler import Scheduler
+from weboob.core.daemon import DaemonClient, get_daemon_address
+from weboob.core.workers import BackendProcess
 from weboob.tools.backend import Module
 from weboob.tools.compat import basestring, unicode
 from weboob.tools.config.iconfig import ConfigError
@@ -62,6 +67,12 @@ class WebNip(object):
     """
     VERSION = '1.6'
 
+    MAX_WORKERS = 20
+    """
+    Maximum number of backends' calls which are run at the same time, for all
+    :func:`WebNip.do` calls.
+    """
+
     def __init__(self, modules_path=None, storage=None, scheduler=None):
         self.logger = getLogger('weboob')
         self.backend_instances = {}
@@ -85,6 +96,22 @@ class WebNip(object):
 
         self.storage = storage
 
+        self._executor = None
+        self._executor_lock = Lock()
+
+    @property
+    def executor(self):
+        """
+        Executor shared by every :func:`WebNip.do` call to run backends'
+        methods. It is created on first use.
+
+        :rtype: :class:`concurrent.futures.ThreadPoolExecutor`
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+            return self._executor
+
     def __deinit__(self):
         self.deinit()
 
@@ -95,6 +122,10 @@ class WebNip(object):
         """
         self.unload_backends()
 
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
     def build_backend(self, module_name, params=None, storage=None, name=None, nofail=False, logger=None):
         """
         Create a backend.
@@ -230,8 +261,8 @@ class WebNip(object):
 
     def do(self, function, *args, **kwargs):
         r"""
-        Do calls on loaded backends with specified arguments, in separated
-        threads.
+        Do calls on loaded backends with specified arguments, on the workers
+        of :attr:`WebNip.executor`.
 
         This function has two modes:
 
@@ -247,6 +278,15 @@ class WebNip(object):
         :type backends: list[:class:`str`]
         :param caps: iterate on backends which implement this caps
         :type caps: list[:class:`weboob.capabilities.base.Capability`]
+        :param executor: executor to use instead of :attr:`WebNip.executor`
+        :type executor: :class:`concurrent.futures.Executor`
+        :param deadline: number of seconds after which the call yields what
+                         it has and cancels the remaining backends, which are
+                         reported as :class:`weboob.core.bcall.CallTimeout`
+                         errors
+        :type deadline: :class:`float`
+        :param timeout: maximum number of seconds given to each backend
+        :type timeout: :class:`float`
         :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
         """
         backends = list(self.backend_instances.values())
@@ -281,8 +321,43 @@ class WebNip(object):
         # here on this object, because caller might want to use other methods, like
         # wait() on callback_thread().
         # Thanks a lot.
+        kwargs.setdefault('executor', self.executor)
         return BackendsCall(backends, function, *args, **kwargs)
 
+    def ado(self, function, *args, **kwargs):
+        """
+        Do calls on loaded backends like :func:`WebNip.do`, but return an
+        asynchronous iterator to consume results on an asyncio event loop:
+
+        >>> async for account in weboob.ado('iter_accounts'): # doctest: +SKIP
+        ...     print(account)
+
+        Errors are raised as :class:`weboob.core.bcall.CallErrors` at the end
+        of the iteration. Cancelling the asyncio task or leaving the iteration
+        early stops the calls.
+
+        :rtype: :class:`weboob.core.bcall.AsyncBackendsCallIterator`
+        """
+        return self.do(function, *args, **kwargs).__aiter__()
+
+    def race(self, function, *args, **kwargs):
+        """
+        Do calls on loaded backends like :func:`WebNip.do`, but only return
+        the first result. Other backends are cancelled as soon as it is
+        received, so the fastest backend sets the latency.
+
+        It takes the same arguments than :func:`WebNip.do`, plus:
+
+        :param predicate: if given, only results for which it returns True
+                          are accepted
+        :type predicate: :class:`callable`
+        :returns: the first accepted result, or None
+        :raises: :class:`weboob.core.bcall.CallErrors` if no result has been
+                 accepted and some backends failed
+        """
+        predicate = kwargs.pop('predicate', None)
+        return self.do(function, *args, **kwargs).first(predicate)
+
     def schedule(self, interval, function, *args):
         """
         Schedule an event.
@@ -429,10 +504,16 @@ class Weboob(WebNip):
 
         return super(Weboob, self).build_backend(module_name, params, storage, name, nofail)
 
-    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None):
+    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None, processes=None,
+                      daemon=False):
         """
         Load backends listed in config file.
 
+        Backends are filtered with the index of repositories, so modules of
+        other backends are not imported. Modules of loaded backends are
+        imported now, and not when backends are first used, as their
+        configuration errors are reported here (see *errors*).
+
         :param caps: load backends which implement all of specified caps
         :type caps: tuple[:class:`weboob.capabilities.base.Capability`]
         :param names: load backends in list
@@ -445,6 +526,17 @@ class Weboob(WebNip):
         :type storage: :class:`weboob.tools.storage.IStorage`
         :param errors: if specified, store every errors in this list
         :type errors: list[:class:`LoadError`]
+        :param processes: run these backends in their own worker process, see
+                          :class:`weboob.core.workers.BackendProcess`. If True,
+                          all backends are concerned. It can also be enabled
+                          with the "_process" parameter of a backend.
+        :type processes: tuple[:class:`str`] or :class:`bool`
+        :param daemon: use backends loaded by the daemon which runs in this
+                       working directory, see
+                       :class:`weboob.core.daemon.DaemonServer`. Backends it
+                       does not have, or all of them if it is not running, are
+                       loaded locally.
+        :type daemon: :class:`bool`
         :returns: loaded backends
         :rtype: dict[:class:`str`, :class:`weboob.tools.backend.Module`]
         """
@@ -452,6 +544,15 @@ class Weboob(WebNip):
         if storage is None:
             storage = self.storage
 
+        client = None
+        daemon_backends = {}
+        if daemon:
+            try:
+                client = DaemonClient(*get_daemon_address(self.workdir))
+                daemon_backends = client.get_backends()
+            except Exception as e:
+                self.logger.debug(u'Unable to connect to the daemon: %s', e)
+
         if not self.repositories.check_repositories():
             self.logger.error(u'Repositories are not consistent with the sources.list')
             raise VersionsMismatchError(u'Versions mismatch, please run "weboob-config update"')
@@ -472,6 +573,16 @@ class Weboob(WebNip):
             if caps is not None and not minfo.has_caps(caps):
                 continue
 
+            if daemon_backends.get(backend_name) == module_name:
+                if backend_name in self.backend_instances:
+                    self.unload_backends(backend_name)
+                try:
+                    self.backend_instances[backend_name] = loaded[backend_name] = client.open_backend(self, backend_name)
+                except Exception as e:
+                    self.logger.warning(u'Unable to use backend "%s" of the daemon: %s', backend_name, e)
+                else:
+                    continue
+
             if not minfo.is_installed():
                 self.repositories.install(minfo)
 
@@ -487,12 +598,18 @@ class Weboob(WebNip):
                 self.unload_backends(backend_name)
 
             try:
-                backend_instance = module.create_instance(self, backend_name, params, storage)
+                if processes is True or processes is not None and backend_name in processes or \
+                   params.get('_process', '').lower() in ('1', 'y', 'true', 'on', 'yes'):
+                    backend_instance = BackendProcess(self, module, backend_name, params, storage)
+                else:
+                    backend_instance = module.create_instance(self, backend_name, params, storage)
             except Module.ConfigError as e:
                 if errors is not None:
                     errors.append(self.LoadError(backend_name, e))
             else:
                 self.backend_instances[backend_name] = loaded[backend_name] = backend_instance
+        if client is not None:
+            client.close()
         return loaded
 
     def load_or_install_module(self, module_name):
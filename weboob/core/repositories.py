@@ -27,8 +27,11 @@ import sys
 import os
 import subprocess
 import hashlib
+import json
+from collections import OrderedDict
 from datetime import datetime
 from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
 from compileall import compile_dir
 from io import BytesIO, StringIO
 
@@ -70,6 +73,10 @@ class ModuleInfo(object):
         self.license = u''
         self.icon = u''
         self.urls = u''
+        # hash of files of the module, used to know if it has to be built again.
+        self.hash = None
+        # description of configuration fields, None if the index does not have it.
+        self.config = None
 
     def load(self, items):
         self.version = int(items['version'])
@@ -79,6 +86,26 @@ class ModuleInfo(object):
         self.license = to_unicode(items['license'])
         self.icon = items['icon'].strip() or None
         self.urls = items['urls']
+        self.hash = items.get('hash')
+        if items.get('config'):
+            self.config = OrderedDict(json.loads(items['config']))
+
+    def set_config(self, config):
+        """
+        Store the description of configuration fields of the module.
+
+        :param config: configuration of the module
+        :type config: :class:`weboob.tools.value.ValuesDict`
+        """
+        self.config = OrderedDict()
+        for key, field in config.items():
+            self.config[key] = {'label': field.label,
+                                'default': field.default,
+                                'description': field.description,
+                                'regexp': field.regexp,
+                                'choices': field.choices,
+                                'masked': field.masked,
+                                'required': field.required}
 
     def has_caps(self, *caps):
         """Return True if module implements at least one of the caps."""
@@ -98,14 +125,50 @@ class ModuleInfo(object):
         return self.url is None
 
     def dump(self):
-        return (('version', self.version),
-                ('capabilities', ' '.join(self.capabilities)),
-                ('description', self.description),
-                ('maintainer', self.maintainer),
-                ('license', self.license),
-                ('icon', self.icon or ''),
-                ('urls', self.urls),
-               )
+        items = [('version', self.version),
+                 ('capabilities', ' '.join(self.capabilities)),
+                 ('description', self.description),
+                 ('maintainer', self.maintainer),
+                 ('license', self.license),
+                 ('icon', self.icon or ''),
+                 ('urls', self.urls),
+                ]
+        if self.hash is not None:
+            items.append(('hash', self.hash))
+        if self.config is not None:
+            items.append(('config', json.dumps(list(self.config.items()), default=unicode)))
+        return tuple(items)
+
+
+def _build_module_info(path, name):
+    """
+    Import a module to describe it.
+
+    It is run in worker processes by :meth:`Repository.build_index`.
+
+    :returns: information about the module, or the error and its backtrace
+    :rtype: tuple[:class:`ModuleInfo`, tuple]
+    """
+    module_path = os.path.join(path, name)
+    try:
+        fp, pathname, description = imp.find_module(name, [path])
+        try:
+            module = LoadedModule(imp.load_module(name, fp, pathname, description))
+        finally:
+            if fp:
+                fp.close()
+    except Exception as e:
+        return None, ('[%s] %s' % (type(e).__name__, e), get_backtrace(e))
+
+    m = ModuleInfo(module.name)
+    m.version = Repository.get_tree_mtime(module_path)
+    m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
+    m.description = module.description
+    m.maintainer = module.maintainer
+    m.license = module.license
+    m.icon = module.icon or ''
+    m.set_config(module.config)
+    return m, None
 
 
 class RepositoryUnavailable(Exception):
@@ -268,16 +331,24 @@ class Repository(object):
                 module.signed = self.signed
             self.modules[section] = module
 
-    def build_index(self, path, filename):
+    def build_index(self, path, filename, processes=None):
         """
         Rebuild index of modules of repository.
 
+        Modules whose content has not changed since the previous index
+        are not imported again. Other ones are imported in a pool of
+        processes, as importing modules takes most of the time.
+
         :param path: path of the repository
         :type path: str
         :param filename: file to save index
         :type filename: str
+        :param processes: number of processes used to import modules, by
+                          default the number of CPUs
+        :type processes: int
         """
         self.logger.debug('Rebuild index')
+        previous = dict(self.modules)
         self.modules.clear()
         self.errors.clear()
 
@@ -288,32 +359,33 @@ class Repository(object):
             self.signed = False
             self.key_update = 0
 
+        to_build = []
         for name in sorted(os.listdir(path)):
             module_path = os.path.join(path, name)
             if not os.path.isdir(module_path) or '.' in name or name == self.KEYDIR or not os.path.exists(os.path.join(module_path, '__init__.py')):
                 continue
 
-            try:
-                fp, pathname, description = imp.find_module(name, [path])
-                try:
-                    module = LoadedModule(imp.load_module(name, fp, pathname, description))
-                finally:
-                    if fp:
-                        fp.close()
-            except Exception as e:
-                self.logger.warning('Unable to build module %s: [%s] %s' % (name, type(e).__name__, e))
-                bt = get_backtrace(e)
-                self.logger.debug(bt)
-                self.errors[name] = bt
+            tree_hash = self.get_tree_hash(module_path)
+            m = previous.get(name)
+            if m is not None and m.hash == tree_hash and m.config is not None:
+                self.modules[m.name] = m
             else:
-                m = ModuleInfo(module.name)
-                m.version = self.get_tree_mtime(module_path)
-                m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
-                m.description = module.description
-                m.maintainer = module.maintainer
-                m.license = module.license
-                m.icon = module.icon or ''
-                self.modules[module.name] = m
+                to_build.append((name, tree_hash))
+
+        if len(to_build) > 1 and processes != 1:
+            with ProcessPoolExecutor(processes) as executor:
+                results = list(executor.map(_build_module_info, [path] * len(to_build), [name for name, _ in to_build]))
+        else:
+            results = [_build_module_info(path, name) for name, _ in to_build]
+
+        for (name, tree_hash), (m, error) in zip(to_build, results):
+            if m is None:
+                self.logger.warning('Unable to build module %s: %s' % (name, error[0]))
+                self.logger.debug(error[1])
+                self.errors[name] = error[1]
+            else:
+                m.hash = tree_hash
+                self.modules[m.name] = m
 
         self.update = int(datetime.now().strftime('%Y%m%d%H%M'))
         self.save(filename)
@@ -322,15 +394,35 @@ class Repository(object):
     def get_tree_mtime(path, include_root=False):
         mtime = 0
         if include_root:
-            mtime = int(datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y%m%d%H%M'))
+            mtime = os.path.getmtime(path)
         for root, dirs, files in os.walk(path):
             for f in files:
                 if f.endswith('.pyc'):
                     continue
-                m = int(datetime.fromtimestamp(os.path.getmtime(os.path.join(root, f))).strftime('%Y%m%d%H%M'))
-                mtime = max(mtime, m)
+                mtime = max(mtime, os.path.getmtime(os.path.join(root, f)))
 
-        return mtime
+        if not mtime:
+            return 0
+        return int(datetime.fromtimestamp(mtime).strftime('%Y%m%d%H%M'))
+
+    @staticmethod
+    def get_tree_hash(path):
+        """
+        Get a hash of names and contents of files in a tree.
+
+        :rtype: str
+        """
+        h = hashlib.sha1()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                if f.endswith('.pyc'):
+                    continue
+                filepath = os.path.join(root, f)
+                h.update(os.path.relpath(filepath, path).encode('utf-8'))
+                with open(filepath, 'rb') as fp:
+                    h.update(fp.read())
+        return h.hexdigest()
 
     def save(self, filename, private=False):
         """
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from threading import Event, RLock, Thread
+from time import time
+from unittest import TestCase
+
+from concurrent.futures import ThreadPoolExecutor
+
+from weboob.core.bcall import BackendsCall, CallErrors, CallTimeout
+
+
+class MySmallBackendsCall(BackendsCall):
+    BUFFER_SIZE = 5
+
+
+# Mock that allows to represent a backend
+class MyMockBackend(object):
+    def __init__(self, name, results=(), error=None, release=None):
+        self.name = name
+        self.lock = RLock()
+        self.results = results
+        self.error = error
+        self.release = release
+        self.produced = 0
+        self.closed = Event()
+        self.cancelled = Event()
+        self.started = Event()
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, t, v, tb):
+        self.lock.release()
+
+    def cancel_requests(self):
+        self.cancelled.set()
+
+    def resume_requests(self):
+        self.cancelled.clear()
+
+    def iter_results(self):
+        self.started.set()
+        if self.release is not None:
+            self.release.wait()
+        for result in self.results:
+            yield result
+        if self.error is not None:
+            raise self.error
+
+    def iter_endless(self):
+        try:
+            while True:
+                self.produced += 1
+                yield self.produced
+        finally:
+            self.closed.set()
+
+    def get_result(self, value):
+        return value
+
+
+# Class that tests the BackendsCall class
+class BackendsCallTest(TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    # Check that results of every backend are yielded
+    def test_iter_results(self):
+        backends = [MyMockBackend('b%d' % i, results=range(3)) for i in range(5)]
+        bcall = BackendsCall(backends, 'iter_results', executor=self.executor)
+        self.assertEqual(sorted(bcall), sorted(list(range(3)) * 5))
+
+    # Check that a callable is called with the backend as first argument
+    def test_callable(self):
+        backends = [MyMockBackend('b1'), MyMockBackend('b2')]
+        bcall = BackendsCall(backends, lambda backend, suffix: backend.name + suffix, '!', executor=self.executor)
+        self.assertEqual(sorted(bcall), ['b1!', 'b2!'])
+
+    # Check that errors are collected and raised at the end of iteration
+    def test_errors(self):
+        backends = [MyMockBackend('ok', results=[1]), MyMockBackend('ko', results=[2], error=ValueError('ko'))]
+        bcall = BackendsCall(backends, 'iter_results', executor=self.executor)
+        results = []
+        with self.assertRaises(CallErrors) as ctx:
+            for result in bcall:
+                results.append(result)
+        self.assertEqual(sorted(results), [1, 2])
+        self.assertEqual([backend.name for backend, _, _ in ctx.exception], ['ko'])
+
+    # Check that a result is delivered as soon as it is stored
+    def test_no_polling(self):
+        release = Event()
+        backends = [MyMockBackend('fast', results=[1]), MyMockBackend('slow', results=[2], release=release)]
+        bcall = BackendsCall(backends, 'iter_results', executor=self.executor)
+        it = iter(bcall)
+        self.assertEqual(next(it), 1)
+        release.set()
+        start = time()
+        self.assertEqual(list(it), [2])
+        self.assertLess(time() - start, 0.05)
+
+    # Check that calls work without a shared executor
+    def test_private_executor(self):
+        backends = [MyMockBackend('b%d' % i) for i in range(3)]
+        bcall = BackendsCall(backends, 'get_result', 42)
+        bcall.wait()
+        self.assertEqual(list(bcall), [42, 42, 42])
+
+    # Check that callback_thread calls every callback
+    def test_callback_thread(self):
+        backends = [MyMockBackend('ok', results=[1, 2]), MyMockBackend('ko', error=ValueError('ko'))]
+        bcall = BackendsCall(backends, 'iter_results', executor=self.executor)
+        results, errors, finished = [], [], Event()
+        thread = bcall.callback_thread(results.append,
+                                       lambda backend, error, backtrace: errors.append(backend.name),
+                                       finished.set)
+        thread.join()
+        self.assertEqual(sorted(results), [1, 2])
+        self.assertEqual(errors, ['ko'])
+        self.assertTrue(finished.is_set())
+
+    # Check that backends are blocked when the buffer is full, and that
+    # stopping the call closes their generators
+    def test_backpressure_and_stop(self):
+        backend = MyMockBackend('endless')
+        bcall = MySmallBackendsCall([backend], 'iter_endless', executor=self.executor)
+        it = iter(bcall)
+        self.assertEqual(next(it), 1)
+        self.assertFalse(backend.closed.wait(0.1))
+        self.assertLessEqual(backend.produced, MySmallBackendsCall.BUFFER_SIZE + 2)
+        it.close()
+        self.assertTrue(backend.closed.wait(1))
+        bcall.wait()
+        self.assertEqual(bcall.unfinished, [])
+        self.assertFalse(backend.cancelled.is_set())
+
+    # Check that backends are not blocked when results are thrown away
+    def test_thrown_away(self):
+        backend = MyMockBackend('many', results=range(MySmallBackendsCall.BUFFER_SIZE * 3))
+        MySmallBackendsCall([backend], 'iter_results', executor=self.executor)
+        self.assertEqual(self.executor.submit(lambda: 42).result(timeout=1), 42)
+        self.assertEqual(self.executor.submit(lambda: 42).result(timeout=1), 42)
+
+    # Check that the consumer can make nested calls while backends of the
+    # first call are blocked by the full buffer
+    def test_nested_calls(self):
+        def consume(backends, nested):
+            for result in MySmallBackendsCall(backends, 'iter_results', executor=self.executor):
+                nested.extend(MySmallBackendsCall(backends[:1], 'get_result', result, executor=self.executor))
+
+        for backends in ([MyMockBackend('many', results=range(MySmallBackendsCall.BUFFER_SIZE * 3))],
+                         [MyMockBackend('b%d' % i, results=[i]) for i in range(MySmallBackendsCall.BUFFER_SIZE * 3)]):
+            nested = []
+            thread = Thread(target=consume, args=(backends, nested))
+            thread.daemon = True
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(sorted(nested), list(range(MySmallBackendsCall.BUFFER_SIZE * 3)))
+
+    # Check that the deadline yields available results and reports late
+    # backends as timeouts
+    def test_deadline(self):
+        release = Event()
+        fast, slow = MyMockBackend('fast', results=[1]), MyMockBackend('slow', results=[2], release=release)
+        bcall = BackendsCall([fast, slow], 'iter_results', executor=self.executor, deadline=0.2)
+        results = []
+        start = time()
+        with self.assertRaises(CallErrors) as ctx:
+            for result in bcall:
+                results.append(result)
+        self.assertLess(time() - start, 1)
+        self.assertEqual(results, [1])
+        self.assertTrue(slow.started.is_set())
+        self.assertEqual([(backend.name, type(error)) for backend, error, _ in ctx.exception],
+                         [('slow', CallTimeout)])
+        self.assertTrue(slow.cancelled.is_set())
+        release.set()
+
+    # Check that the timeout applies to each backend
+    def test_timeout(self):
+        release = Event()
+        fast, slow = MyMockBackend('fast', results=[1]), MyMockBackend('slow', results=[2], release=release)
+        bcall = BackendsCall([fast, slow], 'iter_results', executor=self.executor, timeout=0.2)
+        with self.assertRaises(CallErrors) as ctx:
+            bcall.wait()
+        self.assertEqual([backend.name for backend, _, _ in ctx.exception], ['slow'])
+        release.set()
+
+    # Check that first() returns the fastest accepted result and cancels the
+    # other backends
+    def test_first(self):
+        release = Event()
+        fast, slow = MyMockBackend('fast', results=[1, 2]), MyMockBackend('slow', results=[3], release=release)
+        bcall = BackendsCall([fast, slow], 'iter_results', executor=self.executor)
+        self.assertTrue(slow.started.wait(1))
+        self.assertEqual(bcall.first(lambda result: result % 2 == 0), 2)
+        self.assertTrue(slow.cancelled.is_set())
+        release.set()
+
+    # Check that first() raises errors when no result is accepted
+    def test_first_errors(self):
+        backends = [MyMockBackend('ok', results=[1]), MyMockBackend('ko', error=ValueError('ko'))]
+        bcall = BackendsCall(backends, 'iter_results', executor=self.executor)
+        self.assertRaises(CallErrors, bcall.first, lambda result: result > 1)
+
+    # Check that results can be consumed on an asyncio event loop
+    def test_aiter(self):
+        if sys.version_info < (3, 5):
+            self.skipTest('asyncio iteration requires Python 3.5')
+        import asyncio
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            backends = [MyMockBackend('ok', results=[1, 2]), MyMockBackend('ko', error=ValueError('ko'))]
+            it = BackendsCall(backends, 'iter_results', executor=self.executor).__aiter__()
+            results = []
+            with self.assertRaises(CallErrors):
+                while True:
+                    results.append(loop.run_until_complete(it.__anext__()))
+            self.assertEqual(sorted(results), [1, 2])
+
+            # Cancelling the asyncio task stops the call
+            release = Event()
+            backend = MyMockBackend('slow', results=[1], release=release)
+            bcall = BackendsCall([backend], 'iter_results', executor=self.executor)
+            self.assertTrue(backend.started.wait(1))
+            future = bcall.__aiter__().__anext__()
+            loop.call_soon(future.cancel)
+            self.assertRaises(asyncio.CancelledError, loop.run_until_complete, future)
+            self.assertTrue(bcall.stop_event.is_set())
+            self.assertTrue(backend.cancelled.is_set())
+            release.set()
+
+            # Leaving the iteration early, like with a break in 'async for',
+            # stops the call and releases the worker
+            backend = MyMockBackend('endless')
+            it = MySmallBackendsCall([backend], 'iter_endless', executor=self.executor).__aiter__()
+            self.assertEqual(loop.run_until_complete(it.__anext__()), 1)
+            del it
+            loop.run_until_complete(asyncio.sleep(0))
+            self.assertTrue(backend.closed.wait(1))
+            self.assertEqual(self.executor.submit(lambda: 42).result(timeout=1), 42)
+
+            backend = MyMockBackend('endless')
+            it = MySmallBackendsCall([backend], 'iter_endless', executor=self.executor).__aiter__()
+            self.assertEqual(loop.run_until_complete(it.__anext__()), 1)
+            loop.run_until_complete(it.aclose())
+            self.assertTrue(backend.closed.wait(1))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
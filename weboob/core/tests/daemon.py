@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import sys
+import tempfile
+from threading import Thread
+import time
+from unittest import TestCase, skipIf
+
+from weboob.core.bcall import BackendsCall
+from weboob.core.daemon import DaemonClient, DaemonServer, get_daemon_address
+from weboob.core.tests.workers import MyMockCancelModule, MyMockObject
+
+
+class MyMockWeboob(object):
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.backend_instances = {}
+
+    def get_backend(self, name):
+        return self.backend_instances[name]
+
+
+@skipIf(sys.platform == 'win32', 'daemon listens on a unix socket')
+class DaemonTest(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.weboob = MyMockWeboob(self.workdir)
+        self.weboob.backend_instances['mock'] = MyMockCancelModule(self.weboob, 'mock')
+
+        self.server = DaemonServer(self.weboob)
+        thread = Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.client = DaemonClient(*get_daemon_address(self.workdir))
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+        shutil.rmtree(self.workdir)
+
+    # Check that the socket and the key are private
+    def test_permissions(self):
+        for path in get_daemon_address(self.workdir):
+            self.assertEqual(os.stat(path).st_mode & 0o077, 0)
+
+    # Check that backends of the daemon are used through proxies
+    def test_backend(self):
+        self.assertEqual(self.client.get_backends(), {'mock': 'mock'})
+
+        backend = self.client.open_backend(None, 'mock')
+        try:
+            objects = list(backend.iter_objects(30))
+            self.assertEqual(len(objects), 30)
+            # The backend stays in the daemon.
+            self.assertEqual(objects[0].pid, str(os.getpid()))
+
+            bcall = BackendsCall([backend], 'fill_object', MyMockObject('1'))
+            self.assertEqual([obj.label for obj in bcall], [u'filled 1'])
+            backend.cancel_requests()
+        finally:
+            backend.deinit()
+
+    # Check that a backend cancelled by a client which is gone is resumed
+    def test_cancel(self):
+        mock = self.weboob.backend_instances['mock']
+        backend = self.client.open_backend(None, 'mock')
+        it = backend.iter_objects(100)
+        next(it)
+        backend.cancel_requests()
+        self.assertTrue(mock.cancelled)
+
+        # The client dies without resuming requests.
+        backend._conn.close()
+        for i in range(100):
+            if not mock.cancelled:
+                break
+            time.sleep(0.01)
+        self.assertFalse(mock.cancelled)
+
+        backend = self.client.open_backend(None, 'mock')
+        try:
+            self.assertEqual(len(list(backend.iter_objects(3))), 3)
+        finally:
+            backend.deinit()
+
+    # Check that cancellations of calls which are over, or of calls of
+    # other clients, are ignored
+    def test_cancel_late(self):
+        mock = self.weboob.backend_instances['mock']
+        backend = self.client.open_backend(None, 'mock')
+        other = self.client.open_backend(None, 'mock')
+        try:
+            it = backend.iter_objects(100)
+            next(it)
+            call_ids = backend.get_running_calls()
+            self.assertEqual(len(call_ids), 1)
+            other.cancel_requests()
+            self.assertFalse(mock.cancelled)
+            it.close()
+
+            # The consumer stopped during the last batch.
+            client = DaemonClient(*get_daemon_address(self.workdir))
+            try:
+                client.request('cancel', 'mock', call_ids)
+            finally:
+                client.close()
+            self.assertFalse(mock.cancelled)
+            self.assertEqual(len(list(other.iter_objects(3))), 3)
+        finally:
+            backend.deinit()
+            other.deinit()
+
+    # Check that unknown backends are refused
+    def test_unknown(self):
+        self.assertRaises(KeyError, self.client.open_backend, None, 'unknown')
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from weboob.core.modules import ModulesLoader
+from weboob.core.repositories import Repository
+
+
+MODULE_SOURCE = '''
+import os
+
+# Count imports of the module.
+with open(os.path.join(os.path.dirname(__file__), '..', 'imports'), 'a') as fp:
+    fp.write('x')
+
+from weboob.capabilities.base import Capability
+from weboob.tools.backend import Module, BackendConfig
+from weboob.tools.value import Value, ValueBackendPassword
+
+
+class CapMyMock(Capability):
+    pass
+
+
+class MyMockIndexedModule(Module, CapMyMock):
+    NAME = 'mockindexed'
+    VERSION = '1.6'
+    DESCRIPTION = u'Mock module'
+    MAINTAINER = u'weboob project'
+    EMAIL = 'weboob@weboob.org'
+    LICENSE = 'LGPLv3+'
+    CONFIG = BackendConfig(Value('login', label='Login', regexp=r'\\d+'),
+                           ValueBackendPassword('password', label='Password'))
+'''
+
+
+class RepositoryIndexTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, 'mockindexed'))
+        with open(os.path.join(self.path, 'mockindexed', '__init__.py'), 'w') as fp:
+            fp.write(MODULE_SOURCE)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    # Check that the index describes capabilities and configuration of modules
+    def test_index(self):
+        filename = os.path.join(self.path, Repository.INDEX)
+        repository = Repository('file://%s' % self.path)
+        repository.name = 'test'
+        repository.build_index(self.path, filename)
+
+        repository = Repository('file://%s' % self.path)
+        with open(filename) as fp:
+            repository.parse_index(fp)
+
+        minfo = repository.modules['mockindexed']
+        self.assertTrue(minfo.has_caps('CapMyMock'))
+        self.assertEqual(list(minfo.config), ['login', 'password'])
+        self.assertEqual(minfo.config['login']['regexp'], r'\d+')
+        self.assertTrue(minfo.config['password']['masked'])
+        self.assertFalse(minfo.config['login']['masked'])
+
+    # Check that unchanged modules are not imported again
+    def test_incremental(self):
+        filename = os.path.join(self.path, Repository.INDEX)
+        repository = Repository('file://%s' % self.path)
+        repository.name = 'test'
+        repository.build_index(self.path, filename)
+        version = repository.modules['mockindexed'].version
+        tree_hash = repository.modules['mockindexed'].hash
+
+        repository = Repository('file://%s' % self.path)
+        with open(filename) as fp:
+            repository.parse_index(fp)
+        repository.build_index(self.path, filename)
+        with open(os.path.join(self.path, 'imports')) as fp:
+            self.assertEqual(fp.read(), 'x')
+        self.assertEqual(repository.modules['mockindexed'].version, version)
+
+        with open(os.path.join(self.path, 'mockindexed', 'browser.py'), 'w') as fp:
+            fp.write('# new file')
+        repository.build_index(self.path, filename)
+        with open(os.path.join(self.path, 'imports')) as fp:
+            self.assertEqual(fp.read(), 'xx')
+        self.assertNotEqual(repository.modules['mockindexed'].hash, tree_hash)
+
+    # Check that modules are found as soon as their directory has an
+    # __init__.py file
+    def test_module_names(self):
+        loader = ModulesLoader(self.path)
+        self.assertTrue(loader.module_exists('mockindexed'))
+
+        os.mkdir(os.path.join(self.path, 'other'))
+        self.assertFalse(loader.module_exists('other'))
+        open(os.path.join(self.path, 'other', '__init__.py'), 'w').close()
+        self.assertTrue(loader.module_exists('other'))
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import time
+from unittest import TestCase, skipIf
+
+from weboob.capabilities.base import BaseObject, NotLoaded, StringField
+from weboob.core.bcall import BackendsCall, CallErrors
+from weboob.core.modules import LoadedModule
+from weboob.core.workers import BackendProcess
+from weboob.tools.backend import Module
+
+
+class MyMockObject(BaseObject):
+    """
+    Object returned by the mock module.
+    """
+    pid = StringField('PID of process which built the object')
+    label = StringField('Label')
+
+
+# Mock that allows to represent a module
+class MyMockModule(Module):
+    NAME = 'mock'
+    VERSION = '1.6'
+
+    def iter_objects(self, count):
+        for i in range(count):
+            obj = MyMockObject(str(i))
+            obj.pid = str(os.getpid())
+            yield obj
+
+    def fill_object(self, obj):
+        obj.label = u'filled %s' % obj.id
+        return obj
+
+    def fail(self):
+        raise ValueError('failure')
+
+
+class MyMockPackage(object):
+    MyMockModule = MyMockModule
+
+
+# Mock of a module which records cancellation of its requests
+class MyMockCancelModule(MyMockModule):
+    cancelled = False
+
+    def cancel_requests(self):
+        self.cancelled = True
+
+    def resume_requests(self):
+        self.cancelled = False
+
+    def is_cancelled(self):
+        return self.cancelled
+
+
+class MyMockCancelPackage(object):
+    MyMockCancelModule = MyMockCancelModule
+
+
+@skipIf(sys.platform == 'win32', 'worker processes are forked')
+class BackendProcessTest(TestCase):
+    def setUp(self):
+        self.backend = BackendProcess(None, LoadedModule(MyMockPackage), 'mock')
+
+    def tearDown(self):
+        self.backend.deinit()
+
+    # Check that methods are run in the worker process
+    def test_iter(self):
+        objects = list(self.backend.iter_objects(50))
+        self.assertEqual([obj.id for obj in objects], [str(i) for i in range(50)])
+        self.assertNotEqual(objects[0].pid, str(os.getpid()))
+        self.assertIs(objects[0].label, NotLoaded)
+
+    # Check that objects are sent to the worker process
+    def test_args(self):
+        obj = self.backend.fill_object(MyMockObject('42'))
+        self.assertEqual(obj.label, u'filled 42')
+
+    # Check that errors are raised again in the parent process
+    def test_error(self):
+        self.assertRaises(ValueError, self.backend.fail)
+
+    # Check that an iterator can be left before its end
+    def test_partial_iter(self):
+        it = self.backend.iter_objects(100)
+        self.assertEqual(next(it).id, '0')
+        it.close()
+        self.assertEqual(self.backend.fill_object(MyMockObject('1')).label, u'filled 1')
+
+    # Check that the proxy can be used in backends calls
+    def test_bcall(self):
+        self.assertTrue(self.backend.has_caps(Module))
+        bcall = BackendsCall([self.backend], 'iter_objects', 3)
+        self.assertEqual(sorted(obj.id for obj in bcall), ['0', '1', '2'])
+        self.assertEqual(self.backend.NAME, 'mock')
+
+        bcall = BackendsCall([self.backend], 'fail')
+        self.assertRaises(CallErrors, bcall.wait)
+
+    # Check that only running calls are cancelled, and that requests are
+    # resumed when they end
+    def test_cancel(self):
+        backend = BackendProcess(None, LoadedModule(MyMockCancelPackage), 'mock')
+        try:
+            backend.cancel_requests()
+            self.assertFalse(backend.is_cancelled())
+
+            it = backend.iter_objects(100)
+            next(it)
+            backend.cancel_requests()
+            for i in range(100):
+                if backend.is_cancelled():
+                    break
+                time.sleep(0.01)
+            self.assertTrue(backend.is_cancelled())
+            it.close()
+            self.assertFalse(backend.is_cancelled())
+            self.assertEqual(backend.get_running_calls(), [])
+        finally:
+            backend.deinit()
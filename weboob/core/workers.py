@@ -0,0 +1,494 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2019 weboob project
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import multiprocessing
+import pickle
+import signal
+from itertools import islice
+from threading import Lock, RLock, Thread
+from types import GeneratorType
+from uuid import uuid4
+
+from weboob.tools.backend import Module
+from weboob.tools.compat import basestring
+from weboob.tools.log import getLogger
+from weboob.tools.misc import get_backtrace
+
+
+__all__ = ['BackendProcess', 'CallCanceller', 'RemoteBackend', 'RemoteError', 'serve_backend']
+
+
+try:
+    # Backends are built from objects of the parent process, which are not
+    # picklable, so worker processes have to be forked.
+    _context = multiprocessing.get_context('fork')
+except AttributeError:
+    # Python 2 always forks.
+    _context = multiprocessing
+
+
+class RemoteError(Exception):
+    """
+    Raised in place of an error of a worker process which can't be pickled.
+    """
+
+
+def _picklable_error(error):
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return RemoteError('%s: %s' % (error.__class__.__name__, error))
+    else:
+        return error
+
+
+def _is_iterable(result):
+    return hasattr(result, '__iter__') and not isinstance(result, (bytes, basestring, dict))
+
+
+class CallCanceller(object):
+    """
+    Cancel requests of a backend served by :func:`serve_backend`, on behalf
+    of a given call.
+
+    Cancellations are sent by clients from another thread or connection, so
+    they can arrive once the call is over, or while the backend runs a call
+    of another client. They are ignored in these cases. When a cancelled
+    call ends, requests of the backend are resumed before another call can
+    lock it.
+
+    :param backend: served backend
+    :type backend: :class:`weboob.tools.backend.Module`
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = Lock()
+        # Calls received and not finished, with a flag set if they are
+        # cancelled.
+        self.calls = {}
+        # Calls which have locked the backend. A call can be made while an
+        # iterator of the same client is open.
+        self.running = set()
+
+    def begin(self, call_id):
+        """
+        Register a call before it waits for the backend.
+        """
+        with self.lock:
+            self.calls[call_id] = False
+
+    def start(self, call_id):
+        """
+        Tell that a call has locked the backend.
+        """
+        with self.lock:
+            self.running.add(call_id)
+            if self.calls.get(call_id):
+                self.backend.cancel_requests()
+
+    def end(self, call_id):
+        """
+        Tell that a call is over. It must be called before the backend is
+        unlocked.
+        """
+        with self.lock:
+            cancelled = self.calls.pop(call_id, False)
+            if call_id in self.running:
+                self.running.remove(call_id)
+                if cancelled:
+                    self.backend.resume_requests()
+
+    def cancel(self, call_id):
+        """
+        Cancel requests of a call, if it is not over.
+        """
+        with self.lock:
+            if self.calls.get(call_id) is False:
+                self.calls[call_id] = True
+                if call_id in self.running:
+                    self.backend.cancel_requests()
+
+
+def serve_backend(conn, backend, canceller=None):
+    """
+    Answer to requests of a :class:`RemoteBackend` on a backend, until the
+    connection is closed.
+
+    The backend is locked while one of its iterators is open, like in
+    :class:`weboob.core.bcall.BackendsCall`. Calls and iterators are
+    identified by an id chosen by the client, which is used to cancel them.
+
+    :param conn: connection to the proxy
+    :type conn: :class:`multiprocessing.connection.Connection`
+    :param backend: backend to serve
+    :type backend: :class:`weboob.tools.backend.Module`
+    :param canceller: canceller of calls to the backend, shared by every
+                      connection to it
+    :type canceller: :class:`CallCanceller`
+    """
+    if canceller is None:
+        canceller = CallCanceller(backend)
+    iterators = {}
+
+    def release(call_id):
+        # End of a call with an iterator, resume requests before another
+        # call can lock the backend.
+        try:
+            canceller.end(call_id)
+        finally:
+            backend.lock.release()
+
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+
+            command = message[0]
+            try:
+                if command == 'call':
+                    _, call_id, method, args, kwargs = message
+                    iterating = False
+                    canceller.begin(call_id)
+                    with backend:
+                        try:
+                            canceller.start(call_id)
+                            result = getattr(backend, method)(*args, **kwargs)
+                            if _is_iterable(result):
+                                backend.lock.acquire()
+                                iterating = True
+                                iterators[call_id] = iter(result)
+                        finally:
+                            if not iterating:
+                                canceller.end(call_id)
+                    if iterating:
+                        reply = ('iter', call_id)
+                    else:
+                        reply = ('value', result)
+                elif command == 'next':
+                    _, call_id, size = message
+                    try:
+                        items = list(islice(iterators[call_id], size))
+                    except Exception:
+                        if iterators.pop(call_id, None) is not None:
+                            release(call_id)
+                        raise
+                    done = len(items) < size
+                    if done:
+                        iterators.pop(call_id)
+                        release(call_id)
+                    reply = ('items', items, done)
+                elif command == 'close':
+                    _, call_id = message
+                    iterator = iterators.pop(call_id, None)
+                    if iterator is not None:
+                        if isinstance(iterator, GeneratorType):
+                            iterator.close()
+                        release(call_id)
+                    reply = ('value', None)
+                elif command == 'describe':
+                    reply = ('value', {'NAME': backend.NAME, 'caps': list(backend.iter_caps())})
+                elif command == 'getattr':
+                    _, attrname = message
+                    attr = getattr(backend, attrname)
+                    if callable(attr) and not isinstance(attr, type):
+                        reply = ('method', None)
+                    else:
+                        reply = ('value', attr)
+                elif command == 'deinit':
+                    with backend:
+                        backend.deinit()
+                    reply = ('value', None)
+                else:
+                    raise ValueError('Unknown command %r' % command)
+
+                conn.send(reply)
+            except Exception as error:
+                conn.send(('error', _picklable_error(error), get_backtrace(error)))
+
+            if command == 'deinit':
+                break
+    finally:
+        # The client is gone, its calls are over.
+        for call_id in list(iterators):
+            release(call_id)
+        conn.close()
+
+
+def _run_backend(conn, cancel_queue, module, weboob, name, params, storage, logger):
+    """
+    Main loop of a worker process.
+
+    It builds the backend, then serves it to the :class:`BackendProcess`.
+    """
+    # The parent process is in charge of stopping us.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    try:
+        backend = module.create_instance(weboob, name, params, storage, logger=logger)
+    except Exception as error:
+        conn.send(('error', _picklable_error(error), get_backtrace(error)))
+        return
+    conn.send(('value', None))
+
+    canceller = CallCanceller(backend)
+
+    def watch_cancel():
+        while True:
+            canceller.cancel(cancel_queue.get())
+
+    thread = Thread(target=watch_cancel)
+    thread.daemon = True
+    thread.start()
+
+    serve_backend(conn, backend, canceller)
+
+
+class RemoteBackend(object):
+    """
+    Proxy to a backend which runs somewhere else, and is served by
+    :func:`serve_backend`.
+
+    It can be used like a :class:`weboob.tools.backend.Module`: calls to
+    methods of the backend are sent through the connection, and their
+    results come back pickled (:class:`weboob.capabilities.base.BaseObject`
+    supports it). Iterators are consumed by batches of :attr:`BATCH_SIZE`
+    items, so the backend stops parsing pages when the caller stops reading.
+
+    The connection is busy during calls, so subclasses implement
+    ``cancel_requests()`` with their own way to send ids of the running
+    calls (see :meth:`get_running_calls`) to the backend.
+
+    :param weboob: weboob instance
+    :type weboob: :class:`weboob.core.ouiboube.WebNip`
+    :param name: name of backend
+    :type name: :class:`str`
+    :param conn: connection to the backend
+    :type conn: :class:`multiprocessing.connection.Connection`
+    :param logger: logger
+    :type logger: :class:`logging.Logger`
+    """
+
+    BATCH_SIZE = 20
+    """
+    Number of items of an iterator which are sent at once.
+    """
+
+    def __init__(self, weboob, name, conn, logger=None):
+        self.weboob = weboob
+        self.name = name
+        self.lock = RLock()
+        self.logger = getLogger(name, parent=logger)
+
+        self._conn = conn
+        self._conn_lock = Lock()
+        self._calls = set()
+        self._calls_lock = Lock()
+        self._methods = set()
+        self._description = None
+
+    def __enter__(self):
+        self.lock.acquire()
+
+    def __exit__(self, t, v, tb):
+        self.lock.release()
+
+    def __repr__(self):
+        return "<Backend %r (remote)>" % self.name
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        if name not in self._methods:
+            kind, value = self._request('getattr', name)
+            if kind == 'value':
+                return value
+            self._methods.add(name)
+
+        def method(*args, **kwargs):
+            return self._call(name, *args, **kwargs)
+        method.__name__ = name
+        return method
+
+    def _request(self, *message):
+        with self._conn_lock:
+            if message:
+                self._conn.send(message)
+            reply = self._conn.recv()
+
+        if reply[0] == 'error':
+            _, error, backtrace = reply
+            self.logger.debug(u'Error in remote backend:\n%s', backtrace)
+            raise error
+        return reply
+
+    def get_running_calls(self):
+        """
+        Get ids of calls which are not over, including open iterators.
+
+        :rtype: list[:class:`str`]
+        """
+        with self._calls_lock:
+            return list(self._calls)
+
+    def _end_call(self, call_id):
+        with self._calls_lock:
+            self._calls.discard(call_id)
+
+    def _call(self, method, *args, **kwargs):
+        call_id = uuid4().hex
+        with self._calls_lock:
+            self._calls.add(call_id)
+
+        iterating = False
+        try:
+            kind, value = self._request('call', call_id, method, args, kwargs)
+            if kind == 'iter':
+                iterating = True
+                return self._iter_remote(call_id)
+            return value
+        finally:
+            if not iterating:
+                self._end_call(call_id)
+
+    def _iter_remote(self, call_id):
+        done = False
+        try:
+            while not done:
+                _, items, done = self._request('next', call_id, self.BATCH_SIZE)
+                for item in items:
+                    yield item
+        finally:
+            try:
+                if not done:
+                    self._request('close', call_id)
+            except (IOError, OSError, EOFError):
+                # The connection is closed, and the iterator with it.
+                pass
+            finally:
+                self._end_call(call_id)
+
+    @property
+    def NAME(self):
+        return self._describe()['NAME']
+
+    def _describe(self):
+        if self._description is None:
+            self._description = self._request('describe')[1]
+        return self._description
+
+    def iter_caps(self):
+        return iter(self._describe()['caps'])
+
+    def has_caps(self, *caps):
+        """
+        Check if this backend implements at least one of these capabilities.
+        """
+        for c in caps:
+            if isinstance(c, basestring):
+                if c in [cap.__name__ for cap in self.iter_caps()]:
+                    return True
+            elif issubclass(Module, c) or any(issubclass(cap, c) for cap in self.iter_caps()):
+                return True
+        return False
+
+    def resume_requests(self):
+        """
+        Requests are resumed by :func:`serve_backend` when the cancelled
+        call ends.
+        """
+
+    def deinit(self):
+        """
+        Deinit the backend and close the connection.
+        """
+        try:
+            self._request('deinit')
+        finally:
+            self._conn.close()
+
+
+class BackendProcess(RemoteBackend):
+    """
+    Backend which runs in its own worker process.
+
+    It is useful for parsing-heavy modules, which keep the GIL busy when they
+    run in threads. As the worker is forked, it is only available on POSIX
+    systems.
+
+    :param weboob: weboob instance
+    :type weboob: :class:`weboob.core.ouiboube.WebNip`
+    :param module: module of the backend
+    :type module: :class:`weboob.core.modules.LoadedModule`
+    :param name: name of backend
+    :type name: :class:`str`
+    :param params: configuration of backend
+    :type params: :class:`dict`
+    :param storage: storage object
+    :type storage: :class:`weboob.tools.storage.IStorage`
+    :param logger: logger
+    :type logger: :class:`logging.Logger`
+    """
+
+    def __init__(self, weboob, module, name, params=None, storage=None, logger=None):
+        conn, child_conn = _context.Pipe()
+        super(BackendProcess, self).__init__(weboob, name, conn, logger)
+
+        self._cancel_queue = _context.Queue()
+        self._process = _context.Process(target=_run_backend,
+                                         name='weboob-%s' % name,
+                                         args=(child_conn, self._cancel_queue, module, weboob,
+                                               name, params or {}, storage, logger))
+        self._process.daemon = True
+        self._process.start()
+        child_conn.close()
+
+        try:
+            # Wait for the backend to be created.
+            self._request()
+        except Exception:
+            self._process.join()
+            self._conn.close()
+            raise
+
+    def __repr__(self):
+        return "<Backend %r (pid %s)>" % (self.name, self._process.pid)
+
+    def cancel_requests(self):
+        """
+        Abort requests of the running calls in the worker process.
+
+        It is handled by a thread of the worker, as its main thread is busy
+        with the running call.
+        """
+        for call_id in self.get_running_calls():
+            self._cancel_queue.put(call_id)
+
+    def deinit(self):
+        """
+        Deinit the backend and stop its worker process.
+        """
+        try:
+            super(BackendProcess, self).deinit()
+        finally:
+            self._process.join()
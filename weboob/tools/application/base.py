@@ -176,6 +176,7 @@ class Application(object):
         self._parser.add_option('-e', '--exclude-backends', help='what backend(s) to exclude (comma separated)')
         self._parser.add_option('-I', '--insecure', action='store_true', help='do not validate SSL')
         self._parser.add_option('--nss', action='store_true', help='Use NSS instead of OpenSSL')
+        self._parser.add_option('--daemon', action='store_true', help='use backends loaded by weboob-daemon')
         logging_options = OptionGroup(self._parser, 'Logging Options')
         logging_options.add_option('-d', '--debug', action='count', help='display debug messages. Set up it twice to more verbosity', default=0)
         logging_options.add_option('-q', '--quiet', action='store_true', help='display only error messages')
@@ -265,6 +266,8 @@ class Application(object):
             names = self.options.backends.split(',')
         if exclude is None and self.options.exclude_backends:
             exclude = self.options.exclude_backends.split(',')
+        if self.options.daemon:
+            kwargs.setdefault('daemon', True)
         loaded = self.weboob.load_backends(caps, names, exclude=exclude, *args, **kwargs)
         if not loaded:
             logging.info(u'No backend loaded')
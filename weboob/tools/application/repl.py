@@ -265,10 +265,6 @@ class ReplApplication(ConsoleApplication, MyCmd):
             kargs = {'caps': caps}
         backend_names = (backend_name,) if backend_name is not None else self.enabled_backends
 
-        # if backend's service returns several objects, try to find the one
-        # with wanted ID. If not found, get the last not None object.
-        obj = None
-
         # remove backends that do not have the required method
         new_backend_names = []
         for backend in backend_names:
@@ -279,19 +275,30 @@ class ReplApplication(ConsoleApplication, MyCmd):
             if getattr(actual_backend, method, None) is not None:
                 new_backend_names.append(backend)
         backend_names = tuple(new_backend_names)
+
+        # if backend's service returns several objects, try to find the one
+        # with wanted ID. If not found, get the last not None object.
+        # Other backends are cancelled as soon as the wanted object is found.
+        found = []
+
+        def has_wanted_id(objiter):
+            if objiter:
+                found.append(objiter)
+                return objiter.id == _id
+            return False
+
         try:
-            for objiter in self.do(method, _id, backends=backend_names, fields=fields, **kargs):
-                if objiter:
-                    obj = objiter
-                    if objiter.id == _id:
-                        return obj
+            obj = self.do(method, _id, backends=backend_names, fields=fields, **kargs).first(has_wanted_id)
         except CallErrors as e:
-            if obj is not None:
+            if found:
                 self.bcall_errors_handler(e)
             else:
                 raise
+        else:
+            if obj is not None:
+                return obj
 
-        return obj
+        return found[-1] if found else None
 
     def get_object_list(self, method=None, *args, **kwargs):
         # return cache if not empty
@@ -332,6 +332,24 @@ class Module(object):
             self._browser = self.create_default_browser()
         return self._browser
 
+    def cancel_requests(self):
+        """
+        Abort requests of the browser, if it has been created, so that the
+        running call stops fetching pages.
+
+        It can be called from any thread. Call :func:`resume_requests` to
+        allow requests again.
+        """
+        if self._browser is not None and hasattr(self._browser, 'cancel'):
+            self._browser.cancel()
+
+    def resume_requests(self):
+        """
+        Allow requests of the browser again after :func:`cancel_requests`.
+        """
+        if self._browser is not None and hasattr(self._browser, 'resume'):
+            self._browser.resume()
+
     def create_default_browser(self):
         """
         Method to overload to build the default browser in
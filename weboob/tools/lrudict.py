@@ -40,8 +40,10 @@ class LimitedLRUDict(LRUDict):
     """dict to store only the N most recent items."""
 
     max_entries = 100
+    evictions = 0
 
     def __setitem__(self, key, value):
         super(LimitedLRUDict, self).__setitem__(key, value)
         if len(self) > self.max_entries:
             self.popitem(last=False)
+            self.evictions += 1